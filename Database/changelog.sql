@@ -0,0 +1,101 @@
+-- Change log for the RAG service.
+--
+-- Triggers record every insert, update and delete on the tables the RAG
+-- service indexes. The service tails `scms_changelog`, re-embeds just the
+-- affected documents and removes the entries it has applied.
+--
+-- ENTITY_ID is the key the RAG service extracts documents by:
+--   product      -> product.PRODUCT_ID
+--   customer     -> customer.CUST_ID
+--   supplier     -> supplier.SUPPLIER_ID
+--   transaction  -> transaction_details.ID (one document per line item)
+--
+-- New databases get this from docker-entrypoint-initdb.d; for an existing
+-- database run it once with: mysql -u root -p scms < Database/changelog.sql
+
+CREATE TABLE IF NOT EXISTS `scms_changelog` (
+  `ID` bigint NOT NULL AUTO_INCREMENT,
+  `ENTITY` varchar(20) NOT NULL,
+  `ENTITY_ID` int(11) NOT NULL,
+  `OP` char(1) NOT NULL,
+  `CHANGED_AT` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`ID`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+-- Products
+
+DROP TRIGGER IF EXISTS `product_changelog_insert`;
+CREATE TRIGGER `product_changelog_insert` AFTER INSERT ON `product` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`) VALUES ('product', NEW.PRODUCT_ID, 'I');
+
+DROP TRIGGER IF EXISTS `product_changelog_update`;
+CREATE TRIGGER `product_changelog_update` AFTER UPDATE ON `product` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`) VALUES ('product', NEW.PRODUCT_ID, 'U');
+
+DROP TRIGGER IF EXISTS `product_changelog_delete`;
+CREATE TRIGGER `product_changelog_delete` AFTER DELETE ON `product` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`) VALUES ('product', OLD.PRODUCT_ID, 'D');
+
+-- Customers
+
+DROP TRIGGER IF EXISTS `customer_changelog_insert`;
+CREATE TRIGGER `customer_changelog_insert` AFTER INSERT ON `customer` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`) VALUES ('customer', NEW.CUST_ID, 'I');
+
+DROP TRIGGER IF EXISTS `customer_changelog_update`;
+CREATE TRIGGER `customer_changelog_update` AFTER UPDATE ON `customer` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`) VALUES ('customer', NEW.CUST_ID, 'U');
+
+DROP TRIGGER IF EXISTS `customer_changelog_delete`;
+CREATE TRIGGER `customer_changelog_delete` AFTER DELETE ON `customer` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`) VALUES ('customer', OLD.CUST_ID, 'D');
+
+-- Suppliers (product documents include the supplier name, so a supplier
+-- update also logs its products)
+
+DROP TRIGGER IF EXISTS `supplier_changelog_insert`;
+CREATE TRIGGER `supplier_changelog_insert` AFTER INSERT ON `supplier` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`) VALUES ('supplier', NEW.SUPPLIER_ID, 'I');
+
+DROP TRIGGER IF EXISTS `supplier_changelog_update`;
+CREATE TRIGGER `supplier_changelog_update` AFTER UPDATE ON `supplier` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`)
+  SELECT 'supplier', NEW.SUPPLIER_ID, 'U'
+  UNION ALL
+  SELECT 'product', p.PRODUCT_ID, 'U' FROM `product` p WHERE p.SUPPLIER_ID = NEW.SUPPLIER_ID;
+
+DROP TRIGGER IF EXISTS `supplier_changelog_delete`;
+CREATE TRIGGER `supplier_changelog_delete` AFTER DELETE ON `supplier` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`) VALUES ('supplier', OLD.SUPPLIER_ID, 'D');
+
+-- Transactions: documents are per line item. pos_transac.php inserts the
+-- line items before the transaction row, so the transaction triggers log
+-- every line item of the transaction again once the join is complete.
+
+DROP TRIGGER IF EXISTS `transaction_details_changelog_insert`;
+CREATE TRIGGER `transaction_details_changelog_insert` AFTER INSERT ON `transaction_details` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`) VALUES ('transaction', NEW.ID, 'I');
+
+DROP TRIGGER IF EXISTS `transaction_details_changelog_update`;
+CREATE TRIGGER `transaction_details_changelog_update` AFTER UPDATE ON `transaction_details` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`) VALUES ('transaction', NEW.ID, 'U');
+
+DROP TRIGGER IF EXISTS `transaction_details_changelog_delete`;
+CREATE TRIGGER `transaction_details_changelog_delete` AFTER DELETE ON `transaction_details` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`) VALUES ('transaction', OLD.ID, 'D');
+
+DROP TRIGGER IF EXISTS `transaction_changelog_insert`;
+CREATE TRIGGER `transaction_changelog_insert` AFTER INSERT ON `transaction` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`)
+  SELECT 'transaction', td.ID, 'I' FROM `transaction_details` td WHERE td.TRANS_D_ID = NEW.TRANS_D_ID;
+
+DROP TRIGGER IF EXISTS `transaction_changelog_update`;
+CREATE TRIGGER `transaction_changelog_update` AFTER UPDATE ON `transaction` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`)
+  SELECT 'transaction', td.ID, 'U' FROM `transaction_details` td
+  WHERE td.TRANS_D_ID IN (OLD.TRANS_D_ID, NEW.TRANS_D_ID);
+
+DROP TRIGGER IF EXISTS `transaction_changelog_delete`;
+CREATE TRIGGER `transaction_changelog_delete` AFTER DELETE ON `transaction` FOR EACH ROW
+  INSERT INTO `scms_changelog` (`ENTITY`, `ENTITY_ID`, `OP`)
+  SELECT 'transaction', td.ID, 'D' FROM `transaction_details` td WHERE td.TRANS_D_ID = OLD.TRANS_D_ID;
@@ -37,9 +37,31 @@ function appendMessage(message, isUser = false) {
     messageDiv.style.borderRadius = '10px';
     messageDiv.style.maxWidth = '80%';
     messageDiv.style.margin = isUser ? '10px 0 10px auto' : '10px auto 10px 0';
+    messageDiv.style.whiteSpace = 'pre-wrap';
     messageDiv.textContent = message;
     chatMessages.appendChild(messageDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return messageDiv;
+}
+
+function appendToMessage(messageDiv, text) {
+    const chatMessages = document.getElementById('chat-messages');
+    messageDiv.textContent += text;
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+}
+
+// Parse a server-sent event block ("event: ...\ndata: ...") into {event, data}
+function parseEvent(block) {
+    let event = 'message';
+    let data = '';
+    block.split('\n').forEach(function(line) {
+        if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            data += line.slice(5).trim();
+        }
+    });
+    return { event: event, data: data ? JSON.parse(data) : {} };
 }
 
 async function sendMessage() {
@@ -53,13 +75,15 @@ async function sendMessage() {
     
     // Show user message
     appendMessage(message, true);
+    const answerDiv = appendMessage('...');
+    let started = false;
     
     try {
-        const response = await fetch('http://localhost:8000/chat', {
+        const response = await fetch('http://localhost:8000/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
-                'Accept': 'application/json'
+                'Accept': 'text/event-stream'
             },
             mode: 'cors',
             body: JSON.stringify({
@@ -71,12 +95,36 @@ async function sendMessage() {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         
-        const data = await response.json();
-        appendMessage(data.answer);
+        // Show tokens as they arrive
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const { event, data } = parseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                
+                if (event === 'token') {
+                    if (!started) {
+                        answerDiv.textContent = '';
+                        started = true;
+                    }
+                    appendToMessage(answerDiv, data.content);
+                } else if (event === 'error') {
+                    answerDiv.textContent = data.message;
+                    started = true;
+                }
+            }
+        }
         
     } catch (error) {
         console.error('Error:', error);
-        appendMessage('Sorry, I encountered an error while processing your request. Error: ' + error.message);
+        answerDiv.textContent = 'Sorry, I encountered an error while processing your request. Error: ' + error.message;
     }
 }
 </script>
@@ -0,0 +1,131 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Dict, List
+from config import LLM_CONCURRENCY, LLM_QUEUE_MAX, LLM_QUEUE_TIMEOUT
+from metrics import LLM_QUEUE_WAIT_SECONDS, LLM_REQUESTS_SHED
+
+# Lower runs first
+PRIORITIES = {"interactive": 0, "batch": 1, "background": 2}
+
+
+class Overloaded(Exception):
+    """A generation was shed instead of admitted; `reason` says why"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"LLM overloaded ({reason})")
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Bounded, prioritized admission of LLM generations.
+
+    At most `concurrency` generations run at once. Others wait in a priority
+    queue (interactive before batch before background, first come first
+    served within a priority) of at most `max_queue` entries, for at most
+    `max_wait` seconds. A request that finds the queue full takes the place
+    of the newest waiter of a lower priority, or is shed itself. Shed
+    requests raise Overloaded so the caller can answer without the LLM.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = LLM_CONCURRENCY,
+        max_queue: int = LLM_QUEUE_MAX,
+        max_wait: float = LLM_QUEUE_TIMEOUT,
+    ):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        # Heap of [priority level, arrival, future, priority name]
+        self.waiters: List[List[Any]] = []
+        self.arrivals = itertools.count()
+        self.stats: Dict[str, Any] = {"admitted": 0, "queued": 0, "shed": 0}
+
+    def depth(self) -> Dict[str, int]:
+        """Waiting generations per priority"""
+        counts = {priority: 0 for priority in PRIORITIES}
+        for entry in self.waiters:
+            counts[entry[3]] += 1
+        return counts
+
+    def _shed(self, priority: str, reason: str):
+        self.stats["shed"] += 1
+        LLM_REQUESTS_SHED.inc(priority=priority, reason=reason)
+
+    def _remove(self, entry: List[Any]):
+        try:
+            self.waiters.remove(entry)
+        except ValueError:
+            return
+        heapq.heapify(self.waiters)
+
+    @staticmethod
+    def _handed_slot(future: asyncio.Future) -> bool:
+        """Whether release() passed a slot to this waiter"""
+        return future.done() and not future.cancelled() and future.exception() is None
+
+    async def acquire(self, priority: str = "interactive"):
+        """Wait for a generation slot; raises Overloaded if shed"""
+        level = PRIORITIES[priority]
+        start = time.perf_counter()
+        if self.active < self.concurrency and not self.waiters:
+            self.active += 1
+            self.stats["admitted"] += 1
+            LLM_QUEUE_WAIT_SECONDS.observe(0, priority=priority)
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            lower = [entry for entry in self.waiters if entry[0] > level]
+            if not lower:
+                self._shed(priority, "queue_full")
+                raise Overloaded("queue_full")
+            # The newest of the lowest priority waiters gives up its place
+            victim = max(lower, key=lambda entry: (entry[0], entry[1]))
+            self._remove(victim)
+            self._shed(victim[3], "displaced")
+            victim[2].set_exception(Overloaded("displaced"))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [level, next(self.arrivals), future, priority]
+        heapq.heappush(self.waiters, entry)
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            if not self._handed_slot(future):
+                self._remove(entry)
+                self._shed(priority, "timeout")
+                raise Overloaded("timeout")
+            # Handed a slot as the wait timed out; take it
+        except asyncio.CancelledError:
+            if self._handed_slot(future):
+                # Handed a slot just as the caller went away
+                self.release()
+            else:
+                self._remove(entry)
+            raise
+        self.stats["admitted"] += 1
+        LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start, priority=priority)
+
+    def release(self):
+        """Hand the slot to the first waiter, or free it"""
+        while self.waiters:
+            entry = heapq.heappop(self.waiters)
+            if not entry[2].done():
+                entry[2].set_result(None)
+                return
+        self.active -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "active": self.active,
+            "waiting": self.depth(),
+            **self.stats,
+        }
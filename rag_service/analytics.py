@@ -0,0 +1,647 @@
+import asyncio
+import hashlib
+import math
+import re
+import time
+import zlib
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from config import (
+    ANALYTICS_WINDOW_DAYS,
+    ANALYTICS_LEAD_TIME_DAYS,
+    ANALYTICS_COVER_DAYS,
+    ANALYTICS_PAGE_SIZE,
+    ANALYTICS_UPDATE_INTERVAL,
+    ANALYTICS_RELOAD_MINUTES,
+)
+
+# Line items with their quantities cast and their sale day as days since
+# 1970-01-01 (NULL when the date doesn't parse), so the varchar columns are
+# parsed once, by MySQL, when a line is read. Line items are written before
+# their transaction row, hence the LEFT JOIN: a line without its transaction
+# yet is read again on the next update.
+SALES_LINES_SQL = """
+    SELECT td.ID, td.PRODUCTS, t.TRANS_ID,
+           DATEDIFF(LEFT(t.DATE, 10), '1970-01-01') AS DAY,
+           CAST(td.QTY AS UNSIGNED) AS QTY,
+           CAST(td.QTY AS UNSIGNED) * CAST(td.PRICE AS DECIMAL(12, 2)) AS REVENUE
+    FROM transaction_details td
+    LEFT JOIN transaction t ON t.TRANS_D_ID = td.TRANS_D_ID
+"""
+
+PRODUCTS_SQL = """
+    SELECT p.PRODUCT_ID, p.NAME, p.QTY_STOCK, p.ON_HAND, p.PRICE, p.SUPPLIER_ID
+    FROM product p
+    ORDER BY p.PRODUCT_ID
+"""
+
+SUPPLIERS_SQL = "SELECT s.SUPPLIER_ID, s.COMPANY_NAME FROM supplier s"
+
+REORDER_PATTERN = re.compile(
+    r"\b(?:re-?order|re-?stock|run(?:s|ning)?\s+out|days?\s+of\s+stock|stock[\s-]?outs?|velocity|selling\s+fast)\b",
+    re.I,
+)
+
+# Sale day of lines whose date didn't parse or whose transaction is missing;
+# falls outside every window
+NO_DAY = np.iinfo(np.int32).min
+
+EPOCH = date(1970, 1, 1)
+
+SORT_KEYS = ("days_left", "velocity", "revenue", "reorder")
+
+
+def padded(values: np.ndarray, size: int, fill: Any = 0) -> np.ndarray:
+    """`values` extended with `fill` to `size` entries"""
+    if len(values) >= size:
+        return values
+    return np.concatenate([values, np.full(size - len(values), fill, dtype=values.dtype)])
+
+
+def money(value: float) -> str:
+    return f"${value:,.2f}"
+
+
+def product_document(name: str) -> str:
+    """Analytics document name of a product, the same on every instance"""
+    return "product_" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:12]
+
+
+class SalesLines:
+    """Sales line items as parallel typed columns, ordered by line id"""
+
+    COLUMNS = ("ids", "product", "day", "qty", "revenue")
+
+    def __init__(
+        self,
+        ids: Optional[np.ndarray] = None,
+        product: Optional[np.ndarray] = None,
+        day: Optional[np.ndarray] = None,
+        qty: Optional[np.ndarray] = None,
+        revenue: Optional[np.ndarray] = None,
+    ):
+        self.ids = ids if ids is not None else np.zeros(0, np.int64)
+        # Index of the product name in SalesAnalytics.names
+        self.product = product if product is not None else np.zeros(0, np.int32)
+        self.day = day if day is not None else np.zeros(0, np.int32)
+        self.qty = qty if qty is not None else np.zeros(0, np.float64)
+        self.revenue = revenue if revenue is not None else np.zeros(0, np.float64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def concat(cls, parts: List["SalesLines"]) -> "SalesLines":
+        if not parts:
+            return cls()
+        return cls(
+            *(np.concatenate([getattr(part, column) for part in parts]) for column in cls.COLUMNS)
+        )
+
+    def take(self, index: np.ndarray) -> "SalesLines":
+        return SalesLines(*(getattr(self, column)[index] for column in self.COLUMNS))
+
+    def upsert(self, other: "SalesLines") -> np.ndarray:
+        """Overwrite lines with the same id, add the others; returns the products whose lines changed"""
+        if not len(other):
+            return np.zeros(0, np.int32)
+        positions = np.searchsorted(self.ids, other.ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == other.ids[found]
+        at = positions[found]
+        same = np.ones(len(at), bool)
+        for column in self.COLUMNS:
+            same &= getattr(self, column)[at] == getattr(other, column)[found]
+        # An edited line may have moved from one product to another
+        changed = np.concatenate(
+            [self.product[at][~same], other.product[found][~same], other.product[~found]]
+        )
+        for column in self.COLUMNS:
+            getattr(self, column)[at] = getattr(other, column)[found]
+
+        new = other.take(~found)
+        if len(new):
+            in_order = not len(self.ids) or new.ids.min() > self.ids[-1]
+            merged = SalesLines.concat([self, new])
+            if not in_order:
+                merged = merged.take(np.argsort(merged.ids, kind="stable"))
+            for column in self.COLUMNS:
+                setattr(self, column, getattr(merged, column))
+        return np.unique(changed)
+
+    def delete(self, ids: np.ndarray) -> np.ndarray:
+        """Drop lines by id; returns the products of the dropped lines"""
+        drop = np.isin(self.ids, ids)
+        if not drop.any():
+            return np.zeros(0, np.int32)
+        products = np.unique(self.product[drop])
+        for column in self.COLUMNS:
+            setattr(self, column, getattr(self, column)[~drop])
+        return products
+
+    def changed_products(self, other: "SalesLines") -> np.ndarray:
+        """Products of the lines that differ between these lines and `other`"""
+        _, mine, theirs = np.intersect1d(self.ids, other.ids, assume_unique=True, return_indices=True)
+        same = np.ones(len(mine), bool)
+        for column in self.COLUMNS[1:]:
+            same &= getattr(self, column)[mine] == getattr(other, column)[theirs]
+        kept_mine = np.zeros(len(self), bool)
+        kept_mine[mine[same]] = True
+        kept_theirs = np.zeros(len(other), bool)
+        kept_theirs[theirs[same]] = True
+        return np.unique(np.concatenate([self.product[~kept_mine], other.product[~kept_theirs]]))
+
+
+class SalesAnalytics:
+    """
+    Sales history and stock levels held in memory as typed NumPy columns,
+    loaded once and then kept current incrementally: new sales lines by key,
+    edited ones through the change log (apply_changes) or the periodic full
+    reload. Every product is evaluated in one vectorized pass: units sold
+    over the last `window_days`, velocity, days of stock left on hand, and
+    the quantity to reorder so stock covers the supplier lead time plus
+    `cover_days`, grouped per supplier. `on_update`, if given, is called
+    with the names of the products whose figures a reload or update changed,
+    or with None when every figure moved (the window rolled over to a new day).
+
+    Products are keyed by name, as transaction_details.PRODUCTS refers to
+    them; the stock batches of a product (rows sharing a name) are summed,
+    and price and supplier come from the latest batch.
+    """
+
+    def __init__(
+        self,
+        db_manager,
+        window_days: int = ANALYTICS_WINDOW_DAYS,
+        lead_time_days: int = ANALYTICS_LEAD_TIME_DAYS,
+        cover_days: int = ANALYTICS_COVER_DAYS,
+        page_size: int = ANALYTICS_PAGE_SIZE,
+        interval: float = ANALYTICS_UPDATE_INTERVAL,
+        reload_minutes: float = ANALYTICS_RELOAD_MINUTES,
+        on_update: Optional[Callable[[Optional[List[str]]], Awaitable[None]]] = None,
+    ):
+        self.db_manager = db_manager
+        self.window_days = window_days
+        self.lead_time_days = lead_time_days
+        self.cover_days = cover_days
+        self.page_size = page_size
+        self.interval = interval
+        self.reload_minutes = reload_minutes
+        self.on_update = on_update
+        # Loads and updates replace the columns; one at a time
+        self.lock = asyncio.Lock()
+        self.loaded = False
+        self.task: Optional[asyncio.Task] = None
+
+        # Product names, indexed by the product column of the sales lines
+        self.names: List[str] = []
+        self.name_index: Dict[str, int] = {}
+        # PRODUCT_ID and CRC32 of the name (rollup document ids) -> name index
+        self.product_keys: Dict[int, int] = {}
+        self.crc_keys: Dict[int, int] = {}
+        self.qty_stock = np.zeros(0, np.float64)
+        self.on_hand = np.zeros(0, np.float64)
+        self.price = np.zeros(0, np.float64)
+        self.supplier = np.zeros(0, np.int64)
+        self.supplier_names: Dict[int, str] = {}
+
+        self.lines = SalesLines()
+        self.last_line_id = -1
+        # Lines read before their transaction row existed
+        self.pending: Set[int] = set()
+        # Bumped when products or sales lines change; computed results are
+        # reused until it moves
+        self.version = 0
+        self.computed: Optional[Tuple[Tuple[int, date], Dict[str, Any]]] = None
+        self.stats: Dict[str, Any] = {
+            "loads": 0,
+            "updates": 0,
+            "errors": 0,
+            "last_load_seconds": None,
+            "last_update_seconds": None,
+            "last_compute_seconds": None,
+        }
+
+    def _key(self, name: str) -> int:
+        key = self.name_index.get(name)
+        if key is None:
+            key = len(self.names)
+            self.names.append(name)
+            self.name_index[name] = key
+            self.crc_keys[zlib.crc32(name.encode("utf-8"))] = key
+        return key
+
+    async def _query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        return await self.db_manager.run(self.db_manager.query, sql, params)
+
+    async def _load_products(self) -> np.ndarray:
+        """Read stock levels; returns the products whose figures changed"""
+        before = (self.qty_stock, self.on_hand, self.price, self.supplier)
+        before_keys, before_suppliers = self.product_keys, self.supplier_names
+        products = await self._query(PRODUCTS_SQL)
+        suppliers = await self._query(SUPPLIERS_SQL)
+        count = len(products)
+        keys = np.fromiter((self._key(row["NAME"] or "") for row in products), np.int64, count)
+        size = len(self.names)
+
+        def column(name: str) -> np.ndarray:
+            return np.fromiter((row[name] or 0 for row in products), np.float64, count)
+
+        self.qty_stock = np.bincount(keys, weights=column("QTY_STOCK"), minlength=size)
+        self.on_hand = np.bincount(keys, weights=column("ON_HAND"), minlength=size)
+        # Rows come in PRODUCT_ID order, so the latest batch is assigned last
+        self.price = np.zeros(size)
+        self.price[keys] = column("PRICE")
+        self.supplier = np.full(size, -1, np.int64)
+        self.supplier[keys] = np.fromiter(
+            (row["SUPPLIER_ID"] if row["SUPPLIER_ID"] is not None else -1 for row in products),
+            np.int64,
+            count,
+        )
+        self.product_keys = dict(zip((row["PRODUCT_ID"] for row in products), keys.tolist()))
+        self.supplier_names = {row["SUPPLIER_ID"]: row["COMPANY_NAME"] for row in suppliers}
+        after = (self.qty_stock, self.on_hand, self.price, self.supplier)
+        differs = np.zeros(size, bool)
+        for old, new, fill in zip(before, after, (0, 0, 0, -1)):
+            differs |= padded(old, size, fill) != new
+        # Products renamed or deleted, and those of renamed suppliers
+        moved = [
+            key
+            for product_id in before_keys.keys() | self.product_keys.keys()
+            if before_keys.get(product_id) != self.product_keys.get(product_id)
+            for key in (before_keys.get(product_id), self.product_keys.get(product_id))
+            if key is not None
+        ]
+        renamed = [
+            supplier_id
+            for supplier_id in before_suppliers.keys() | self.supplier_names.keys()
+            if before_suppliers.get(supplier_id) != self.supplier_names.get(supplier_id)
+        ]
+        differs[moved] = True
+        differs |= np.isin(self.supplier, renamed)
+        return np.flatnonzero(differs)
+
+    def _lines(self, rows: List[Dict[str, Any]]) -> Tuple[SalesLines, List[int]]:
+        """Typed columns of fetched line rows, and the ids still missing their transaction"""
+        count = len(rows)
+        lines = SalesLines(
+            np.fromiter((row["ID"] for row in rows), np.int64, count),
+            np.fromiter((self._key(row["PRODUCTS"]) for row in rows), np.int32, count),
+            np.fromiter(
+                (NO_DAY if row["DAY"] is None else row["DAY"] for row in rows), np.int32, count
+            ),
+            np.fromiter((row["QTY"] or 0 for row in rows), np.float64, count),
+            np.fromiter((row["REVENUE"] or 0 for row in rows), np.float64, count),
+        )
+        return lines, [row["ID"] for row in rows if row["TRANS_ID"] is None]
+
+    async def _fetch_lines_after(self, after_id: int) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        while True:
+            page = await self._query(
+                SALES_LINES_SQL + " WHERE td.ID > %s ORDER BY td.ID LIMIT %s",
+                (after_id, self.page_size),
+            )
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            after_id = page[-1]["ID"]
+
+    async def _fetch_lines_by_id(self, ids: List[int]) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        for i in range(0, len(ids), self.page_size):
+            batch = ids[i : i + self.page_size]
+            placeholders = ", ".join(["%s"] * len(batch))
+            rows.extend(
+                await self._query(SALES_LINES_SQL + f" WHERE td.ID IN ({placeholders})", tuple(batch))
+            )
+        return rows
+
+    def _apply_lines(self, rows: List[Dict[str, Any]], requested: Iterable[int] = ()) -> np.ndarray:
+        """
+        Upsert fetched lines; `requested` ids that were not found are deleted.
+        Returns the products whose lines changed.
+        """
+        lines, missing = self._lines(rows)
+        changed = self.lines.upsert(lines)
+        found = {row["ID"] for row in rows}
+        gone = sorted(set(requested) - found)
+        if gone:
+            changed = np.union1d(changed, self.lines.delete(np.array(gone, np.int64)))
+        self.pending = (self.pending - found - set(gone)) | set(missing)
+        if rows:
+            self.last_line_id = max(self.last_line_id, max(found))
+        return changed
+
+    async def _changed(self, products: Optional[np.ndarray]):
+        """Invalidate computed results and tell the listener which products changed (None: all)"""
+        self.version += 1
+        if self.on_update:
+            # A failing listener must not stop the updates
+            try:
+                await self.on_update(None if products is None else [self.names[key] for key in products])
+            except Exception as e:
+                print(f"Error passing on sales analytics update: {e}")
+
+    async def load(self):
+        """Read every product and sales line"""
+        async with self.lock:
+            start = time.perf_counter()
+            changed = await self._load_products()
+            rows = await self._fetch_lines_after(-1)
+            lines, missing = self._lines(rows)
+            changed = np.union1d(changed, self.lines.changed_products(lines))
+            self.lines = lines
+            self.pending = set(missing)
+            self.last_line_id = int(lines.ids[-1]) if len(lines) else -1
+            # Nothing was answered from this instance's figures before the
+            # first load; a periodic reload only reports what it corrected
+            if self.loaded and len(changed):
+                await self._changed(changed)
+            self.loaded = True
+            self.stats["loads"] += 1
+            self.stats["last_load_seconds"] = round(time.perf_counter() - start, 3)
+            print(
+                f"Loaded sales analytics: {len(self.names)} products, {len(lines)} sales lines "
+                f"in {self.stats['last_load_seconds']}s"
+            )
+
+    async def update(self):
+        """Re-read stock levels, plus sales lines added since the last read and pending ones"""
+        async with self.lock:
+            start = time.perf_counter()
+            changed = await self._load_products()
+            rows = await self._fetch_lines_after(self.last_line_id)
+            pending = sorted(self.pending - {row["ID"] for row in rows})
+            if pending:
+                rows += await self._fetch_lines_by_id(pending)
+            changed = np.union1d(changed, self._apply_lines(rows, pending))
+            if len(changed):
+                await self._changed(changed)
+            self.stats["updates"] += 1
+            self.stats["last_update_seconds"] = round(time.perf_counter() - start, 3)
+
+    async def apply_changes(self, changes: Dict[str, Iterable[int]]):
+        """Apply change log entries: re-read changed sales lines, and stock levels if products changed"""
+        if not self.loaded:
+            return
+        async with self.lock:
+            changed = np.zeros(0, np.int64)
+            if "product" in changes or "supplier" in changes:
+                changed = await self._load_products()
+            ids = sorted(changes.get("transaction", ()))
+            if ids:
+                changed = np.union1d(changed, self._apply_lines(await self._fetch_lines_by_id(ids), ids))
+            if len(changed):
+                await self._changed(changed)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _loop(self):
+        reloaded_at = time.monotonic()
+        today = date.today()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if self.reload_minutes and time.monotonic() - reloaded_at >= self.reload_minutes * 60:
+                    await self.load()
+                    reloaded_at = time.monotonic()
+                else:
+                    await self.update()
+                if date.today() != today:
+                    # The window moved: every velocity and days left changes
+                    today = date.today()
+                    await self._changed(None)
+            except Exception as e:
+                print(f"Error updating sales analytics: {e}")
+                self.stats["errors"] += 1
+
+    def compute(self, as_of: Optional[date] = None) -> Dict[str, Any]:
+        """Per-product and per-supplier figures for the window ending on `as_of` (default today)"""
+        as_of = as_of or date.today()
+        if self.computed and self.computed[0] == (self.version, as_of):
+            return self.computed[1]
+
+        start = time.perf_counter()
+        size = len(self.names)
+        last_day = (as_of - EPOCH).days
+        lines = self.lines
+        in_window = (lines.day > last_day - self.window_days) & (lines.day <= last_day)
+        product = lines.product[in_window]
+        units = np.bincount(product, weights=lines.qty[in_window], minlength=size)
+        revenue = np.bincount(product, weights=lines.revenue[in_window], minlength=size)
+        velocity = units / self.window_days
+
+        on_hand = padded(self.on_hand, size)
+        price = padded(self.price, size)
+        supplier = padded(self.supplier, size, -1)
+        days_left = np.full(size, np.inf)
+        np.divide(on_hand, velocity, out=days_left, where=velocity > 0)
+        # Enough to last until delivery plus the cover period
+        horizon = self.lead_time_days + self.cover_days
+        reorder = np.ceil(np.maximum(velocity * horizon - np.maximum(on_hand, 0), 0))
+
+        flagged = np.flatnonzero(reorder > 0)
+        supplier_ids, supplier_index = np.unique(supplier[flagged], return_inverse=True)
+        result = {
+            "as_of": as_of,
+            "units": units,
+            "revenue": revenue,
+            "velocity": velocity,
+            "on_hand": on_hand,
+            "qty_stock": padded(self.qty_stock, size),
+            "price": price,
+            "supplier": supplier,
+            "days_left": days_left,
+            "reorder": reorder,
+            "flagged": flagged,
+            "supplier_ids": supplier_ids,
+            "supplier_products": np.bincount(supplier_index, minlength=len(supplier_ids)),
+            "supplier_units": np.bincount(
+                supplier_index, weights=reorder[flagged], minlength=len(supplier_ids)
+            ),
+            "supplier_cost": np.bincount(
+                supplier_index, weights=(reorder * price)[flagged], minlength=len(supplier_ids)
+            ),
+        }
+        self.stats["last_compute_seconds"] = round(time.perf_counter() - start, 4)
+        self.computed = ((self.version, as_of), result)
+        return result
+
+    def supplier_name(self, supplier_id: int) -> Optional[str]:
+        return self.supplier_names.get(supplier_id) if supplier_id >= 0 else None
+
+    def product_row(self, result: Dict[str, Any], key: int) -> Dict[str, Any]:
+        days_left = result["days_left"][key]
+        supplier_id = int(result["supplier"][key])
+        return {
+            "product": self.names[key],
+            "supplier_id": supplier_id if supplier_id >= 0 else None,
+            "supplier": self.supplier_name(supplier_id),
+            "qty_stock": int(result["qty_stock"][key]),
+            "on_hand": int(result["on_hand"][key]),
+            "units_sold": int(result["units"][key]),
+            "revenue": round(float(result["revenue"][key]), 2),
+            "velocity": round(float(result["velocity"][key]), 3),
+            # None when nothing sold in the window
+            "days_left": round(float(days_left), 1) if math.isfinite(days_left) else None,
+            "reorder_units": int(result["reorder"][key]),
+        }
+
+    def window(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "as_of": result["as_of"].isoformat(),
+            "window_days": self.window_days,
+            "lead_time_days": self.lead_time_days,
+            "cover_days": self.cover_days,
+        }
+
+    def product_report(
+        self, sort: str = "days_left", limit: int = 20, as_of: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """Products ordered by fewest days left, or highest velocity, revenue or reorder quantity"""
+        result = self.compute(as_of)
+        if sort == "days_left":
+            order = np.argsort(result["days_left"], kind="stable")
+        else:
+            values = {"velocity": result["velocity"], "revenue": result["revenue"], "reorder": result["reorder"]}[sort]
+            order = np.argsort(-values, kind="stable")
+        return {
+            **self.window(result),
+            "products": len(self.names),
+            "compute_seconds": self.stats["last_compute_seconds"],
+            "items": [self.product_row(result, int(key)) for key in order[:limit]],
+        }
+
+    def reorder_report(
+        self, limit: int = 20, as_of: Optional[date] = None, items_per_supplier: int = 10
+    ) -> Dict[str, Any]:
+        """Suppliers with products to reorder, by estimated order cost"""
+        result = self.compute(as_of)
+        flagged = result["flagged"]
+        suppliers = []
+        for index in np.argsort(-result["supplier_cost"], kind="stable")[:limit]:
+            supplier_id = int(result["supplier_ids"][index])
+            keys = flagged[result["supplier"][flagged] == supplier_id]
+            keys = keys[np.argsort(result["days_left"][keys], kind="stable")][:items_per_supplier]
+            suppliers.append(
+                {
+                    "supplier_id": supplier_id if supplier_id >= 0 else None,
+                    "supplier": self.supplier_name(supplier_id),
+                    "products": int(result["supplier_products"][index]),
+                    "units": int(result["supplier_units"][index]),
+                    "cost": round(float(result["supplier_cost"][index]), 2),
+                    "items": [self.product_row(result, int(key)) for key in keys],
+                }
+            )
+        return {
+            **self.window(result),
+            "products_to_reorder": len(flagged),
+            "compute_seconds": self.stats["last_compute_seconds"],
+            "suppliers": suppliers,
+        }
+
+    def describe_product(self, result: Dict[str, Any], key: int) -> str:
+        row = self.product_row(result, key)
+        text = (
+            f"Sales analytics for product {row['product']} over the {self.window_days} days to "
+            f"{result['as_of'].isoformat()}: {row['units_sold']} units sold "
+            f"({row['velocity']:.2f} per day) for {money(row['revenue'])}; "
+            f"{row['on_hand']} on hand of {row['qty_stock']} stocked"
+        )
+        if row["days_left"] is None:
+            text += ", no recent sales"
+        else:
+            text += f", about {row['days_left']:.0f} days of stock left"
+        if row["reorder_units"]:
+            text += f"; reorder {row['reorder_units']} units from {row['supplier'] or 'its supplier'}"
+        return text
+
+    def describe_reorder(self, as_of: Optional[date] = None, limit: int = 5) -> str:
+        report = self.reorder_report(limit, as_of, items_per_supplier=3)
+        header = (
+            f"Reorder suggestions as of {report['as_of']} (sales over the last "
+            f"{self.window_days} days, {self.lead_time_days} days lead time, "
+            f"{self.cover_days} days of cover)"
+        )
+        if not report["suppliers"]:
+            return f"{header}: no products need reordering"
+        parts = []
+        for supplier in report["suppliers"]:
+            items = ", ".join(
+                f"{item['product']} ({item['reorder_units']} units, "
+                f"{item['days_left']:.0f} days left)"
+                for item in supplier["items"]
+            )
+            parts.append(
+                f"{supplier['supplier'] or 'No supplier'}: {supplier['units']} units of "
+                f"{supplier['products']} products, about {money(supplier['cost'])}: {items}"
+            )
+        return f"{header}: " + "; ".join(parts)
+
+    def context_documents(
+        self, question: str, docs: List[Dict[str, Any]], as_of: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        `docs` with analytics entries added: a reorder summary first when the
+        question is about reordering or running out, and the velocity and
+        days of stock left of every product the documents are about.
+        """
+        if not self.loaded:
+            return docs
+        result = self.compute(as_of)
+        before: List[Dict[str, Any]] = []
+        if REORDER_PATTERN.search(question):
+            before.append(self.analytics_document("reorder", self.describe_reorder(as_of)))
+
+        keys: List[int] = []
+        for doc in docs:
+            metadata = doc.get("metadata") or {}
+            doc_type = metadata.get("type")
+            if doc_type == "product":
+                key = self.product_keys.get(metadata.get("id"))
+            elif doc_type in ("product_daily_sales", "product_monthly_sales"):
+                # Rollup ids are CRC32(name) * 10^8 + period
+                key = self.crc_keys.get(int(metadata.get("id", 0)) // 100000000)
+            else:
+                continue
+            if key is not None and key not in keys:
+                keys.append(key)
+        after = [
+            self.analytics_document(product_document(self.names[key]), self.describe_product(result, key))
+            for key in keys
+        ]
+        return before + docs + after
+
+    @staticmethod
+    def analytics_document(name: str, content: str) -> Dict[str, Any]:
+        return {
+            "id": f"analytics_{name}",
+            "content": content,
+            "metadata": {"type": "analytics", "id": name},
+        }
+
+    @staticmethod
+    def document_ids(products: Iterable[str]) -> List[str]:
+        """Ids of the analytics documents that change with `products`: theirs and the reorder summary"""
+        return ["analytics_reorder"] + [f"analytics_{product_document(name)}" for name in products]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "running": self.task is not None,
+            "products": len(self.names),
+            "sales_lines": len(self.lines),
+            "pending_lines": len(self.pending),
+            "version": self.version,
+            **self.stats,
+        }
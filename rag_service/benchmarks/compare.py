@@ -0,0 +1,98 @@
+"""
+Compare two benchmark result files written by benchmarks/run.py.
+
+    python benchmarks/compare.py baseline.json candidate.json --tolerance 0.1
+
+Prints each metric side by side and exits with status 1 if the candidate
+is worse than the baseline by more than the tolerance (a fraction) on any
+of: chat p95/p99 latency or throughput per concurrency level, refresh
+throughput, or peak RSS.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# (label, baseline value, candidate value, higher is better)
+Row = Tuple[str, Optional[float], Optional[float], bool]
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as results:
+        return json.load(results)
+
+
+def rows(baseline: Dict[str, Any], candidate: Dict[str, Any]) -> List[Row]:
+    result: List[Row] = []
+    refreshes = {run["mode"]: run for run in candidate.get("refresh", [])}
+    for run in baseline.get("refresh", []):
+        other = refreshes.get(run["mode"], {})
+        result.append((f"refresh {run['mode']} docs/sec", run.get("docs_per_sec"), other.get("docs_per_sec"), True))
+
+    levels = {run["concurrency"]: run for run in candidate.get("chat", [])}
+    for run in baseline.get("chat", []):
+        other = levels.get(run["concurrency"])
+        if other is None:
+            continue
+        prefix = f"chat c={run['concurrency']}"
+        result.append((f"{prefix} req/s", run["throughput_rps"], other["throughput_rps"], True))
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            result.append((f"{prefix} {key}", run["latency"].get(key), other["latency"].get(key), False))
+        result.append((f"{prefix} errors", run["errors"], other["errors"], False))
+
+    result.append(("peak RSS MB", baseline.get("peak_rss_mb"), candidate.get("peak_rss_mb"), False))
+    return result
+
+
+GATED = ("docs/sec", "req/s", "p95_ms", "p99_ms", "peak RSS MB")
+
+
+def regressed(row: Row, tolerance: float) -> bool:
+    label, before, after, higher_is_better = row
+    if before is None or after is None or not label.endswith(GATED):
+        return False
+    if higher_is_better:
+        return after < before * (1 - tolerance)
+    return after > before * (1 + tolerance)
+
+
+def change(before: Optional[float], after: Optional[float]) -> str:
+    if before is None or after is None:
+        return "n/a"
+    if before == 0:
+        return "same" if after == 0 else "new"
+    return f"{(after - before) / before:+.1%}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression")
+    args = parser.parse_args()
+
+    baseline = load(args.baseline)
+    candidate = load(args.candidate)
+    print(
+        f"baseline {baseline.get('version', {}).get('git_commit')} vs "
+        f"candidate {candidate.get('version', {}).get('git_commit')}"
+    )
+    if baseline.get("dataset") != candidate.get("dataset"):
+        print("Warning: the runs used different datasets")
+
+    failures = []
+    for row in rows(baseline, candidate):
+        flag = ""
+        if regressed(row, args.tolerance):
+            failures.append(row[0])
+            flag = "  REGRESSION"
+        print(f"{row[0]:<28} {str(row[1]):>12} {str(row[2]):>12} {change(row[1], row[2]):>9}{flag}")
+
+    if failures:
+        print(f"{len(failures)} metric(s) regressed by more than {args.tolerance:.0%}: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
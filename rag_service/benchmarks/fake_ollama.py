@@ -0,0 +1,156 @@
+"""
+Stand-in for the Ollama HTTP API (embed, chat, tags, pull) with a
+configurable embedding dimension and generation latency.
+
+    python benchmarks/fake_ollama.py --port 11500 --dim 768 --ttft 0.2 --tokens 40
+
+Embeddings are deterministic per text, so repeated questions embed
+identically. Chat replies stream `--tokens` tokens after `--ttft` seconds,
+one every `--token-latency` seconds.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import List
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+settings = {
+    "dim": 768,
+    "embed_latency": 0.005,
+    "embed_latency_per_text": 0.0005,
+    "ttft": 0.2,
+    "token_latency": 0.02,
+    "tokens": 40,
+    "models": ["nomic-embed-text", "smollm2:360m"],
+}
+stats = {"embed_requests": 0, "embedded_texts": 0, "chat_requests": 0, "chat_inflight": 0, "chat_inflight_max": 0}
+
+app = FastAPI(title="Fake Ollama")
+
+
+def embedding(text: str) -> List[float]:
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "big")
+    return np.random.default_rng(seed).standard_normal(settings["dim"]).tolist()
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@app.get("/")
+async def root():
+    return "Ollama is running"
+
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": model, "model": model} for model in settings["models"]]}
+
+
+@app.post("/api/pull")
+async def pull():
+    return {"status": "success"}
+
+
+@app.post("/api/embed")
+async def embed(request: Request):
+    body = await request.json()
+    texts = body.get("input", [])
+    if isinstance(texts, str):
+        texts = [texts]
+    stats["embed_requests"] += 1
+    stats["embedded_texts"] += len(texts)
+    await asyncio.sleep(settings["embed_latency"] + settings["embed_latency_per_text"] * len(texts))
+    return {"model": body.get("model"), "embeddings": [embedding(text) for text in texts]}
+
+
+@app.post("/api/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    await asyncio.sleep(settings["embed_latency"])
+    return {"embedding": embedding(body.get("prompt", ""))}
+
+
+def reply_tokens(messages: list) -> List[str]:
+    prompt = messages[-1]["content"] if messages else ""
+    words = prompt.split()[-settings["tokens"]:] or ["ok"]
+    return [words[i % len(words)] + " " for i in range(settings["tokens"])]
+
+
+def chat_chunk(model: str, content: str, done: bool) -> dict:
+    chunk = {
+        "model": model,
+        "created_at": now(),
+        "message": {"role": "assistant", "content": content},
+        "done": done,
+    }
+    if done:
+        chunk["done_reason"] = "stop"
+    return chunk
+
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body = await request.json()
+    model = body.get("model")
+    tokens = reply_tokens(body.get("messages", []))
+    stats["chat_requests"] += 1
+    stats["chat_inflight"] += 1
+    stats["chat_inflight_max"] = max(stats["chat_inflight_max"], stats["chat_inflight"])
+
+    if not body.get("stream", True):
+        try:
+            await asyncio.sleep(settings["ttft"] + settings["token_latency"] * len(tokens))
+        finally:
+            stats["chat_inflight"] -= 1
+        return JSONResponse(chat_chunk(model, "".join(tokens), True))
+
+    async def stream():
+        try:
+            await asyncio.sleep(settings["ttft"])
+            for token in tokens:
+                yield json.dumps(chat_chunk(model, token, False)) + "\n"
+                await asyncio.sleep(settings["token_latency"])
+            yield json.dumps(chat_chunk(model, "", True)) + "\n"
+        finally:
+            stats["chat_inflight"] -= 1
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--dim", type=int, default=settings["dim"])
+    parser.add_argument("--embed-latency", type=float, default=settings["embed_latency"])
+    parser.add_argument("--embed-latency-per-text", type=float, default=settings["embed_latency_per_text"])
+    parser.add_argument("--ttft", type=float, default=settings["ttft"], help="seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=settings["token_latency"])
+    parser.add_argument("--tokens", type=int, default=settings["tokens"])
+    args = parser.parse_args()
+    settings.update(
+        dim=args.dim,
+        embed_latency=args.embed_latency,
+        embed_latency_per_text=args.embed_latency_per_text,
+        ttft=args.ttft,
+        token_latency=args.token_latency,
+        tokens=args.tokens,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
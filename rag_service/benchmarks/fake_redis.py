@@ -0,0 +1,243 @@
+"""
+Minimal in-memory Redis server speaking RESP2, covering the commands the
+RAG service uses. For benchmarking where no Redis is available.
+
+    python benchmarks/fake_redis.py --port 6390
+
+Keys expire lazily on access. Unsupported commands return an error.
+"""
+import argparse
+import asyncio
+import fnmatch
+import time
+from typing import Any, Dict, List, Optional
+
+data: Dict[bytes, Any] = {}
+expires: Dict[bytes, float] = {}
+
+
+class CommandError(Exception):
+    pass
+
+
+def alive(key: bytes) -> bool:
+    deadline = expires.get(key)
+    if deadline is not None and deadline <= time.monotonic():
+        data.pop(key, None)
+        expires.pop(key, None)
+    return key in data
+
+
+def get_value(key: bytes, kind: type, default=None):
+    if not alive(key):
+        return default
+    value = data[key]
+    if not isinstance(value, kind):
+        raise CommandError("WRONGTYPE Operation against a key holding the wrong kind of value")
+    return value
+
+
+def set_value(key: bytes, value: Any, ttl: Optional[float] = None):
+    data[key] = value
+    if ttl is None:
+        expires.pop(key, None)
+    else:
+        expires[key] = time.monotonic() + ttl
+
+
+def cmd_set(args):
+    key, value = args[0], args[1]
+    options = [arg.upper() for arg in args[2:]]
+    ttl = None
+    if b"NX" in options and alive(key):
+        return None
+    if b"EX" in options:
+        ttl = float(args[2 + options.index(b"EX") + 1])
+    if b"PX" in options:
+        ttl = float(args[2 + options.index(b"PX") + 1]) / 1000
+    set_value(key, value, ttl)
+    return "OK"
+
+
+def cmd_incrby(key: bytes, amount: int) -> int:
+    value = int(get_value(key, bytes, b"0")) + amount
+    data[key] = str(value).encode()
+    return value
+
+
+def cmd_expire(key: bytes, seconds: bytes) -> int:
+    if not alive(key):
+        return 0
+    expires[key] = time.monotonic() + float(seconds)
+    return 1
+
+
+def cmd_ttl(key: bytes) -> int:
+    if not alive(key):
+        return -2
+    deadline = expires.get(key)
+    return -1 if deadline is None else int(deadline - time.monotonic())
+
+
+def cmd_sadd(key: bytes, *members: bytes) -> int:
+    members_set = get_value(key, set)
+    if members_set is None:
+        members_set = set()
+        data[key] = members_set
+    before = len(members_set)
+    members_set.update(members)
+    return len(members_set) - before
+
+
+def cmd_zincrby(key: bytes, amount: bytes, member: bytes) -> bytes:
+    scores = get_value(key, dict)
+    if scores is None:
+        scores = {}
+        data[key] = scores
+    scores[member] = scores.get(member, 0.0) + float(amount)
+    return repr(scores[member]).encode()
+
+
+def cmd_zrevrange(key: bytes, start: bytes, stop: bytes, *options: bytes) -> List[bytes]:
+    scores = get_value(key, dict, {})
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    stop_index = int(stop)
+    ranked = ranked[int(start) : None if stop_index == -1 else stop_index + 1]
+    if options and options[0].upper() == b"WITHSCORES":
+        result = []
+        for member, score in ranked:
+            result.extend([member, repr(score).encode()])
+        return result
+    return [member for member, _ in ranked]
+
+
+def cmd_scan(cursor: bytes, *options: bytes) -> list:
+    pattern = b"*"
+    for i, option in enumerate(options):
+        if option.upper() == b"MATCH":
+            pattern = options[i + 1]
+    keys = [key for key in list(data) if alive(key) and fnmatch.fnmatchcase(key, pattern)]
+    return [b"0", keys]
+
+
+def cmd_delete(*keys: bytes) -> int:
+    count = 0
+    for key in keys:
+        if alive(key):
+            del data[key]
+            expires.pop(key, None)
+            count += 1
+    return count
+
+
+def cmd_hello(*args) -> list:
+    if args and args[0] != b"2":
+        raise CommandError("NOPROTO sorry, this protocol version is not supported")
+    return [b"server", b"redis", b"version", b"6.0.0", b"proto", 2, b"mode", b"standalone"]
+
+
+def cmd_flush(*args) -> str:
+    data.clear()
+    expires.clear()
+    return "OK"
+
+
+COMMANDS = {
+    b"PING": lambda *args: "PONG",
+    b"SELECT": lambda *args: "OK",
+    b"CLIENT": lambda *args: "OK",
+    b"HELLO": cmd_hello,
+    b"GET": lambda key: get_value(key, bytes),
+    b"SET": lambda *args: cmd_set(args),
+    b"SETEX": lambda key, ttl, value: set_value(key, value, float(ttl)) or "OK",
+    b"MGET": lambda *keys: [get_value(key, bytes) for key in keys],
+    b"DEL": cmd_delete,
+    b"UNLINK": cmd_delete,
+    b"EXISTS": lambda *keys: sum(1 for key in keys if alive(key)),
+    b"INCR": lambda key: cmd_incrby(key, 1),
+    b"INCRBY": lambda key, amount: cmd_incrby(key, int(amount)),
+    b"EXPIRE": cmd_expire,
+    b"TTL": cmd_ttl,
+    b"SADD": cmd_sadd,
+    b"SMEMBERS": lambda key: list(get_value(key, set, set())),
+    b"ZINCRBY": cmd_zincrby,
+    b"ZREVRANGE": cmd_zrevrange,
+    b"ZCARD": lambda key: len(get_value(key, dict, {})),
+    b"SCAN": cmd_scan,
+    b"DBSIZE": lambda: sum(1 for key in list(data) if alive(key)),
+    b"FLUSHALL": cmd_flush,
+    b"FLUSHDB": cmd_flush,
+}
+
+
+def encode(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, str):
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b":" + str(value).encode() + b"\r\n"
+    if isinstance(value, bytes):
+        return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+    if isinstance(value, (list, tuple)):
+        return b"*" + str(len(value)).encode() + b"\r\n" + b"".join(encode(item) for item in value)
+    raise TypeError(f"Cannot encode {type(value)}")
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, e.g. from redis-cli or telnet
+        return line.strip().split()
+    args = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            args = await read_command(reader)
+            if args is None:
+                break
+            if not args:
+                continue
+            command = COMMANDS.get(args[0].upper())
+            try:
+                if command is None:
+                    raise CommandError(f"ERR unknown command '{args[0].decode(errors='replace')}'")
+                reply = encode(command(*args[1:]))
+            except CommandError as e:
+                reply = b"-" + str(e).encode() + b"\r\n"
+            except (TypeError, ValueError, IndexError) as e:
+                reply = b"-ERR " + str(e).encode() + b"\r\n"
+            writer.write(reply)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int):
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Fill the Database/scms.sql schema with synthetic suppliers, customers,
+products and transactions for benchmarking.
+
+    DB_NAME=scms_bench python benchmarks/generate_data.py --products 100000 --transactions 100000 --reset
+
+Connects with the DB_* settings of config.py, and only to a dedicated
+benchmark database: DB_NAME must contain "bench". Create one with the
+Database/scms.sql schema, e.g.
+
+    mysql -e "CREATE DATABASE scms_bench" && mysql scms_bench < Database/scms.sql
+
+Rows are appended after the current maximum ids unless --reset is given,
+which first deletes every product, supplier, customer and transaction row.
+The change log is cleared either way. Output is deterministic for a given
+--seed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from typing import Iterator, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mysql.connector
+from config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_PORT
+
+BRANDS = ["A4tech", "Logitech", "Fantech", "Newmen", "Lenovo", "Acer", "Asus", "Razer", "Corsair", "Kingston"]
+ITEMS = ["Mouse", "Keyboard", "Monitor", "Headset", "Laptop", "Speaker", "Webcam", "SSD", "Router", "Charger"]
+FIRST_NAMES = ["Hailee", "Kimbert", "Chuchay", "Prince", "Monica", "Josuey", "Erick", "Lia", "Marco", "Ana"]
+LAST_NAMES = ["Steinfield", "Duyag", "Jusay", "Ly", "Empinado", "Rufino", "Cesar", "Santos", "Reyes", "Cruz"]
+EMPLOYEES = [("Prince Ly", "Manager"), ("Josuey Mag-asos", "Cashier"), ("Monica Empinado", "Manager")]
+
+RESET_TABLES = ["transaction_details", "transaction", "product", "customer", "supplier"]
+
+
+def require_benchmark_database():
+    """Refuse to write synthetic rows into a database that is not for benchmarks"""
+    if "bench" not in DB_NAME.lower():
+        raise SystemExit(
+            f"Refusing to load benchmark data into database {DB_NAME!r} at {DB_HOST}:{DB_PORT}. "
+            "Point DB_NAME at a dedicated benchmark database (its name must contain 'bench'), "
+            "or pass --skip-load to benchmark the existing data."
+        )
+
+
+def pos_timestamp(day: date, rng: random.Random) -> str:
+    """A transaction time as the POS writes it: PHP date("Y-m-d H:i a")"""
+    hour, minute = rng.randrange(8, 21), rng.randrange(60)
+    return f"{day.isoformat()} {hour:02d}:{minute:02d} {'am' if hour < 12 else 'pm'}"
+
+
+def batches(rows: Iterator[tuple], size: int) -> Iterator[List[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def next_id(cursor, table: str, column: str) -> int:
+    cursor.execute(f"SELECT COALESCE(MAX({column}), 0) FROM `{table}`")
+    return cursor.fetchone()[0] + 1
+
+
+class Generator:
+    def __init__(self, connection, seed: int, batch_size: int):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+
+    def insert(self, table: str, columns: List[str], rows: Iterator[tuple]) -> int:
+        placeholders = ", ".join(["%s"] * len(columns))
+        sql = f"INSERT INTO `{table}` ({', '.join(columns)}) VALUES ({placeholders})"
+        count = 0
+        for batch in batches(rows, self.batch_size):
+            self.cursor.executemany(sql, batch)
+            self.connection.commit()
+            count += len(batch)
+        return count
+
+    def ids(self, table: str, column: str) -> List[int]:
+        self.cursor.execute(f"SELECT {column} FROM `{table}`")
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def suppliers(self, count: int, locations: List[int]) -> Tuple[int, int]:
+        first = next_id(self.cursor, "supplier", "SUPPLIER_ID")
+        rows = (
+            (
+                first + i,
+                f"{self.random.choice(BRANDS)} Supply {first + i}",
+                self.random.choice(locations),
+                f"09{self.random.randrange(10**9):09d}",
+            )
+            for i in range(count)
+        )
+        self.insert("supplier", ["SUPPLIER_ID", "COMPANY_NAME", "LOCATION_ID", "PHONE_NUMBER"], rows)
+        return first, first + count
+
+    def customers(self, count: int) -> Tuple[int, int]:
+        first = next_id(self.cursor, "customer", "CUST_ID")
+        rows = (
+            (
+                first + i,
+                self.random.choice(FIRST_NAMES),
+                f"{self.random.choice(LAST_NAMES)}{i}",
+                f"09{(first + i) % 10**9:09d}",
+            )
+            for i in range(count)
+        )
+        self.insert("customer", ["CUST_ID", "FIRST_NAME", "LAST_NAME", "PHONE_NUMBER"], rows)
+        return first, first + count
+
+    def products(self, count: int, categories: List[int], suppliers: Tuple[int, int]) -> List[Tuple[str, int]]:
+        """Insert products; returns (name, price) of each for transaction lines"""
+        first = next_id(self.cursor, "product", "PRODUCT_ID")
+        catalog = []
+        today = date.today()
+
+        def rows():
+            for i in range(count):
+                product_id = first + i
+                name = f"{self.random.choice(BRANDS)} {self.random.choice(ITEMS)} {product_id}"
+                price = self.random.randrange(100, 80000)
+                qty = self.random.randrange(0, 1000)
+                catalog.append((name, price))
+                yield (
+                    product_id,
+                    f"2019{product_id:06d}",
+                    name,
+                    f"Synthetic {name.lower()}",
+                    qty,
+                    self.random.randrange(0, qty + 1),
+                    price,
+                    self.random.choice(categories),
+                    self.random.randrange(*suppliers),
+                    (today - timedelta(days=self.random.randrange(730))).isoformat(),
+                )
+
+        self.insert(
+            "product",
+            ["PRODUCT_ID", "PRODUCT_CODE", "NAME", "DESCRIPTION", "QTY_STOCK", "ON_HAND",
+             "PRICE", "CATEGORY_ID", "SUPPLIER_ID", "DATE_STOCK_IN"],
+            rows(),
+        )
+        return catalog
+
+    def transactions(
+        self, count: int, customers: Tuple[int, int], catalog: List[Tuple[str, int]], days: int
+    ) -> int:
+        """Insert `count` transactions of 1-4 line items each; returns the line item count"""
+        first = next_id(self.cursor, "transaction", "TRANS_ID")
+        first_line = next_id(self.cursor, "transaction_details", "ID")
+        today = date.today()
+        headers = []
+
+        def lines():
+            line_id = first_line
+            for i in range(count):
+                trans_id = first + i
+                detail_id = f"{trans_id:010d}"
+                subtotal = 0
+                items = self.random.randint(1, 4)
+                for _ in range(items):
+                    name, price = self.random.choice(catalog)
+                    qty = self.random.randint(1, 5)
+                    subtotal += qty * price
+                    employee, role = self.random.choice(EMPLOYEES)
+                    yield (line_id, detail_id, name, str(qty), str(price), employee, role)
+                    line_id += 1
+                vat = subtotal * 0.12 / 1.12
+                headers.append(
+                    (
+                        trans_id,
+                        self.random.randrange(*customers),
+                        str(items),
+                        f"{subtotal:,.2f}",
+                        f"{vat:,.2f}",
+                        f"{subtotal - vat:,.2f}",
+                        f"{vat:,.2f}",
+                        f"{subtotal:,.2f}",
+                        str(subtotal),
+                        pos_timestamp(today - timedelta(days=self.random.randrange(days)), self.random),
+                        detail_id,
+                    )
+                )
+
+        line_count = self.insert(
+            "transaction_details",
+            ["ID", "TRANS_D_ID", "PRODUCTS", "QTY", "PRICE", "EMPLOYEE", "ROLE"],
+            lines(),
+        )
+        self.insert(
+            "transaction",
+            ["TRANS_ID", "CUST_ID", "NUMOFITEMS", "SUBTOTAL", "LESSVAT", "NETVAT",
+             "ADDVAT", "GRANDTOTAL", "CASH", "DATE", "TRANS_D_ID"],
+            iter(headers),
+        )
+        return line_count
+
+
+def generate(
+    products: int,
+    transactions: int,
+    customers: int = 0,
+    suppliers: int = 0,
+    days: int = 365,
+    seed: int = 42,
+    reset: bool = False,
+    batch_size: int = 5000,
+) -> dict:
+    """Load the synthetic dataset and return its row counts"""
+    require_benchmark_database()
+    customers = customers or max(products // 10, 10)
+    suppliers = suppliers or max(products // 1000, 5)
+    start = time.perf_counter()
+    connection = mysql.connector.connect(
+        host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME, port=DB_PORT
+    )
+    try:
+        generator = Generator(connection, seed, batch_size)
+        generator.cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        if reset:
+            for table in RESET_TABLES:
+                generator.cursor.execute(f"DELETE FROM `{table}`")
+            connection.commit()
+
+        categories = generator.ids("category", "CATEGORY_ID")
+        locations = generator.ids("location", "LOCATION_ID")
+        supplier_range = generator.suppliers(suppliers, locations)
+        customer_range = generator.customers(customers)
+        catalog = generator.products(products, categories, supplier_range)
+        line_items = generator.transactions(transactions, customer_range, catalog, days)
+
+        # Bulk loads are not meant to be replayed by the change log tailer
+        try:
+            generator.cursor.execute("DELETE FROM scms_changelog")
+            connection.commit()
+        except mysql.connector.Error:
+            pass
+    finally:
+        connection.close()
+
+    counts = {
+        "products": products,
+        "transactions": transactions,
+        "transaction_line_items": line_items,
+        "customers": customers,
+        "suppliers": suppliers,
+        "seed": seed,
+        "load_seconds": round(time.perf_counter() - start, 1),
+    }
+    print(f"Generated {counts}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--customers", type=int, default=0, help="default: products / 10")
+    parser.add_argument("--suppliers", type=int, default=0, help="default: products / 1000")
+    parser.add_argument("--days", type=int, default=365, help="spread transactions over this many days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--reset", action="store_true", help="delete existing rows first")
+    args = parser.parse_args()
+    generate(
+        args.products,
+        args.transactions,
+        args.customers,
+        args.suppliers,
+        args.days,
+        args.seed,
+        args.reset,
+        args.batch_size,
+    )
+
+
+if __name__ == "__main__":
+    main()
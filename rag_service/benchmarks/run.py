@@ -0,0 +1,423 @@
+"""
+Offline benchmark of the RAG service against local stand-ins.
+
+    DB_NAME=scms_bench python benchmarks/run.py --reset --products 10000 \\
+        --transactions 10000 --concurrency 1,8,32 --requests 500 --output results.json
+
+Starts the fake Ollama server and the fake Redis server (unless
+--ollama-host / --redis-port point at real ones), optionally loads a
+synthetic dataset into the MySQL configured by the DB_* settings (e.g.
+`docker compose up db`; DB_NAME must name a dedicated benchmark database,
+see generate_data.py, and existing rows are only deleted with --reset), then runs the service with a throwaway ChromaDB
+directory and measures:
+
+- full and incremental refresh time and documents embedded per second
+- /chat latency percentiles and throughput at each concurrency level,
+  with the answer routes taken and mean time per pipeline stage
+- peak RSS of the service process
+
+Results are written as JSON; compare two runs with benchmarks/compare.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(HERE)
+sys.path.insert(0, SERVICE_DIR)
+
+import mysql.connector
+from config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_PORT
+
+RAG_QUESTIONS = [
+    "Tell me about {name}",
+    "Which supplier provides {name}?",
+    "Who bought {name} recently?",
+    "Is {name} a good choice for gaming?",
+]
+SQL_QUESTIONS = [
+    "What is the current stock of {name}?",
+    "What is the price of {name}?",
+    "Which products are below 5 units?",
+    "What are the total sales this month?",
+    "What are the top 5 best selling products this year?",
+]
+EXACT_QUESTIONS = ["Show me product {code}"]
+
+
+def start_process(args: List[str], env: Optional[Dict[str, str]] = None, log_path: Optional[str] = None):
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    return subprocess.Popen(
+        args, cwd=SERVICE_DIR, env={**os.environ, **(env or {})}, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def stop_process(process: Optional[subprocess.Popen]):
+    if process and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def wait_for(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def memory_mb(pid: int, field: str) -> Optional[float]:
+    """VmRSS / VmHWM (peak RSS) of a process from /proc, in MB"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    values = sorted(latencies)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(1000 * sum(values) / len(values), 2),
+        "p50_ms": round(1000 * percentile(values, 50), 2),
+        "p95_ms": round(1000 * percentile(values, 95), 2),
+        "p99_ms": round(1000 * percentile(values, 99), 2),
+        "max_ms": round(1000 * values[-1], 2),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def sample_products(limit: int = 200) -> List[Dict[str, Any]]:
+    connection = mysql.connector.connect(
+        host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME, port=DB_PORT
+    )
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT COALESCE(MAX(PRODUCT_ID), 0) AS MAX_ID FROM product")
+        max_id = cursor.fetchone()["MAX_ID"]
+        cursor.execute(
+            "SELECT NAME, PRODUCT_CODE FROM product WHERE PRODUCT_ID >= %s LIMIT %s",
+            (random.Random(1).randint(0, max(max_id - limit, 0)), limit),
+        )
+        return cursor.fetchall()
+    finally:
+        connection.close()
+
+
+def build_questions(
+    products: List[Dict[str, Any]],
+    count: int,
+    repeat_share: float,
+    sql_share: float,
+    exact_share: float,
+    seed: int,
+) -> List[str]:
+    """
+    Question mix: a share repeats a small hot set (cache hits), a share is
+    answerable from SQL, a share names a product code, the rest need RAG
+    """
+    rng = random.Random(seed)
+
+    def fill(template: str) -> str:
+        product = rng.choice(products)
+        return template.format(name=product["NAME"], code=product["PRODUCT_CODE"])
+
+    hot = [fill(rng.choice(RAG_QUESTIONS)) for _ in range(10)]
+    questions = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < repeat_share:
+            questions.append(rng.choice(hot))
+        elif roll < repeat_share + sql_share:
+            questions.append(fill(rng.choice(SQL_QUESTIONS)))
+        elif roll < repeat_share + sql_share + exact_share:
+            questions.append(fill(rng.choice(EXACT_QUESTIONS)))
+        else:
+            questions.append(fill(rng.choice(RAG_QUESTIONS)))
+    return questions
+
+
+async def run_refresh(client: httpx.AsyncClient, mode: str, timeout: float) -> Dict[str, Any]:
+    start = time.perf_counter()
+    response = await client.post("/refresh-embeddings", params={"mode": mode})
+    response.raise_for_status()
+    job_url = response.json()["status_url"]
+    deadline = time.monotonic() + timeout
+    while True:
+        job = (await client.get(job_url)).json()
+        if job["status"] != "running":
+            break
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{mode} refresh did not finish within {timeout}s")
+        await asyncio.sleep(0.5)
+    elapsed = time.perf_counter() - start
+    stats = job.get("stats") or {}
+    return {
+        "mode": mode,
+        "status": job["status"],
+        "seconds": round(elapsed, 2),
+        "documents": stats.get("documents"),
+        "embedded": stats.get("embedded"),
+        "docs_per_sec": round(stats["documents"] / elapsed, 1) if stats.get("documents") else 0.0,
+        "embedding_docs_per_sec": (stats.get("embedding") or {}).get("docs_per_sec"),
+        "error": job.get("error"),
+    }
+
+
+async def run_load(
+    client: httpx.AsyncClient, questions: List[str], concurrency: int, n_results: int
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    routes: Dict[str, int] = {}
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for question in questions:
+        queue.put_nowait(question)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                question = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.post("/chat", json={"question": question, "n_results": n_results})
+                elapsed = time.perf_counter() - start
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+                latencies.append(elapsed)
+                route = response.json().get("route", "unknown")
+                routes[route] = routes.get(route, 0) + 1
+            except httpx.HTTPError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(questions),
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize(latencies),
+        "routes": routes,
+    }
+
+
+STAGE_PATTERN = re.compile(r'^rag_chat_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$')
+
+
+async def stage_totals(client: httpx.AsyncClient) -> Dict[str, Dict[str, float]]:
+    """Cumulative {stage: {"sum": seconds, "count": n}} from the service's /metrics"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for line in (await client.get("/metrics")).text.splitlines():
+        match = STAGE_PATTERN.match(line)
+        if match:
+            kind, stage, value = match.groups()
+            totals.setdefault(stage, {})[kind] = float(value)
+    return totals
+
+
+def stage_means(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    """Mean milliseconds per chat stage between two scrapes"""
+    means = {}
+    for stage, values in sorted(after.items()):
+        previous = before.get(stage, {})
+        count = values.get("count", 0) - previous.get("count", 0)
+        if count:
+            means[stage] = round(1000 * (values.get("sum", 0) - previous.get("sum", 0)) / count, 3)
+    return means
+
+
+async def benchmark(args, base_url: str, service_pid: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {"refresh": [], "chat": []}
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout) as client:
+        results["refresh"].append(await run_refresh(client, "full", args.refresh_timeout))
+        results["rss_after_refresh_mb"] = memory_mb(service_pid, "VmRSS")
+        results["refresh"].append(await run_refresh(client, "incremental", args.refresh_timeout))
+
+        products = sample_products()
+        for concurrency in args.concurrency:
+            questions = build_questions(
+                products,
+                args.requests,
+                args.repeat_share,
+                args.sql_share,
+                args.exact_share,
+                seed=args.seed + concurrency,
+            )
+            before = await stage_totals(client)
+            run = await run_load(client, questions, concurrency, args.n_results)
+            run["stage_mean_ms"] = stage_means(before, await stage_totals(client))
+            print(
+                f"concurrency={concurrency}: {run['throughput_rps']} req/s, "
+                f"p50={run['latency'].get('p50_ms')}ms p95={run['latency'].get('p95_ms')}ms "
+                f"p99={run['latency'].get('p99_ms')}ms errors={run['errors']} routes={run['routes']}"
+            )
+            results["chat"].append(run)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--skip-load", action="store_true", help="benchmark the data already in MySQL")
+    parser.add_argument(
+        "--reset", action="store_true", help="delete the benchmark database's rows before loading"
+    )
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=500, help="chat requests per level")
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--repeat-share", type=float, default=0.3)
+    parser.add_argument("--sql-share", type=float, default=0.2)
+    parser.add_argument("--exact-share", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dim", type=int, default=768, help="fake embedding dimension")
+    parser.add_argument("--ttft", type=float, default=0.2, help="fake LLM seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--embed-latency", type=float, default=0.005)
+    parser.add_argument("--ollama-host", help="use this Ollama instead of the fake one")
+    parser.add_argument("--redis-port", type=int, help="use the Redis on REDIS_HOST at this port instead of the fake one")
+    parser.add_argument("--service-port", type=int, default=8100)
+    parser.add_argument("--request-timeout", type=float, default=300)
+    parser.add_argument("--refresh-timeout", type=float, default=6 * 3600)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--keep-logs", action="store_true")
+    args = parser.parse_args()
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level]
+    return args
+
+
+def main():
+    args = parse_args()
+    dataset: Dict[str, Any] = {"loaded": False}
+    if not args.skip_load:
+        from generate_data import generate
+
+        dataset = {
+            "loaded": True,
+            "reset": args.reset,
+            **generate(args.products, args.transactions, seed=args.seed, reset=args.reset),
+        }
+
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    processes = []
+    try:
+        ollama_host = args.ollama_host
+        if not ollama_host:
+            port = 11500
+            processes.append(
+                start_process(
+                    [sys.executable, os.path.join(HERE, "fake_ollama.py"), "--port", str(port),
+                     "--dim", str(args.dim), "--ttft", str(args.ttft),
+                     "--token-latency", str(args.token_latency), "--tokens", str(args.tokens),
+                     "--embed-latency", str(args.embed_latency)],
+                    log_path=os.path.join(workdir, "fake_ollama.log"),
+                )
+            )
+            ollama_host = f"http://127.0.0.1:{port}"
+        wait_for(f"{ollama_host}/api/tags")
+
+        redis_env = {}
+        if args.redis_port:
+            redis_env = {"REDIS_PORT": str(args.redis_port)}
+        else:
+            processes.append(
+                start_process(
+                    [sys.executable, os.path.join(HERE, "fake_redis.py"), "--port", "6390"],
+                    log_path=os.path.join(workdir, "fake_redis.log"),
+                )
+            )
+            redis_env = {"REDIS_HOST": "127.0.0.1", "REDIS_PORT": "6390"}
+
+        service = start_process(
+            [sys.executable, "main.py"],
+            env={
+                **redis_env,
+                "OLLAMA_HOST": ollama_host,
+                "CHROMA_PERSIST_DIR": os.path.join(workdir, "chroma"),
+                "API_HOST": "127.0.0.1",
+                "API_PORT": str(args.service_port),
+                "CHANGELOG_ENABLED": "false",
+                "REFRESH_INTERVAL_MINUTES": "0",
+            },
+            log_path=os.path.join(workdir, "service.log"),
+        )
+        processes.append(service)
+        base_url = f"http://127.0.0.1:{args.service_port}"
+        wait_for(f"{base_url}/ready", timeout=300)
+
+        results = asyncio.run(benchmark(args, base_url, service.pid))
+        results["peak_rss_mb"] = memory_mb(service.pid, "VmHWM")
+        if not args.ollama_host:
+            results["fake_ollama"] = httpx.get(f"{ollama_host}/stats").json()
+    finally:
+        for process in reversed(processes):
+            stop_process(process)
+        if args.keep_logs:
+            print(f"Logs kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "version": {"git_commit": git_commit(), "python": platform.python_version()},
+        "machine": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "dataset": dataset,
+        **results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
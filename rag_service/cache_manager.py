@@ -1,13 +1,130 @@
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import aioredis
+import asyncio
 import json
 import hashlib
-from config import REDIS_HOST, REDIS_PORT, REDIS_TTL
+import time
+from collections import OrderedDict, deque
+from database import DOCUMENT_TYPES
+from config import (
+    REDIS_HOST,
+    REDIS_PORT,
+    REDIS_TTL,
+    CACHE_NAMESPACE,
+    L1_CACHE_MAX_BYTES,
+    L1_CACHE_TTL,
+    L1_COHERENCE_INTERVAL,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_DISTANCE,
+    SEMANTIC_CACHE_NEAR_MISS_DISTANCE,
+    QUESTION_COUNT_HALF_LIFE_HOURS,
+    QUESTION_TRACK_MAX,
+)
+
+# Scopes with their own cache generation counter. Bumping a scope's counter
+# invalidates every cached answer whose context included that document type
+# ("analytics" for the sales analytics entries added to prompts); bumping
+# "global" invalidates every answer.
+GENERATION_SCOPES = ["global"] + DOCUMENT_TYPES + ["analytics"]
+
+
+def normalize_question(question: str) -> str:
+    """Case, spacing and trailing punctuation do not make a different question"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+class LocalCache:
+    """Bounded in-process LRU cache with per-entry TTL and a size limit in bytes"""
+
+    def __init__(self, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, size: int, ttl: Optional[int] = None):
+        self.delete(key)
+        if size > self.max_bytes:
+            return
+        ttl = min(ttl or self.ttl, self.ttl)
+        self.entries[key] = (value, time.monotonic() + ttl, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, _, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def delete(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self, prefix: Optional[str] = None):
+        if prefix is None:
+            self.entries.clear()
+            self.size = 0
+            return
+        for key in [key for key in self.entries if key.startswith(prefix)]:
+            self.delete(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
 
 class CacheManager:
-    def __init__(self):
+    def __init__(self, semantic_store=None):
         self.redis = None
         self.ttl = REDIS_TTL
+        # L1 in front of Redis (L2) for answers and question embeddings
+        self.local = LocalCache(L1_CACHE_MAX_BYTES, L1_CACHE_TTL)
+        self.l2_hits = 0
+        self.l2_misses = 0
+        # Local snapshot of the Redis generation counters, refreshed at most
+        # every L1_COHERENCE_INTERVAL seconds
+        self.generations: Dict[str, int] = {}
+        self.generations_checked_at = 0.0
+        # Bumped in Redis when answers are deleted outright, so other
+        # processes drop their L1 copies
+        self.epoch = None
+        # ChromaDB collection holding the question embedding of each cached answer
+        self.semantic_store = semantic_store if SEMANTIC_CACHE_ENABLED else None
+        self.semantic_distance = SEMANTIC_CACHE_DISTANCE
+        self.near_miss_distance = SEMANTIC_CACHE_NEAR_MISS_DISTANCE
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "near_misses": 0, "misses": 0}
+        # Answers served in place of a shed generation (not counted as lookups)
+        self.degraded_hits = 0
+        # Recent near misses, to tune the distance threshold against real questions
+        self.near_miss_samples = deque(maxlen=50)
+
+    def set_semantic_store(self, semantic_store):
+        """Attach the semantic cache collection once the vector store is open"""
+        self.semantic_store = semantic_store if SEMANTIC_CACHE_ENABLED else None
 
     async def connect(self):
         if not self.redis:
@@ -25,20 +142,117 @@ class CacheManager:
         """Generate a cache key from multiple arguments"""
         key_str = ":".join(str(arg) for arg in args)
         hash_obj = hashlib.md5(key_str.encode())
-        return f"{prefix}:{hash_obj.hexdigest()}"
+        return f"{CACHE_NAMESPACE}:{prefix}:{hash_obj.hexdigest()}"
+
+    def _generation_key(self, scope: str) -> str:
+        return f"{CACHE_NAMESPACE}:gen:{scope}"
+
+    async def get_generations(self) -> Dict[str, int]:
+        """
+        Current generation of every scope. Served from the local snapshot,
+        which costs one MGET when it is older than L1_COHERENCE_INTERVAL.
+        """
+        now = time.monotonic()
+        if now - self.generations_checked_at < L1_COHERENCE_INTERVAL:
+            return self.generations
+
+        await self.connect()  # Ensure connection
+        values = await self.redis.mget(
+            [self._generation_key(scope) for scope in GENERATION_SCOPES]
+            + [f"{CACHE_NAMESPACE}:epoch"]
+        )
+        self.generations = {
+            scope: int(value or 0) for scope, value in zip(GENERATION_SCOPES, values)
+        }
+        epoch = values[-1]
+        if epoch != self.epoch:
+            if self.epoch is not None:
+                self.local.clear(prefix=f"{CACHE_NAMESPACE}:chat:")
+            self.epoch = epoch
+        self.generations_checked_at = now
+        return self.generations
+
+    async def bump_generations(self, scopes: List[str]) -> Dict[str, int]:
+        """Invalidate every cached answer that depends on `scopes`; O(1) per scope"""
+        scopes = [scope for scope in scopes if scope in GENERATION_SCOPES]
+        if not scopes:
+            return self.generations
+        try:
+            await self.connect()  # Ensure connection
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for scope in scopes:
+                    pipe.incr(self._generation_key(scope))
+                values = await pipe.execute()
+            self.generations = {**self.generations, **dict(zip(scopes, values))}
+            print(f"Bumped cache generations: {dict(zip(scopes, values))}")
+        except Exception as e:
+            print(f"Error bumping cache generations: {e}")
+        return self.generations
+
+    async def _bump_epoch(self):
+        self.epoch = str(await self.redis.incr(f"{CACHE_NAMESPACE}:epoch"))
 
     async def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
+        """Get value from cache, trying the in-process L1 before Redis"""
         try:
             await self.connect()  # Ensure connection
+            await self.get_generations()  # Also keeps L1 coherent
+            value = self.local.get(key)
+            if value is not None:
+                return value
+
             value = await self.redis.get(key)
             if value:
-                return json.loads(value)
+                self.l2_hits += 1
+                parsed = json.loads(value)
+                self.local.set(key, parsed, len(value))
+                return parsed
+            self.l2_misses += 1
             return None
         except Exception as e:
             print(f"Error getting from cache: {e}")
             return None
 
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values, fetching the L1 misses from Redis in one MGET"""
+        try:
+            await self.connect()  # Ensure connection
+            await self.get_generations()  # Also keeps L1 coherent
+            values = [self.local.get(key) for key in keys]
+            missing = [i for i, value in enumerate(values) if value is None]
+            if missing:
+                raw_values = await self.redis.mget([keys[i] for i in missing])
+                for i, raw in zip(missing, raw_values):
+                    if raw:
+                        self.l2_hits += 1
+                        values[i] = json.loads(raw)
+                        self.local.set(keys[i], values[i], len(raw))
+                    else:
+                        self.l2_misses += 1
+            return values
+        except Exception as e:
+            print(f"Error getting from cache: {e}")
+            return [None] * len(keys)
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """Set several values in one pipelined Redis round trip"""
+        if not items:
+            return True
+        try:
+            await self.connect()  # Ensure connection
+            ttl = ttl or self.ttl
+            encoded = {key: json.dumps(value) for key, value in items.items()}
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, value_str in encoded.items():
+                    pipe.setex(key, ttl, value_str)
+                await pipe.execute()
+            for key, value_str in encoded.items():
+                self.local.set(key, items[key], len(value_str), ttl)
+            return True
+        except Exception as e:
+            print(f"Error setting cache: {e}")
+            return False
+
     async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """Set value in cache"""
         try:
@@ -46,6 +260,7 @@ class CacheManager:
             ttl = ttl or self.ttl
             value_str = json.dumps(value)
             await self.redis.setex(key, ttl, value_str)
+            self.local.set(key, value, len(value_str), ttl)
             return True
         except Exception as e:
             print(f"Error setting cache: {e}")
@@ -55,17 +270,357 @@ class CacheManager:
         """Delete value from cache"""
         try:
             await self.connect()  # Ensure connection
+            self.local.delete(key)
             return bool(await self.redis.delete(key))
         except Exception as e:
             print(f"Error deleting from cache: {e}")
             return False
 
-    async def clear_all(self) -> bool:
-        """Clear all cache"""
+    async def get_answer(self, key: str) -> Optional[Any]:
+        """Get a cached answer unless a scope it depends on has moved on"""
+        return (await self.get_answers([key]))[0]
+
+    async def get_answers(self, keys: List[str]) -> List[Optional[Any]]:
+        """Cached answers of several keys in one round trip; None where missing or stale"""
+        entries = await self.get_many(keys)
+        if not any(entries):
+            return [None] * len(keys)
+        try:
+            generations = await self.get_generations()
+        except Exception as e:
+            print(f"Error reading cache generations: {e}")
+            return [None] * len(keys)
+        answers = []
+        for key, entry in zip(keys, entries):
+            if entry and any(
+                generations.get(scope, 0) != generation
+                for scope, generation in entry["generations"].items()
+            ):
+                self.local.delete(key)
+                entry = None
+            answers.append(entry["value"] if entry else None)
+        return answers
+
+    async def set_answer(
+        self,
+        key: str,
+        value: Any,
+        scopes: List[str],
+        generations: Optional[Dict[str, int]] = None,
+    ) -> bool:
+        """
+        Cache an answer together with the generations of the scopes its
+        context came from. Pass the `generations` read before retrieval so an
+        answer built from data that changed meanwhile is never served.
+        """
+        try:
+            generations = generations or await self.get_generations()
+        except Exception as e:
+            print(f"Error reading cache generations: {e}")
+            return False
+        depends_on = ["global"] + [scope for scope in scopes if scope in generations]
+        entry = {
+            "value": value,
+            "generations": {scope: generations.get(scope, 0) for scope in depends_on},
+        }
+        return await self.set(key, entry)
+
+    async def get_embedding(self, text: str) -> Optional[List[float]]:
+        """Get a cached query embedding"""
+        return await self.get(self.generate_key("emb", text))
+
+    async def set_embedding(self, text: str, embedding: List[float]) -> bool:
+        """Cache a query embedding"""
+        return await self.set(self.generate_key("emb", text), embedding)
+
+    async def get_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Cached query embeddings of several texts in one round trip"""
+        return await self.get_many([self.generate_key("emb", text) for text in texts])
+
+    async def set_embeddings(self, embeddings: Dict[str, List[float]]) -> bool:
+        """Cache several query embeddings, keyed by text, in one round trip"""
+        return await self.set_many(
+            {self.generate_key("emb", text): embedding for text, embedding in embeddings.items()}
+        )
+
+    async def get_semantic(
+        self, question: str, embedding: List[float], n_results: int, scope: str = "all"
+    ) -> Optional[Any]:
+        """
+        Get the cached answer of the most similar earlier question asked with
+        the same n_results and type filter `scope`, if it is within the
+        configured cosine distance of `embedding`
+        """
+        return (await self.get_semantic_many([(question, embedding, n_results, scope)]))[0]
+
+    async def get_semantic_many(
+        self, lookups: List[Tuple[str, List[float], int, str]]
+    ) -> List[Optional[Any]]:
+        """
+        Semantic cache lookups of several (question, embedding, n_results,
+        scope) tuples. Lookups sharing n_results and scope go to ChromaDB
+        as one multi-embedding query, and the answers are read in one round
+        trip.
+        """
+        results: List[Optional[Any]] = [None] * len(lookups)
+        if self.semantic_store is None:
+            return results
+        try:
+            groups: Dict[Tuple[int, str], List[int]] = {}
+            for i, (_, _, n_results, scope) in enumerate(lookups):
+                groups.setdefault((n_results, scope), []).append(i)
+
+            # Index of each lookup -> (cached key, cached question, distance)
+            nearest: Dict[int, Tuple[str, str, float]] = {}
+            for (n_results, scope), indexes in groups.items():
+                found = await asyncio.to_thread(
+                    self.semantic_store.query,
+                    query_embeddings=[lookups[i][1] for i in indexes],
+                    n_results=1,
+                    where={"$and": [{"n_results": n_results}, {"scope": scope}]},
+                    include=["documents", "distances"],
+                )
+                for row, i in enumerate(indexes):
+                    if found["ids"][row]:
+                        nearest[i] = (
+                            found["ids"][row][0],
+                            found["documents"][row][0],
+                            found["distances"][row][0],
+                        )
+
+            hits = []
+            for i, (question, _, _, _) in enumerate(lookups):
+                if i not in nearest:
+                    self.stats["misses"] += 1
+                    continue
+                key, cached_question, distance = nearest[i]
+                if distance <= self.semantic_distance:
+                    hits.append(i)
+                elif distance <= self.near_miss_distance:
+                    self.stats["near_misses"] += 1
+                    self.near_miss_samples.append(
+                        {
+                            "question": question,
+                            "cached_question": cached_question,
+                            "distance": round(distance, 4),
+                        }
+                    )
+                else:
+                    self.stats["misses"] += 1
+
+            if hits:
+                values = await self.get_answers([nearest[i][0] for i in hits])
+                stale = []
+                for i, value in zip(hits, values):
+                    if value is None:
+                        stale.append(nearest[i][0])
+                        self.stats["misses"] += 1
+                    else:
+                        self.stats["semantic_hits"] += 1
+                        results[i] = value
+                if stale:
+                    # Answers expired or were invalidated; drop the stale embeddings
+                    await asyncio.to_thread(self.semantic_store.delete, ids=sorted(set(stale)))
+            return results
+        except Exception as e:
+            print(f"Error getting from semantic cache: {e}")
+            return results
+
+    async def get_nearest_answer(
+        self, embedding: List[float], scope: str = "all", candidates: int = 3
+    ) -> Optional[Tuple[Any, str, float]]:
+        """
+        Best cached answer still valid for a question, for when no answer can
+        be generated: the nearest earlier question with the same type filter
+        `scope`, any n_results, within the near-miss distance. Returns
+        (answer, cached question, distance).
+        """
+        if self.semantic_store is None:
+            return None
+        try:
+            found = await asyncio.to_thread(
+                self.semantic_store.query,
+                query_embeddings=[embedding],
+                n_results=candidates,
+                where={"scope": scope},
+                include=["documents", "distances"],
+            )
+            nearby = [
+                (key, question, distance)
+                for key, question, distance in zip(
+                    found["ids"][0], found["documents"][0], found["distances"][0]
+                )
+                if distance <= self.near_miss_distance
+            ]
+            if not nearby:
+                return None
+            values = await self.get_answers([key for key, _, _ in nearby])
+            for (_, question, distance), value in zip(nearby, values):
+                if value is not None:
+                    self.degraded_hits += 1
+                    return value, question, distance
+        except Exception as e:
+            print(f"Error getting nearest cached answer: {e}")
+        return None
+
+    def _questions_key(self) -> str:
+        return f"{CACHE_NAMESPACE}:questions"
+
+    async def record_questions(self, queries: List[Tuple[Dict[str, Any], str]]):
+        """
+        Count questions for cache warming, given (query fields, type scope)
+        pairs. Counts are per normalized question; the last wording asked
+        is kept with them and is what gets warmed.
+        """
+        half_life = QUESTION_COUNT_HALF_LIFE_HOURS * 3600
         try:
             await self.connect()  # Ensure connection
-            await self.redis.flushall()
+            key = self._questions_key()
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for fields, scope in queries:
+                    signature = self.generate_key(
+                        "question", normalize_question(fields["question"]), fields["n_results"], scope
+                    )
+                    pipe.zincrby(key, 1, signature)
+                    # Kept until the count would have decayed below 1/1000
+                    pipe.setex(signature, int(half_life * 10), json.dumps(fields))
+                pipe.zremrangebyrank(key, 0, -(QUESTION_TRACK_MAX + 1))
+                await pipe.execute()
+        except Exception as e:
+            print(f"Error recording question: {e}")
+
+    async def decay_questions(self) -> float:
+        """Scale question counts down by the time since they were last decayed"""
+        await self.connect()  # Ensure connection
+        key = self._questions_key()
+        now = time.time()
+        decayed_at = await self.redis.getset(f"{key}:decayed_at", now)
+        if decayed_at is None:
+            return 1.0
+        factor = 0.5 ** (max(now - float(decayed_at), 0) / (QUESTION_COUNT_HALF_LIFE_HOURS * 3600))
+        await self.redis.zunionstore(key, {key: factor})
+        return factor
+
+    async def top_questions(self, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        """The most frequently asked questions as (query fields, decayed count)"""
+        await self.connect()  # Ensure connection
+        key = self._questions_key()
+        counted = await self.redis.zrevrange(key, 0, limit - 1, withscores=True)
+        if not counted:
+            return []
+        values = await self.redis.mget([signature for signature, _ in counted])
+        expired = [signature for (signature, _), value in zip(counted, values) if value is None]
+        if expired:
+            await self.redis.zrem(key, *expired)
+        return [
+            (json.loads(value), count)
+            for (_, count), value in zip(counted, values)
+            if value is not None
+        ]
+
+    async def set_semantic(
+        self,
+        key: str,
+        question: str,
+        embedding: List[float],
+        n_results: int,
+        scope: str = "all",
+    ) -> bool:
+        """Index the question embedding of an answer cached under `key`"""
+        if self.semantic_store is None:
+            return False
+        try:
+            await asyncio.to_thread(
+                self.semantic_store.upsert,
+                ids=[key],
+                embeddings=[embedding],
+                documents=[question],
+                metadatas=[{"n_results": n_results, "scope": scope}],
+            )
+            return True
+        except Exception as e:
+            print(f"Error setting semantic cache: {e}")
+            return False
+
+    async def add_dependencies(self, key: str, doc_ids: List[str]) -> bool:
+        """Record which documents the answer cached under `key` was built from"""
+        if not doc_ids:
+            return False
+        try:
+            await self.connect()  # Ensure connection
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for doc_id in doc_ids:
+                    pipe.sadd(f"{CACHE_NAMESPACE}:deps:{doc_id}", key)
+                    pipe.expire(f"{CACHE_NAMESPACE}:deps:{doc_id}", self.ttl)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            print(f"Error recording cache dependencies: {e}")
+            return False
+
+    async def invalidate_entities(self, doc_ids: List[str]) -> int:
+        """Delete cached answers whose context included any of `doc_ids`"""
+        if not doc_ids:
+            return 0
+        try:
+            await self.connect()  # Ensure connection
+            keys = set()
+            for i in range(0, len(doc_ids), 500):
+                dep_keys = [f"{CACHE_NAMESPACE}:deps:{doc_id}" for doc_id in doc_ids[i : i + 500]]
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for dep_key in dep_keys:
+                        pipe.smembers(dep_key)
+                    members = await pipe.execute()
+                for answer_keys in members:
+                    keys.update(answer_keys)
+                await self.redis.delete(*dep_keys)
+
+            if keys:
+                await self.redis.delete(*keys)
+                for key in keys:
+                    self.local.delete(key)
+                await self._bump_epoch()
+                if self.semantic_store is not None:
+                    await asyncio.to_thread(self.semantic_store.delete, ids=list(keys))
+            return len(keys)
+        except Exception as e:
+            print(f"Error invalidating cache entries: {e}")
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache hit/miss counters and recent semantic near misses"""
+        lookups = sum(self.stats.values())
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        return {
+            **self.stats,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "degraded_hits": self.degraded_hits,
+            "semantic_distance": self.semantic_distance,
+            "near_miss_distance": self.near_miss_distance,
+            "recent_near_misses": list(self.near_miss_samples),
+            "generations": self.generations,
+            "tiers": {
+                "l1": self.local.get_stats(),
+                "l2": {
+                    "hits": self.l2_hits,
+                    "misses": self.l2_misses,
+                    "hit_ratio": round(self.l2_hits / (self.l2_hits + self.l2_misses), 4)
+                    if self.l2_hits + self.l2_misses
+                    else 0.0,
+                },
+            },
+        }
+
+    async def clear_all(self) -> bool:
+        """Invalidate every cached answer by bumping the global generation"""
+        try:
+            await self.bump_generations(["global"])
+            self.local.clear(prefix=f"{CACHE_NAMESPACE}:chat:")
+            if self.semantic_store is not None:
+                ids = (await asyncio.to_thread(self.semantic_store.get, include=[]))["ids"]
+                if ids:
+                    await asyncio.to_thread(self.semantic_store.delete, ids=ids)
             return True
         except Exception as e:
             print(f"Error clearing cache: {e}")
-            return False 
\ No newline at end of file
+            return False
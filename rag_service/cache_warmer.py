@@ -0,0 +1,136 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config import CACHE_WARM_TOP_N
+from metrics import CACHE_WARM_ANSWERS, CACHE_WARM_RUN_SECONDS
+
+
+class CacheWarmer:
+    """
+    Answers the most frequently asked questions again once the answer cache
+    has been invalidated, so the next people to ask them hit the cache.
+
+    `warm_question` answers one question (query fields as recorded by
+    CacheManager.record_questions) at background priority and returns the
+    route taken: cache or semantic_cache when a valid answer was already
+    cached, in_flight when a user's request is generating it, rag when one
+    was generated and cached. A shed generation means the LLM is busy with
+    users, so the run stops there.
+    """
+
+    def __init__(
+        self,
+        cache_manager,
+        warm_question: Callable[[Dict[str, Any]], Awaitable[str]],
+        top_n: int = CACHE_WARM_TOP_N,
+    ):
+        self.cache_manager = cache_manager
+        self.warm_question = warm_question
+        self.top_n = top_n
+        self.task: Optional[asyncio.Task] = None
+        self.schedule_task: Optional[asyncio.Task] = None
+        self.current: Optional[Dict[str, Any]] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.runs = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self.task and not self.task.done())
+
+    def trigger(self, reason: str) -> bool:
+        """Start a warming run in the background unless one is running"""
+        if self.running:
+            return False
+        self.task = asyncio.create_task(self.run(reason))
+        return True
+
+    async def run(self, trigger: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        report: Dict[str, Any] = {
+            "trigger": trigger,
+            "started_at": time.time(),
+            "status": "running",
+            "questions": 0,
+            "refreshed": 0,
+            "already_cached": 0,
+            "in_flight": 0,
+            "failed": 0,
+            "shed": 0,
+        }
+        self.current = report
+        try:
+            await self.cache_manager.decay_questions()
+            questions = await self.cache_manager.top_questions(self.top_n)
+            report["questions"] = len(questions)
+            report["status"] = "succeeded"
+            for fields, _ in questions:
+                try:
+                    route = await self.warm_question(fields)
+                except Exception as e:
+                    print(f"Cache warming failed for {fields['question']!r}: {e}")
+                    route = "error"
+                if route in ("cache", "semantic_cache"):
+                    result = "already_cached"
+                elif route == "rag":
+                    result = "refreshed"
+                elif route == "in_flight":
+                    result = "in_flight"
+                elif route.startswith("shed"):
+                    result = "shed"
+                else:
+                    result = "failed"
+                report[result] += 1
+                CACHE_WARM_ANSWERS.inc(result=result)
+                if result == "shed":
+                    report["status"] = "stopped_busy"
+                    break
+        except asyncio.CancelledError:
+            report["status"] = "cancelled"
+            raise
+        except Exception as e:
+            print(f"Cache warming run failed: {e}")
+            report["status"] = "failed"
+            report["error"] = str(e)
+        finally:
+            elapsed = time.perf_counter() - start
+            report["seconds"] = round(elapsed, 3)
+            CACHE_WARM_RUN_SECONDS.observe(elapsed)
+            self.runs += 1
+            self.current = None
+            self.last_run = report
+            print(
+                f"Cache warming ({trigger}) {report['status']}: {report['refreshed']} refreshed, "
+                f"{report['already_cached']} already cached of {report['questions']} "
+                f"questions in {elapsed:.2f}s"
+            )
+        return report
+
+    def start_schedule(self, interval_minutes: float):
+        """Warm every `interval_minutes`, skipping runs while one is active"""
+        if interval_minutes <= 0 or self.schedule_task:
+            return
+
+        async def schedule():
+            while True:
+                await asyncio.sleep(interval_minutes * 60)
+                if not self.trigger("schedule"):
+                    print("Scheduled cache warming skipped: a run is already in progress")
+
+        print(f"Scheduling cache warming every {interval_minutes} minutes")
+        self.schedule_task = asyncio.create_task(schedule())
+
+    async def stop(self):
+        tasks = [task for task in (self.schedule_task, self.task) if task and not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.schedule_task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "top_n": self.top_n,
+            "running": self.running,
+            "runs": self.runs,
+            "current": self.current,
+            "last_run": self.last_run,
+        }
@@ -0,0 +1,294 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from mysql.connector import Error
+from database import ENTITY_TYPES, INDEXED_TYPES, ROLLUP_INPUTS, bucket_seq
+from config import CHANGELOG_POLL_INTERVAL, CHANGELOG_BATCH_SIZE, ROLLUP_SYNC_INTERVAL
+
+# MySQL error code for "Table doesn't exist"
+ER_NO_SUCH_TABLE = 1146
+
+# Rollups bucketed by the product name and date of their line items
+SALES_ROLLUPS = ("product_daily_sales", "product_monthly_sales", "category_monthly_sales")
+
+
+class ChangeLogTailer:
+    """
+    Tails the trigger-fed scms_changelog table (Database/changelog.sql) and
+    applies each batch of changes to the vector index and the answer cache,
+    at a cost proportional to the number of changed rows.
+
+    Updated and deleted rows invalidate exactly the cached answers whose
+    context included them; inserted rows bump the generation of their entity
+    type, since a new row may be relevant to any question about that type.
+
+    Rollup buckets computed from changed rows (the product, day and month of
+    a new sale, a customer, a supplier) are marked stale and re-aggregated
+    at most every `rollup_interval` seconds, so a burst of sales re-reads
+    only the source rows of the buckets it touched, once. Changes whose old
+    buckets are unknown (updated or deleted line items, renamed or
+    recategorized products) mark the whole rollup type for a full re-sync
+    instead. `on_changes`, if given, is called with the changed keys of each
+    entity after every batch.
+    """
+
+    def __init__(
+        self,
+        db_manager,
+        embedding_manager,
+        cache_manager,
+        is_paused: Callable[[], bool] = lambda: False,
+        interval: float = CHANGELOG_POLL_INTERVAL,
+        batch_size: int = CHANGELOG_BATCH_SIZE,
+        rollup_interval: float = ROLLUP_SYNC_INTERVAL,
+        on_changes: Optional[Callable[[Dict[str, List[int]]], Awaitable[None]]] = None,
+    ):
+        self.db_manager = db_manager
+        self.embedding_manager = embedding_manager
+        self.cache_manager = cache_manager
+        self.is_paused = is_paused
+        self.interval = interval
+        self.batch_size = batch_size
+        self.rollup_interval = rollup_interval
+        self.on_changes = on_changes
+        self.cursor = 0
+        # Rollup types to re-sync in full, and single buckets of the others
+        self.stale_rollups: set = set()
+        self.stale_buckets: Dict[str, set] = {}
+        # Name, category and supplier by product id, to tell which product
+        # changes move sales between buckets
+        self.product_labels: Optional[Dict[int, Tuple]] = None
+        self.rollups_synced_at = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, Any] = {
+            "running": False,
+            "polls": 0,
+            "changes_applied": 0,
+            "documents_embedded": 0,
+            "documents_deleted": 0,
+            "answers_invalidated": 0,
+            "rollup_syncs": 0,
+            "rollup_buckets_synced": 0,
+            "rollup_documents_embedded": 0,
+            "errors": 0,
+            "last_lag_seconds": None,
+            "last_batch_seconds": None,
+        }
+
+    def start(self):
+        if self.task is None:
+            print(f"Tailing change log every {self.interval}s")
+            self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _loop(self):
+        self.stats["running"] = True
+        try:
+            while True:
+                applied = 0
+                try:
+                    if not self.is_paused():
+                        applied = await self.poll_once()
+                        await self.sync_rollups()
+                except Error as e:
+                    if e.errno == ER_NO_SUCH_TABLE:
+                        print("Change log table not found; run Database/changelog.sql to enable change capture")
+                        return
+                    print(f"Error applying change log: {e}")
+                    self.stats["errors"] += 1
+                except Exception as e:
+                    print(f"Error applying change log: {e}")
+                    self.stats["errors"] += 1
+                # Drain a backlog without sleeping between full batches
+                if applied < self.batch_size:
+                    await asyncio.sleep(self.interval)
+        finally:
+            self.stats["running"] = False
+
+    async def poll_once(self) -> int:
+        """Apply the next batch of change log entries; returns how many were read"""
+        rows = await self.db_manager.run(
+            self.db_manager.fetch_changes, self.cursor, self.batch_size
+        )
+        self.stats["polls"] += 1
+        if not rows:
+            return 0
+
+        start = time.perf_counter()
+        seqs_by_entity: Dict[str, set] = {}
+        rewritten_lines = False
+        for row in rows:
+            if row["ENTITY"] in ENTITY_TYPES:
+                seqs_by_entity.setdefault(row["ENTITY"], set()).add(row["ENTITY_ID"])
+                rewritten_lines |= row["ENTITY"] == "transaction" and row["OP"] != "I"
+
+        await self.mark_stale_rollups(seqs_by_entity, rewritten_lines)
+
+        invalidate_ids: List[str] = []
+        new_types = set()
+        for entity, seqs in seqs_by_entity.items():
+            if entity not in INDEXED_TYPES:
+                continue
+            seqs = sorted(seqs)
+            docs = await self.db_manager.run(self.db_manager.fetch_documents, entity, seqs)
+            changes = await self.embedding_manager.apply_entity_changes(entity, seqs, docs)
+
+            invalidate_ids.extend(changes["updated"] + changes["deleted"])
+            if changes["added"]:
+                new_types.add(entity)
+            self.stats["documents_embedded"] += len(changes["added"]) + len(changes["updated"])
+            self.stats["documents_deleted"] += len(changes["deleted"])
+
+        if invalidate_ids:
+            self.stats["answers_invalidated"] += await self.cache_manager.invalidate_entities(
+                invalidate_ids
+            )
+        if new_types:
+            await self.cache_manager.bump_generations(sorted(new_types))
+        if self.on_changes and seqs_by_entity:
+            # A failing listener must not hold back the index
+            try:
+                await self.on_changes({entity: sorted(seqs) for entity, seqs in seqs_by_entity.items()})
+            except Exception as e:
+                print(f"Error passing on change log entries: {e}")
+
+        last_id = rows[-1]["ID"]
+        await self.db_manager.run(self.db_manager.delete_changes, last_id)
+        self.cursor = last_id
+
+        self.stats["changes_applied"] += len(rows)
+        self.stats["last_lag_seconds"] = rows[0]["AGE_SECONDS"]
+        self.stats["last_batch_seconds"] = round(time.perf_counter() - start, 3)
+        return len(rows)
+
+    def _mark_bucket(self, rollup: str, bucket: tuple):
+        if rollup in INDEXED_TYPES and rollup not in self.stale_rollups:
+            self.stale_buckets.setdefault(rollup, set()).add(bucket)
+
+    def _mark_rollups(self, entity: str, rollups=None):
+        """Mark every rollup computed from `entity` (or just `rollups`) for a full re-sync"""
+        for rollup, inputs in ROLLUP_INPUTS.items():
+            if entity in inputs and rollup in INDEXED_TYPES and (rollups is None or rollup in rollups):
+                self.stale_rollups.add(rollup)
+                self.stale_buckets.pop(rollup, None)
+
+    async def mark_stale_rollups(self, seqs_by_entity: Dict[str, set], rewritten_lines: bool = False):
+        """
+        Mark the rollup buckets the changed rows of one batch contribute to.
+        `rewritten_lines` means line items were updated or deleted, so the
+        buckets they were in before are unknown.
+        """
+        if not any(rollup in INDEXED_TYPES for rollup in ROLLUP_INPUTS):
+            return
+        if rewritten_lines:
+            self._mark_rollups("transaction")
+
+        lines = seqs_by_entity.get("transaction")
+        if lines:
+            # Lines not found belong to a transaction not inserted yet; its
+            # trigger logs them again
+            for line in await self.db_manager.run(self.db_manager.fetch_line_buckets, sorted(lines)):
+                if line["DAY"]:
+                    self._mark_bucket("product_daily_sales", (line["PRODUCT_KEY"], line["DAY"]))
+                    self._mark_bucket("product_monthly_sales", (line["PRODUCT_KEY"], line["MONTH"]))
+                    self._mark_bucket("category_monthly_sales", (line["CATEGORY_KEY"], line["MONTH"]))
+                self._mark_bucket("customer_purchases", (line["CUST_ID"],))
+
+        for cust_id in seqs_by_entity.get("customer", ()):
+            self._mark_bucket("customer_purchases", (cust_id,))
+        for supplier_id in seqs_by_entity.get("supplier", ()):
+            self._mark_bucket("supplier_stock", (supplier_id,))
+
+        products = seqs_by_entity.get("product")
+        if products:
+            known = self.product_labels
+            if known is None:
+                rows = await self.db_manager.run(self.db_manager.fetch_product_labels)
+                known = {row["PRODUCT_ID"]: (row["NAME"], row["CATEGORY_ID"], row["SUPPLIER_ID"]) for row in rows}
+                self.product_labels = known
+                # Labels loaded after the change cannot tell what it was
+                self._mark_rollups("product", SALES_ROLLUPS)
+            rows = await self.db_manager.run(self.db_manager.fetch_product_labels, sorted(products))
+            current = {row["PRODUCT_ID"]: (row["NAME"], row["CATEGORY_ID"], row["SUPPLIER_ID"]) for row in rows}
+            for product_id in products:
+                before, after = known.get(product_id), current.get(product_id)
+                for label in (before, after):
+                    if label:
+                        self._mark_bucket("supplier_stock", (label[2],))
+                # Stock updates (every sale) leave sales buckets alone; a new,
+                # deleted, renamed or recategorized product moves sales
+                # between names and categories of unknown buckets
+                if before is None or after is None or before[:2] != after[:2]:
+                    self._mark_rollups("product", SALES_ROLLUPS)
+                if after:
+                    known[product_id] = after
+                else:
+                    known.pop(product_id, None)
+
+    async def sync_rollups(self, force: bool = False) -> int:
+        """
+        Re-sync stale rollups if the last rollup sync was at least
+        `rollup_interval` ago (or `force` is set); returns the documents embedded
+        """
+        if not self.stale_rollups and not self.stale_buckets:
+            return 0
+        if not force and time.monotonic() - self.rollups_synced_at < self.rollup_interval:
+            return 0
+
+        # Taken before the sync, so changes applied meanwhile mark them again
+        types = sorted(self.stale_rollups)
+        buckets = self.stale_buckets
+        self.stale_rollups = set()
+        self.stale_buckets = {}
+        embedded = 0
+        try:
+            if types:
+                stats = await self.embedding_manager.sync_documents(
+                    self.db_manager.aiter_document_pages(types), types
+                )
+                embedded += stats["embedded"]
+                if stats["changed_types"]:
+                    await self.cache_manager.bump_generations(stats["changed_types"])
+
+            invalidate_ids: List[str] = []
+            new_types = set()
+            for rollup, keys in buckets.items():
+                keys = sorted(keys)
+                docs = await self.db_manager.run(self.db_manager.fetch_rollup_buckets, rollup, keys)
+                seqs = sorted({bucket_seq(*key) if len(key) == 2 else key[0] for key in keys})
+                changes = await self.embedding_manager.apply_entity_changes(rollup, seqs, docs)
+                invalidate_ids.extend(changes["updated"] + changes["deleted"])
+                if changes["added"]:
+                    new_types.add(rollup)
+                embedded += len(changes["added"]) + len(changes["updated"])
+                self.stats["rollup_buckets_synced"] += len(keys)
+            if invalidate_ids:
+                self.stats["answers_invalidated"] += await self.cache_manager.invalidate_entities(
+                    invalidate_ids
+                )
+            if new_types:
+                await self.cache_manager.bump_generations(sorted(new_types))
+        except BaseException:
+            self.stale_rollups.update(types)
+            for rollup, keys in buckets.items():
+                self.stale_buckets.setdefault(rollup, set()).update(keys)
+            raise
+        finally:
+            self.rollups_synced_at = time.monotonic()
+
+        self.stats["rollup_syncs"] += 1
+        self.stats["rollup_documents_embedded"] += embedded
+        return embedded
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "cursor": self.cursor,
+            "stale_rollups": sorted(self.stale_rollups),
+            "stale_buckets": {rollup: len(keys) for rollup, keys in self.stale_buckets.items()},
+        }
@@ -0,0 +1,54 @@
+from typing import List
+from config import CHUNK_SIZE, CHUNK_OVERLAP
+
+# Separates a document id from its chunk number, e.g. product_12#1
+CHUNK_SEPARATOR = "#"
+
+
+def split_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Split text into chunks of at most `size` characters, consecutive chunks
+    sharing about `overlap` characters. Chunks end at a sentence or line
+    break, or failing that at a space, when one falls past the overlap.
+    """
+    if len(text) <= size:
+        return [text]
+    overlap = min(overlap, size // 2)
+    chunks = []
+    start = 0
+    while True:
+        end = min(start + size, len(text))
+        if end < len(text):
+            boundary = max(text.rfind(". ", start + overlap, end), text.rfind("\n", start + overlap, end))
+            if boundary != -1:
+                end = boundary + 1
+            else:
+                space = text.rfind(" ", start + overlap, end)
+                if space != -1:
+                    end = space
+        chunks.append(text[start:end])
+        if end >= len(text):
+            return chunks
+        next_start = max(end - overlap, start + 1)
+        # Start the next chunk on a word
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+
+
+def chunk_id(doc_id: str, index: int) -> str:
+    """Vector store id of chunk `index`; the first chunk keeps the document id"""
+    return doc_id if index == 0 else f"{doc_id}{CHUNK_SEPARATOR}{index}"
+
+
+def chunk_parent(doc_id: str) -> str:
+    """Document id a chunk id belongs to"""
+    return doc_id.split(CHUNK_SEPARATOR, 1)[0]
+
+
+def merge_overlapping(first: str, second: str, min_overlap: int = 20) -> str:
+    """Join two consecutive chunks, dropping the text they share"""
+    longest = min(len(first), len(second), 2 * CHUNK_OVERLAP)
+    for length in range(longest, min_overlap - 1, -1):
+        if first.endswith(second[:length]):
+            return first + second[length:]
+    return first + " " + second
@@ -10,6 +10,11 @@ DB_PORT = int(os.getenv("DB_PORT", "3307"))
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "scmspassword")
 DB_NAME = os.getenv("DB_NAME", "scms")
+DB_PAGE_SIZE = int(os.getenv("DB_PAGE_SIZE", "1000"))  # Rows per keyset page during extraction
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))  # Max open connections (and DB worker threads)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Reopen connections older than this
+DB_POOL_PING_INTERVAL = int(os.getenv("DB_POOL_PING_INTERVAL", "30"))  # Ping connections idle longer than this
 
 # Ollama configuration
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
@@ -21,15 +26,120 @@ REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6380))  # Changed default to 6380
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
 REDIS_TTL = int(os.getenv("REDIS_TTL", 3600))  # Cache TTL in seconds
+CACHE_NAMESPACE = os.getenv("CACHE_NAMESPACE", "scms")  # Prefix of every key this service owns
+
+# In-process L1 cache in front of Redis
+L1_CACHE_MAX_BYTES = int(os.getenv("L1_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+L1_CACHE_TTL = int(os.getenv("L1_CACHE_TTL", 300))  # Seconds an entry may live in L1
+L1_COHERENCE_INTERVAL = float(os.getenv("L1_COHERENCE_INTERVAL", 1.0))  # Seconds between invalidation checks
+
+# Semantic cache configuration (cosine distance between question embeddings)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_DISTANCE = float(os.getenv("SEMANTIC_CACHE_DISTANCE", "0.08"))  # Serve a hit at or below this
+SEMANTIC_CACHE_NEAR_MISS_DISTANCE = float(os.getenv("SEMANTIC_CACHE_NEAR_MISS_DISTANCE", "0.2"))  # Count near misses up to this
+
+# Cache warming: questions answered by retrieval are counted in Redis per
+# normalized question, with decay. After a refresh invalidates answers, and
+# every CACHE_WARM_INTERVAL_MINUTES, the most frequent are answered again at
+# background priority.
+CACHE_WARM_ENABLED = os.getenv("CACHE_WARM_ENABLED", "true").lower() == "true"
+CACHE_WARM_TOP_N = int(os.getenv("CACHE_WARM_TOP_N", "50"))  # Questions answered per warming run
+CACHE_WARM_INTERVAL_MINUTES = float(os.getenv("CACHE_WARM_INTERVAL_MINUTES", "0"))  # 0: only after refreshes
+QUESTION_COUNT_HALF_LIFE_HOURS = float(os.getenv("QUESTION_COUNT_HALF_LIFE_HOURS", "24"))  # Counts halve over this long
+QUESTION_TRACK_MAX = int(os.getenv("QUESTION_TRACK_MAX", "5000"))  # Distinct questions counted
 
 # ChromaDB configuration
 CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_data")
+# Shared Chroma server; when set, the persist directory is not used and
+# several instances can serve the same index
+CHROMA_HOST = os.getenv("CHROMA_HOST", "")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+
+# Scale-out: one "writer" instance owns refreshes and change log tailing;
+# "query" instances only answer questions (requires CHROMA_HOST for more
+# than one). The writer publishes the ids it changes under an index
+# generation in Redis, which query instances poll to update their keyword index.
+SERVICE_ROLE = os.getenv("SERVICE_ROLE", "writer")
+INDEX_SYNC_INTERVAL = float(os.getenv("INDEX_SYNC_INTERVAL", "1"))  # Seconds between publishes / polls
+INDEX_SYNC_RETAIN = int(os.getenv("INDEX_SYNC_RETAIN", "1000"))  # Generations of changed ids kept in Redis
+
+# Background refresh configuration
+REFRESH_INTERVAL_MINUTES = float(os.getenv("REFRESH_INTERVAL_MINUTES", "0"))  # 0 disables the schedule
+REFRESH_SCHEDULE_MODE = os.getenv("REFRESH_SCHEDULE_MODE", "incremental")
+
+# Change log tailing (requires the triggers in Database/changelog.sql)
+CHANGELOG_ENABLED = os.getenv("CHANGELOG_ENABLED", "true").lower() == "true"
+CHANGELOG_POLL_INTERVAL = float(os.getenv("CHANGELOG_POLL_INTERVAL", "2"))  # Seconds between polls
+CHANGELOG_BATCH_SIZE = int(os.getenv("CHANGELOG_BATCH_SIZE", "500"))  # Change log rows per poll
+
+# Rollup documents: per-product daily and monthly sales, monthly category
+# rankings, per-customer purchase and per-supplier stock summaries
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() == "true"
+# Also index one document per transaction line item; off, the index grows
+# with entities and time buckets instead of with sales volume
+INDEX_TRANSACTION_ROWS = os.getenv("INDEX_TRANSACTION_ROWS", "false").lower() == "true"
+ROLLUP_SYNC_INTERVAL = float(os.getenv("ROLLUP_SYNC_INTERVAL", "60"))  # Min seconds between change log rollup syncs
+
+# Sales analytics: sales history held in memory as typed arrays for
+# velocity, days-of-stock and reorder calculations
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "true").lower() == "true"
+ANALYTICS_WINDOW_DAYS = int(os.getenv("ANALYTICS_WINDOW_DAYS", "30"))  # Days of sales velocity is averaged over
+ANALYTICS_LEAD_TIME_DAYS = int(os.getenv("ANALYTICS_LEAD_TIME_DAYS", "7"))  # Days from reorder to delivery
+ANALYTICS_COVER_DAYS = int(os.getenv("ANALYTICS_COVER_DAYS", "30"))  # Days of sales a reorder should cover after delivery
+ANALYTICS_PAGE_SIZE = int(os.getenv("ANALYTICS_PAGE_SIZE", "10000"))  # Sales lines per query while loading
+ANALYTICS_UPDATE_INTERVAL = float(os.getenv("ANALYTICS_UPDATE_INTERVAL", "30"))  # Seconds between incremental updates
+ANALYTICS_RELOAD_MINUTES = float(os.getenv("ANALYTICS_RELOAD_MINUTES", "60"))  # Full reload to pick up edits; 0 disables
+
+# SQL fast path for structured inventory and sales questions
+SQL_ROUTER_ENABLED = os.getenv("SQL_ROUTER_ENABLED", "true").lower() == "true"
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", "5"))  # Units, when a question names none
+SQL_ROUTER_MAX_ROWS = int(os.getenv("SQL_ROUTER_MAX_ROWS", "20"))  # Rows listed in an answer
+
+# Startup: dependencies are brought up in the background after the server
+# binds, retried with exponential backoff until they respond
+STARTUP_RETRY_INITIAL_SECONDS = float(os.getenv("STARTUP_RETRY_INITIAL_SECONDS", "1"))
+STARTUP_RETRY_MAX_SECONDS = float(os.getenv("STARTUP_RETRY_MAX_SECONDS", "30"))
+# Load the embedding and chat models with a dummy call before reporting ready
+MODEL_WARMUP_ENABLED = os.getenv("MODEL_WARMUP_ENABLED", "true").lower() == "true"
 
 # API configuration
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))  # Uvicorn worker processes; >1 needs SERVICE_ROLE=query
+CHAT_BATCH_MAX_QUESTIONS = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "100"))  # Questions per /chat/batch request
+CHAT_BATCH_LLM_CONCURRENCY = int(os.getenv("CHAT_BATCH_LLM_CONCURRENCY", "4"))  # Batch generations in flight
+# Admission control for LLM generations: requests past the queue limit or
+# the wait timeout are shed and answered from the cache or the context alone
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "2"))  # Generations running at once (match OLLAMA_NUM_PARALLEL)
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "32"))  # Generations waiting for a slot
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "20"))  # Seconds a generation may wait for a slot
+# Add a Server-Timing stage breakdown to every response, not just those
+# requested with an X-Debug-Timing header
+TIMING_HEADER_ENABLED = os.getenv("TIMING_HEADER_ENABLED", "false").lower() == "true"
 
 # Embedding configuration
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))  # Characters per stored chunk of a long document
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))  # Characters shared by consecutive chunks
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))  # Texts per Ollama embed request
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))  # Embed requests in flight
+VECTOR_STORE_PAGE_SIZE = int(os.getenv("VECTOR_STORE_PAGE_SIZE", "1000"))  # Rows per ChromaDB get/delete
+
+# Vector index snapshots (see snapshot.py): an instance starting with an
+# empty collection imports the snapshot, then catches up with an
+# incremental refresh instead of re-embedding every row
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "./snapshots/scms_data.npz")
+SNAPSHOT_QUANTIZATION = os.getenv("SNAPSHOT_QUANTIZATION", "float16")  # float32, float16 or int8
+SNAPSHOT_IMPORT_ON_START = os.getenv("SNAPSHOT_IMPORT_ON_START", "true").lower() == "true"
+
+# Prompt context assembly: keeps prompt size (and LLM prefill time) bounded
+# whatever n_results a client asks for
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1024"))  # Estimated tokens of context per prompt
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))  # For the token estimate
+CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.9"))  # Term overlap that counts as a duplicate
+
+# Hybrid retrieval: BM25 keyword index fused with the vector search
+KEYWORD_INDEX_ENABLED = os.getenv("KEYWORD_INDEX_ENABLED", "true").lower() == "true"
+KEYWORD_MAX_DF_RATIO = float(os.getenv("KEYWORD_MAX_DF_RATIO", "0.5"))  # Skip terms in more of the documents
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # Candidates per retriever before fusion
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))  # Reciprocal rank fusion constant
  
\ No newline at end of file
@@ -0,0 +1,103 @@
+import math
+from typing import Any, Dict, List, Set, Tuple
+from chunking import chunk_parent, merge_overlapping
+from keyword_index import tokenize
+from config import (
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_CHARS_PER_TOKEN,
+    CONTEXT_DUPLICATE_SIMILARITY,
+)
+
+# Don't bother adding a truncated entry shorter than this many tokens
+MIN_ENTRY_TOKENS = 32
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of text for the LLM, from its length"""
+    return max(1, math.ceil(len(text) / CONTEXT_CHARS_PER_TOKEN))
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cut text at a word boundary to fit about `tokens` tokens"""
+    limit = int(tokens * CONTEXT_CHARS_PER_TOKEN) - 2
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip() + " …"
+
+
+def merge_entity(chunks: List[Dict[str, Any]]) -> str:
+    """Text of one entity from its retrieved chunks, in document order"""
+    chunks = sorted(chunks, key=lambda doc: doc["metadata"].get("chunk", 0))
+    text = chunks[0]["content"]
+    previous = chunks[0]["metadata"].get("chunk", 0)
+    for doc in chunks[1:]:
+        index = doc["metadata"].get("chunk", 0)
+        if index == previous:
+            # The same chunk retrieved twice, e.g. by vector and keyword search
+            continue
+        if index == previous + 1:
+            text = merge_overlapping(text, doc["content"])
+        else:
+            text = f"{text} … {doc['content']}"
+        previous = index
+    return text
+
+
+def similarity(first: Set[str], second: Set[str]) -> float:
+    """Jaccard similarity of two term sets"""
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def assemble_context(
+    docs: List[Dict[str, Any]], token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Turn ranked retrieval results into prompt context: chunks of the same
+    entity are merged into one entry, entries nearly identical to a better
+    ranked one are dropped, and entries are added in rank order until the
+    estimated token budget is used up, truncating the last one to fit.
+    Returns the context entries and what was done to get there.
+    """
+    # Grouped by document, not metadata id: line items of one transaction
+    # and rollups colliding on SEQ share an id but are different documents
+    entities: Dict[str, List[Dict[str, Any]]] = {}
+    for doc in docs:
+        entities.setdefault(chunk_parent(doc["id"]), []).append(doc)
+
+    context: List[str] = []
+    kept_terms: List[Set[str]] = []
+    stats = {
+        "documents": len(docs),
+        "entities": len(entities),
+        "duplicates": 0,
+        "truncated": 0,
+        "dropped": 0,
+        "tokens": 0,
+    }
+    for chunks in entities.values():
+        text = merge_entity(chunks)
+        terms = set(tokenize(text))
+        if any(similarity(terms, other) >= CONTEXT_DUPLICATE_SIMILARITY for other in kept_terms):
+            stats["duplicates"] += 1
+            continue
+
+        remaining = token_budget - stats["tokens"]
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            if remaining < MIN_ENTRY_TOKENS:
+                stats["dropped"] += 1
+                continue
+            text = truncate_to_tokens(text, remaining)
+            tokens = estimate_tokens(text)
+            stats["truncated"] += 1
+
+        context.append(text)
+        kept_terms.append(terms)
+        stats["tokens"] += tokens
+    return context, stats
@@ -1,136 +1,860 @@
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
 import mysql.connector
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from mysql.connector import Error
-from typing import List, Dict, Any
-from config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_PORT
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterable, Iterator, Optional, Tuple
+from config import (
+    DB_HOST,
+    DB_USER,
+    DB_PASSWORD,
+    DB_NAME,
+    DB_PORT,
+    DB_PAGE_SIZE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PING_INTERVAL,
+    ROLLUPS_ENABLED,
+    INDEX_TRANSACTION_ROWS,
+)
 
 
-class DatabaseManager:
-    def __init__(self):
-        self.connection = None
-        self.connect()
+# Extraction query and key column per entity type. Pages are read with
+# keyset pagination on the key column (aliased SEQ), so every page is an index
+# range scan regardless of table size; changed rows are read by key list.
+ENTITY_SOURCES = {
+    "product": (
+        """
+        SELECT p.*, p.PRODUCT_ID as SEQ, c.CNAME as category_name, s.COMPANY_NAME as supplier_name
+        FROM product p
+        LEFT JOIN category c ON p.CATEGORY_ID = c.CATEGORY_ID
+        LEFT JOIN supplier s ON p.SUPPLIER_ID = s.SUPPLIER_ID
+        """,
+        "p.PRODUCT_ID",
+    ),
+    "customer": (
+        """
+        SELECT c.*, c.CUST_ID as SEQ
+        FROM customer c
+        """,
+        "c.CUST_ID",
+    ),
+    "supplier": (
+        """
+        SELECT s.*, s.SUPPLIER_ID as SEQ, l.PROVINCE, l.CITY
+        FROM supplier s
+        LEFT JOIN location l ON s.LOCATION_ID = l.LOCATION_ID
+        """,
+        "s.SUPPLIER_ID",
+    ),
+    # One row per transaction line item, keyed on transaction_details.ID
+    "transaction": (
+        """
+        SELECT
+            t.TRANS_ID,
+            td.ID as SEQ,
+            t.DATE,
+            t.GRANDTOTAL,
+            td.PRODUCTS,
+            td.QTY,
+            td.PRICE as ITEM_PRICE,
+            td.EMPLOYEE,
+            td.ROLE,
+            c.FIRST_NAME,
+            c.LAST_NAME
+        FROM transaction_details td
+        JOIN transaction t ON t.TRANS_D_ID = td.TRANS_D_ID
+        JOIN customer c ON t.CUST_ID = c.CUST_ID
+        """,
+        "td.ID",
+    ),
+}
+
+ENTITY_QUERIES = {
+    entity: f"{select} WHERE {key} > %s ORDER BY {key} LIMIT %s"
+    for entity, (select, key) in ENTITY_SOURCES.items()
+}
+
+ENTITY_TYPES = list(ENTITY_QUERIES)
+
+# Tables whose row counts add up to the number of documents extracted
+ENTITY_COUNT_TABLES = {
+    "product": "product",
+    "customer": "customer",
+    "supplier": "supplier",
+    "transaction": "transaction_details",
+}
+
+
+# Category a line item's product name belongs to, as joined in sales_lines
+LINE_CATEGORY = "COALESCE(pc.CATEGORY, 'Uncategorized')"
+
+
+def sales_lines(key: str, period: int, condition: str = "TRUE") -> str:
+    """
+    Transaction line items with their units, revenue and the first `period`
+    characters of the transaction date (10 for the day, 7 for the month).
+    SEQ combines the CRC32 of `key` with the period as a number, e.g.
+    CRC32(name) * 10^8 + 20190318, so every (key, period) bucket has a stable
+    integer key for keyset pagination. Distinct names can share a CRC32, so
+    SEQ is not unique; see format_documents. Rows with unparseable dates are
+    skipped, as are rows not matching `condition`.
+    """
+    return f"""
+        SELECT
+            CRC32({key}) * 100000000
+                + CAST(REPLACE(LEFT(t.DATE, {period}), '-', '') AS UNSIGNED) AS SEQ,
+            td.PRODUCTS AS PRODUCT,
+            {LINE_CATEGORY} AS CATEGORY,
+            LEFT(t.DATE, {period}) AS PERIOD,
+            CAST(td.QTY AS UNSIGNED) AS UNITS,
+            CAST(td.QTY AS UNSIGNED) * CAST(td.PRICE AS DECIMAL(12, 2)) AS REVENUE,
+            t.TRANS_ID
+        FROM transaction_details td
+        JOIN transaction t ON t.TRANS_D_ID = td.TRANS_D_ID
+        LEFT JOIN (
+            SELECT p.NAME, MIN(c.CNAME) AS CATEGORY
+            FROM product p
+            LEFT JOIN category c ON p.CATEGORY_ID = c.CATEGORY_ID
+            GROUP BY p.NAME
+        ) pc ON pc.NAME = td.PRODUCTS
+        WHERE t.DATE LIKE '____-__-__%' AND {condition}
+    """
+
+
+def product_sales(period: int, condition: str = "TRUE") -> str:
+    return f"""
+        SELECT s.SEQ, s.PRODUCT, s.CATEGORY, s.PERIOD,
+               SUM(s.UNITS) AS UNITS, SUM(s.REVENUE) AS REVENUE,
+               COUNT(DISTINCT s.TRANS_ID) AS TRANSACTIONS
+        FROM ({sales_lines("td.PRODUCTS", period, condition)}) s
+        GROUP BY s.SEQ, s.PRODUCT, s.CATEGORY, s.PERIOD
+    """
+
+
+def category_sales(condition: str = "TRUE") -> str:
+    """Products of a category ranked by units sold in a month"""
+    return f"""
+        SELECT r.SEQ, r.CATEGORY, r.PERIOD,
+               SUM(r.UNITS) AS UNITS, SUM(r.REVENUE) AS REVENUE,
+               GROUP_CONCAT(
+                   CONCAT(r.PRODUCT, ': ', r.UNITS, ' units, $', FORMAT(r.REVENUE, 2))
+                   ORDER BY r.UNITS DESC, r.REVENUE DESC SEPARATOR '\\n'
+               ) AS RANKING
+        FROM (
+            SELECT s.SEQ, s.CATEGORY, s.PERIOD, s.PRODUCT,
+                   SUM(s.UNITS) AS UNITS, SUM(s.REVENUE) AS REVENUE
+            FROM ({sales_lines(LINE_CATEGORY, 7, condition)}) s
+            GROUP BY s.SEQ, s.CATEGORY, s.PERIOD, s.PRODUCT
+        ) r
+        GROUP BY r.SEQ, r.CATEGORY, r.PERIOD
+    """
+
+
+def customer_purchases(condition: str = "TRUE") -> str:
+    return f"""
+        SELECT c.CUST_ID AS SEQ, c.CUST_ID, c.FIRST_NAME, c.LAST_NAME,
+               o.TRANSACTIONS, o.FIRST_PURCHASE, o.LAST_PURCHASE,
+               SUM(r.UNITS) AS UNITS, SUM(r.REVENUE) AS SPENT,
+               GROUP_CONCAT(
+                   CONCAT(r.PRODUCT, ' (', r.UNITS, ')')
+                   ORDER BY r.UNITS DESC, r.PRODUCT SEPARATOR ', '
+               ) AS PRODUCTS
+        FROM customer c
+        JOIN (
+            SELECT t.CUST_ID, COUNT(*) AS TRANSACTIONS,
+                   MIN(LEFT(t.DATE, 10)) AS FIRST_PURCHASE,
+                   MAX(LEFT(t.DATE, 10)) AS LAST_PURCHASE
+            FROM transaction t
+            WHERE {condition}
+            GROUP BY t.CUST_ID
+        ) o ON o.CUST_ID = c.CUST_ID
+        JOIN (
+            SELECT t.CUST_ID, td.PRODUCTS AS PRODUCT,
+                   SUM(CAST(td.QTY AS UNSIGNED)) AS UNITS,
+                   SUM(CAST(td.QTY AS UNSIGNED) * CAST(td.PRICE AS DECIMAL(12, 2))) AS REVENUE
+            FROM transaction_details td
+            JOIN transaction t ON t.TRANS_D_ID = td.TRANS_D_ID
+            WHERE {condition}
+            GROUP BY t.CUST_ID, td.PRODUCTS
+        ) r ON r.CUST_ID = c.CUST_ID
+        GROUP BY c.CUST_ID, c.FIRST_NAME, c.LAST_NAME,
+                 o.TRANSACTIONS, o.FIRST_PURCHASE, o.LAST_PURCHASE
+    """
+
+
+def supplier_stock(condition: str = "TRUE") -> str:
+    return f"""
+        SELECT s.SUPPLIER_ID AS SEQ, s.SUPPLIER_ID, s.COMPANY_NAME,
+               COUNT(p.PRODUCT_ID) AS PRODUCTS,
+               COALESCE(SUM(p.QTY_STOCK), 0) AS QTY_STOCK,
+               COALESCE(SUM(p.ON_HAND), 0) AS ON_HAND,
+               COALESCE(SUM(p.ON_HAND * p.PRICE), 0) AS STOCK_VALUE,
+               GROUP_CONCAT(
+                   CONCAT(p.NAME, ' (', p.ON_HAND, ' on hand)')
+                   ORDER BY p.ON_HAND * p.PRICE DESC SEPARATOR ', '
+               ) AS PRODUCT_NAMES
+        FROM supplier s
+        LEFT JOIN product p ON p.SUPPLIER_ID = s.SUPPLIER_ID
+        WHERE {condition}
+        GROUP BY s.SUPPLIER_ID, s.COMPANY_NAME
+    """
+
+
+# Summary documents computed from many rows, indexed so the index grows with
+# the number of entities and time buckets rather than with sales volume. Each
+# builder takes a SQL condition restricting the source rows and yields one
+# row per document with an integer SEQ key. Line items refer to products by
+# name, as transaction_details.PRODUCTS does. GROUP_CONCAT lists are ordered
+# best first, so truncation at group_concat_max_len only cuts the tail.
+ROLLUP_BUILDERS: Dict[str, Callable[..., str]] = {
+    "product_daily_sales": lambda condition="TRUE": product_sales(10, condition),
+    "product_monthly_sales": lambda condition="TRUE": product_sales(7, condition),
+    "category_monthly_sales": category_sales,
+    "customer_purchases": customer_purchases,
+    "supplier_stock": supplier_stock,
+}
+
+ROLLUP_SOURCES = {rollup: build() for rollup, build in ROLLUP_BUILDERS.items()}
+
+ROLLUP_QUERIES = {
+    rollup: f"SELECT * FROM ({select}) r WHERE r.SEQ > %s ORDER BY r.SEQ LIMIT %s"
+    for rollup, select in ROLLUP_SOURCES.items()
+}
+
+ROLLUP_TYPES = list(ROLLUP_QUERIES)
+
+# Source columns identifying the bucket each rollup document summarizes, so
+# single buckets can be re-aggregated (fetch_rollup_buckets). Sales buckets
+# are (CRC32 of the product or category name, period) pairs, which also
+# selects every name colliding on the CRC32.
+ROLLUP_BUCKET_COLUMNS = {
+    "product_daily_sales": ("CRC32(td.PRODUCTS)", "LEFT(t.DATE, 10)"),
+    "product_monthly_sales": ("CRC32(td.PRODUCTS)", "LEFT(t.DATE, 7)"),
+    "category_monthly_sales": (f"CRC32({LINE_CATEGORY})", "LEFT(t.DATE, 7)"),
+    "customer_purchases": ("t.CUST_ID",),
+    "supplier_stock": ("s.SUPPLIER_ID",),
+}
+
+# Name a sales rollup row is bucketed by, besides its period
+ROLLUP_NAME_COLUMNS = {
+    "product_daily_sales": "PRODUCT",
+    "product_monthly_sales": "PRODUCT",
+    "category_monthly_sales": "CATEGORY",
+}
+
+# Cheap document counts per rollup for progress reporting: the distinct
+# buckets of the source rows, without aggregating them
+ROLLUP_COUNT_QUERIES = {
+    "product_daily_sales": (
+        "SELECT COUNT(DISTINCT td.PRODUCTS, LEFT(t.DATE, 10)) AS n "
+        "FROM transaction_details td JOIN transaction t ON t.TRANS_D_ID = td.TRANS_D_ID "
+        "WHERE t.DATE LIKE '____-__-__%'"
+    ),
+    "product_monthly_sales": (
+        "SELECT COUNT(DISTINCT td.PRODUCTS, LEFT(t.DATE, 7)) AS n "
+        "FROM transaction_details td JOIN transaction t ON t.TRANS_D_ID = td.TRANS_D_ID "
+        "WHERE t.DATE LIKE '____-__-__%'"
+    ),
+    # Categories times months is an upper bound; categories are few
+    "category_monthly_sales": (
+        "SELECT (SELECT COUNT(*) + 1 FROM category) * COUNT(DISTINCT LEFT(t.DATE, 7)) AS n "
+        "FROM transaction t WHERE t.DATE LIKE '____-__-__%'"
+    ),
+    "customer_purchases": "SELECT COUNT(DISTINCT t.CUST_ID) AS n FROM transaction t",
+    "supplier_stock": "SELECT COUNT(*) AS n FROM supplier",
+}
+
+# Change log entities each rollup is computed from; a change to any of them
+# makes the rollup stale
+ROLLUP_INPUTS = {
+    "product_daily_sales": ("transaction", "product"),
+    "product_monthly_sales": ("transaction", "product"),
+    "category_monthly_sales": ("transaction", "product"),
+    "customer_purchases": ("transaction", "customer"),
+    "supplier_stock": ("product", "supplier"),
+}
+
+# Every document type the vector store may hold
+DOCUMENT_TYPES = ENTITY_TYPES + ROLLUP_TYPES
+
+# Document types extracted into the index. Without raw transaction rows the
+# index grows with entities and time buckets, not with sales volume.
+INDEXED_TYPES = [
+    doc_type for doc_type in ENTITY_TYPES
+    if doc_type != "transaction" or INDEX_TRANSACTION_ROWS
+] + (ROLLUP_TYPES if ROLLUPS_ENABLED else [])
+
+
+def product_document(product: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "product",
+        "id": product["PRODUCT_ID"],
+        "seq": product["SEQ"],
+        "content": f"Product {product['NAME']} (ID: {product['PRODUCT_ID']}, "
+        f"code: {product['PRODUCT_CODE']}) "
+        f"is a {product['category_name']} item supplied by {product['supplier_name']}. "
+        f"Description: {product['DESCRIPTION']}. "
+        f"Current stock: {product['QTY_STOCK']}, On hand: {product['ON_HAND']}, "
+        f"Price: ${product['PRICE']}",
+    }
+
+
+def customer_document(customer: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "customer",
+        "id": customer["CUST_ID"],
+        "seq": customer["SEQ"],
+        "content": f"Customer {customer['FIRST_NAME']} {customer['LAST_NAME']} "
+        f"(ID: {customer['CUST_ID']}) "
+        f"Contact: {customer['PHONE_NUMBER']}",
+    }
+
+
+def supplier_document(supplier: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "supplier",
+        "id": supplier["SUPPLIER_ID"],
+        "seq": supplier["SEQ"],
+        "content": f"Supplier {supplier['COMPANY_NAME']} "
+        f"(ID: {supplier['SUPPLIER_ID']}) "
+        f"is located in {supplier['CITY']}, {supplier['PROVINCE']}. "
+        f"Contact: {supplier['PHONE_NUMBER']}",
+    }
+
+
+def transaction_document(transaction: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "transaction",
+        "id": transaction["TRANS_ID"],
+        # One document per line item of the transaction
+        "doc_id": f"transaction_{transaction['TRANS_ID']}_{transaction['SEQ']}",
+        "seq": transaction["SEQ"],
+        "content": f"Transaction (ID: {transaction['TRANS_ID']}) "
+        f"by customer {transaction['FIRST_NAME']} {transaction['LAST_NAME']} "
+        f"for product {transaction['PRODUCTS']} "
+        f"quantity: {transaction['QTY']}, "
+        f"price: ${transaction['ITEM_PRICE']}, "
+        f"total: ${transaction['GRANDTOTAL']}, "
+        f"date: {transaction['DATE']}, "
+        f"processed by {transaction['EMPLOYEE']} ({transaction['ROLE']})",
+    }
+
+
+ENTITY_FORMATTERS = {
+    "product": product_document,
+    "customer": customer_document,
+    "supplier": supplier_document,
+    "transaction": transaction_document,
+}
+
+
+def money(value: Any) -> str:
+    return f"${float(value or 0):,.2f}"
+
+
+def rollup_document(doc_type: str, row: Dict[str, Any], content: str) -> Dict[str, Any]:
+    return {"type": doc_type, "id": row["SEQ"], "seq": row["SEQ"], "content": content}
+
+
+def product_daily_sales_document(row: Dict[str, Any]) -> Dict[str, Any]:
+    return rollup_document(
+        "product_daily_sales",
+        row,
+        f"Daily sales of product {row['PRODUCT']} ({row['CATEGORY']}) on {row['PERIOD']}: "
+        f"{row['UNITS']} units sold for {money(row['REVENUE'])} "
+        f"in {row['TRANSACTIONS']} transactions",
+    )
+
+
+def product_monthly_sales_document(row: Dict[str, Any]) -> Dict[str, Any]:
+    return rollup_document(
+        "product_monthly_sales",
+        row,
+        f"Monthly sales of product {row['PRODUCT']} ({row['CATEGORY']}) in {row['PERIOD']}: "
+        f"{row['UNITS']} units sold for {money(row['REVENUE'])} "
+        f"in {row['TRANSACTIONS']} transactions",
+    )
+
+
+def category_monthly_sales_document(row: Dict[str, Any]) -> Dict[str, Any]:
+    ranking = "; ".join(
+        f"{rank}. {entry}" for rank, entry in enumerate((row["RANKING"] or "").split("\n"), 1)
+    )
+    return rollup_document(
+        "category_monthly_sales",
+        row,
+        f"Best-selling {row['CATEGORY']} products in {row['PERIOD']}: {ranking}. "
+        f"Category total: {row['UNITS']} units, {money(row['REVENUE'])}",
+    )
+
+
+def customer_purchases_document(row: Dict[str, Any]) -> Dict[str, Any]:
+    return rollup_document(
+        "customer_purchases",
+        row,
+        f"Purchase summary of customer {row['FIRST_NAME']} {row['LAST_NAME']} "
+        f"(ID: {row['CUST_ID']}): {row['TRANSACTIONS']} transactions from "
+        f"{row['FIRST_PURCHASE']} to {row['LAST_PURCHASE']}, {row['UNITS']} units, "
+        f"{money(row['SPENT'])} spent. Products bought: {row['PRODUCTS']}",
+    )
+
+
+def supplier_stock_document(row: Dict[str, Any]) -> Dict[str, Any]:
+    products = f". Products: {row['PRODUCT_NAMES']}" if row["PRODUCT_NAMES"] else ""
+    return rollup_document(
+        "supplier_stock",
+        row,
+        f"Stock supplied by {row['COMPANY_NAME']} (supplier ID: {row['SUPPLIER_ID']}): "
+        f"{row['PRODUCTS']} products, {row['QTY_STOCK']} units stocked, "
+        f"{row['ON_HAND']} on hand, stock value {money(row['STOCK_VALUE'])}{products}",
+    )
+
+
+ROLLUP_FORMATTERS = {
+    "product_daily_sales": product_daily_sales_document,
+    "product_monthly_sales": product_monthly_sales_document,
+    "category_monthly_sales": category_monthly_sales_document,
+    "customer_purchases": customer_purchases_document,
+    "supplier_stock": supplier_stock_document,
+}
+
+DOCUMENT_QUERIES = {**ENTITY_QUERIES, **ROLLUP_QUERIES}
+DOCUMENT_FORMATTERS = {**ENTITY_FORMATTERS, **ROLLUP_FORMATTERS}
+
+
+def bucket_seq(key: int, period: str) -> int:
+    """SEQ of a sales rollup bucket, as computed by sales_lines"""
+    return key * 100000000 + int(period.replace("-", ""))
+
 
-    def connect(self):
+def format_documents(doc_type: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Format extracted rows of one type. Sales rollup rows of distinct names
+    whose CRC32 collide share a SEQ; their documents are given ids from a
+    hash of the name instead, so they neither overwrite each other nor depend
+    on row order. Rows sharing a SEQ must therefore be formatted together.
+    """
+    docs = [DOCUMENT_FORMATTERS[doc_type](row) for row in rows]
+    name_column = ROLLUP_NAME_COLUMNS.get(doc_type)
+    if name_column:
+        shared = Counter(row["SEQ"] for row in rows)
+        for doc, row in zip(docs, rows):
+            if shared[row["SEQ"]] > 1:
+                name_hash = hashlib.sha1(str(row[name_column]).encode("utf-8")).hexdigest()[:12]
+                doc["doc_id"] = f"{doc_type}_{row['SEQ']}_{name_hash}"
+    return docs
+
+
+class PoolTimeout(Error):
+    """No connection became available within DB_POOL_TIMEOUT"""
+
+
+class PooledConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQL connections. Connections are opened lazily up
+    to `size`, pinged when they have been idle for a while, reopened when
+    older than `recycle` seconds and discarded when a query on them fails.
+    """
+
+    def __init__(self, size: int, timeout: float, recycle: int, ping_interval: int):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self.condition = threading.Condition()
+        self.idle: List[PooledConnection] = []
+        self.open = 0
+        self.in_use = 0
+        self.waiters = 0
+        self.checkouts = 0
+        self.checkout_seconds_total = 0.0
+        self.checkout_seconds_max = 0.0
+        self.timeouts = 0
+        self.recycled = 0
+        self.discarded = 0
+
+    def _open_connection(self) -> PooledConnection:
         try:
-            self.connection = mysql.connector.connect(
-                host=DB_HOST,
-                port=DB_PORT,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                database=DB_NAME,
+            return PooledConnection(
+                mysql.connector.connect(
+                    host=DB_HOST,
+                    port=DB_PORT,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    database=DB_NAME,
+                    # Each query sees fresh data instead of a long-lived snapshot
+                    autocommit=True,
+                )
             )
         except Error as e:
             print(f"Error connecting to MySQL Database: {e}")
             raise
 
-    def get_all_data(self) -> List[Dict[str, Any]]:
-        """
-        Extracts all relevant data from the database for embedding
-        Returns a list of dictionaries containing the data
-        """
-        if not self.connection or not self.connection.is_connected():
-            self.connect()
+    def _close_quietly(self, pooled: PooledConnection):
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+
+    def _ready(self, pooled: Optional[PooledConnection]) -> PooledConnection:
+        """Validate a checked-out connection, replacing it if it is old or dead"""
+        now = time.monotonic()
+        if pooled is not None and now - pooled.created_at > self.recycle:
+            self._close_quietly(pooled)
+            self.recycled += 1
+            pooled = None
+        if pooled is not None and now - pooled.last_used_at > self.ping_interval:
+            try:
+                pooled.connection.ping(reconnect=False)
+            except Exception:
+                self._close_quietly(pooled)
+                self.discarded += 1
+                pooled = None
+        return pooled or self._open_connection()
 
-        cursor = self.connection.cursor(dictionary=True)
-        data = []
+    def checkout(self) -> PooledConnection:
+        start = time.perf_counter()
+        with self.condition:
+            while not self.idle and self.open >= self.size:
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        msg=f"No database connection available after {self.timeout}s"
+                    )
+                self.waiters += 1
+                try:
+                    self.condition.wait(remaining)
+                finally:
+                    self.waiters -= 1
+            if self.idle:
+                pooled = self.idle.pop()
+            else:
+                pooled = None
+                self.open += 1  # Reserve the slot for a new connection
+            self.in_use += 1
 
         try:
-            # Products
-            cursor.execute("""
-                SELECT p.*, c.CNAME as category_name, s.COMPANY_NAME as supplier_name 
-                FROM product p 
-                LEFT JOIN category c ON p.CATEGORY_ID = c.CATEGORY_ID 
-                LEFT JOIN supplier s ON p.SUPPLIER_ID = s.SUPPLIER_ID
-            """)
-            products = cursor.fetchall()
-            for product in products:
-                data.append(
-                    {
-                        "type": "product",
-                        "id": product["PRODUCT_ID"],
-                        "content": f"Product {product['NAME']} (ID: {product['PRODUCT_ID']}) "
-                        f"is a {product['category_name']} item supplied by {product['supplier_name']}. "
-                        f"Description: {product['DESCRIPTION']}. "
-                        f"Current stock: {product['QTY_STOCK']}, Price: ${product['PRICE']}",
-                    }
-                )
+            pooled = self._ready(pooled)
+        except Exception:
+            with self.condition:
+                self.open -= 1
+                self.in_use -= 1
+                self.condition.notify()
+            raise
 
-            # Customers
-            cursor.execute("SELECT * FROM customer")
-            customers = cursor.fetchall()
-            for customer in customers:
-                data.append(
-                    {
-                        "type": "customer",
-                        "id": customer["CUST_ID"],
-                        "content": f"Customer {customer['FIRST_NAME']} {customer['LAST_NAME']} "
-                        f"(ID: {customer['CUST_ID']}) "
-                        f"Contact: {customer['PHONE_NUMBER']}",
-                    }
-                )
+        elapsed = time.perf_counter() - start
+        with self.condition:
+            self.checkouts += 1
+            self.checkout_seconds_total += elapsed
+            self.checkout_seconds_max = max(self.checkout_seconds_max, elapsed)
+        return pooled
 
-            # Suppliers
-            cursor.execute("""
-                SELECT s.*, l.PROVINCE, l.CITY 
-                FROM supplier s 
-                LEFT JOIN location l ON s.LOCATION_ID = l.LOCATION_ID
-            """)
-            suppliers = cursor.fetchall()
-            for supplier in suppliers:
-                data.append(
-                    {
-                        "type": "supplier",
-                        "id": supplier["SUPPLIER_ID"],
-                        "content": f"Supplier {supplier['COMPANY_NAME']} "
-                        f"(ID: {supplier['SUPPLIER_ID']}) "
-                        f"is located in {supplier['CITY']}, {supplier['PROVINCE']}. "
-                        f"Contact: {supplier['PHONE_NUMBER']}",
-                    }
-                )
+    def checkin(self, pooled: PooledConnection, broken: bool = False):
+        pooled.last_used_at = time.monotonic()
+        if broken:
+            self._close_quietly(pooled)
+        with self.condition:
+            self.in_use -= 1
+            if broken:
+                self.open -= 1
+                self.discarded += 1
+            else:
+                self.idle.append(pooled)
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the block"""
+        pooled = self.checkout()
+        try:
+            yield pooled.connection
+        except Exception:
+            self.checkin(pooled, broken=True)
+            raise
+        else:
+            self.checkin(pooled)
+
+    def close_all(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.open -= len(idle)
+        for pooled in idle:
+            self._close_quietly(pooled)
 
-            # Transactions with details
-            cursor.execute("""
-                SELECT 
-                    t.TRANS_ID,
-                    t.DATE,
-                    t.GRANDTOTAL,
-                    td.PRODUCTS,
-                    td.QTY,
-                    td.PRICE as ITEM_PRICE,
-                    td.EMPLOYEE,
-                    td.ROLE,
-                    c.FIRST_NAME,
-                    c.LAST_NAME
-                FROM transaction t
-                JOIN transaction_details td ON t.TRANS_D_ID = td.TRANS_D_ID
-                JOIN customer c ON t.CUST_ID = c.CUST_ID
-                ORDER BY t.TRANS_ID DESC
-                LIMIT 1000
-            """)
-            transactions = cursor.fetchall()
-            for transaction in transactions:
-                data.append(
-                    {
-                        "type": "transaction",
-                        "id": transaction["TRANS_ID"],
-                        "content": f"Transaction (ID: {transaction['TRANS_ID']}) "
-                        f"by customer {transaction['FIRST_NAME']} {transaction['LAST_NAME']} "
-                        f"for product {transaction['PRODUCTS']} "
-                        f"quantity: {transaction['QTY']}, "
-                        f"price: ${transaction['ITEM_PRICE']}, "
-                        f"total: ${transaction['GRANDTOTAL']}, "
-                        f"date: {transaction['DATE']}, "
-                        f"processed by {transaction['EMPLOYEE']} ({transaction['ROLE']})",
-                    }
+    def get_stats(self) -> Dict[str, Any]:
+        with self.condition:
+            return {
+                "size": self.size,
+                "open": self.open,
+                "in_use": self.in_use,
+                "idle": len(self.idle),
+                "waiters": self.waiters,
+                "checkouts": self.checkouts,
+                "checkout_ms_avg": round(
+                    1000 * self.checkout_seconds_total / self.checkouts, 3
                 )
+                if self.checkouts
+                else 0.0,
+                "checkout_ms_max": round(1000 * self.checkout_seconds_max, 3),
+                "timeouts": self.timeouts,
+                "recycled": self.recycled,
+                "discarded": self.discarded,
+            }
+
+
+class DatabaseManager:
+    def __init__(self):
+        # Connections are opened on first use, not at import time
+        self.pool = ConnectionPool(
+            DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PING_INTERVAL
+        )
+        # Blocking queries run here so they never stall the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=DB_POOL_SIZE, thread_name_prefix="db"
+        )
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Run a blocking database function on the DB worker threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """Run a parameterized query on a pooled connection"""
+        with self.pool.connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchall() if cursor.with_rows else []
+            finally:
+                cursor.close()
+
+    def ping(self) -> bool:
+        """Check that a pooled connection can run a query"""
+        self.query("SELECT 1")
+        return True
 
+    def fetch_page(
+        self,
+        doc_type: str,
+        after_seq: int,
+        page_size: int = DB_PAGE_SIZE,
+        table: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Fetch the next page of documents of one entity or rollup type after
+        `after_seq`, and whether more may follow. Rollup pages are read from
+        `table` when it was materialized (materialize_rollup), else
+        aggregated from the source. Rows sharing a SEQ are never split
+        across pages: a full rollup page is extended to the end of its last
+        run of equal SEQs.
+        """
+        if table:
+            sql = f"SELECT * FROM `{table}` r WHERE r.SEQ > %s ORDER BY r.SEQ LIMIT %s"
+        else:
+            sql = DOCUMENT_QUERIES[doc_type]
+        try:
+            rows = self.query(sql, (after_seq, page_size))
+            more = len(rows) == page_size
+            if more and doc_type in ROLLUP_SOURCES:
+                # Names colliding on CRC32 share a SEQ; the next page starts
+                # after the last one, so read the rest of its run now
+                last_seq = rows[-1]["SEQ"]
+                source = f"`{table}`" if table else f"({ROLLUP_SOURCES[doc_type]})"
+                rows = [row for row in rows if row["SEQ"] != last_seq] + self.query(
+                    f"SELECT * FROM {source} r WHERE r.SEQ = %s", (last_seq,)
+                )
         except Error as e:
-            print(f"Error extracting data from database: {e}")
+            print(f"Error extracting {doc_type} data from database: {e}")
             raise
-        finally:
-            cursor.close()
+        return format_documents(doc_type, rows), more
+
+    def materialize_rollup(self, rollup: str) -> Optional[str]:
+        """
+        Aggregate one rollup type once into a scratch table indexed on SEQ, so
+        its pages are index range reads instead of one aggregation of the
+        whole sales history each. Returns the table name, or None if it
+        could not be created (e.g. without the CREATE privilege), in which
+        case pages are aggregated from the source. Drop it with drop_table.
+        """
+        table = f"scms_rollup_{rollup}_{uuid.uuid4().hex[:8]}"
+        start = time.perf_counter()
+        try:
+            self.query(f"CREATE TABLE `{table}` (INDEX (SEQ)) ENGINE=InnoDB {ROLLUP_SOURCES[rollup]}")
+        except Error as e:
+            print(f"Could not materialize {rollup}, aggregating every page instead: {e}")
+            return None
+        print(f"Materialized {rollup} in {time.perf_counter() - start:.2f}s")
+        return table
+
+    def drop_table(self, table: str):
+        self.query(f"DROP TABLE IF EXISTS `{table}`")
+
+    def fetch_documents(self, entity: str, seqs: List[int]) -> List[Dict[str, Any]]:
+        """Fetch the documents of one entity type with the given keys"""
+        if not seqs:
+            return []
+        select, key = ENTITY_SOURCES[entity]
+        placeholders = ", ".join(["%s"] * len(seqs))
+        rows = self.query(
+            f"{select} WHERE {key} IN ({placeholders}) ORDER BY {key}", tuple(seqs)
+        )
+        return [ENTITY_FORMATTERS[entity](row) for row in rows]
+
+    def fetch_rollup_buckets(self, rollup: str, buckets: List[tuple]) -> List[Dict[str, Any]]:
+        """
+        Re-aggregate just the given buckets of one rollup type, each a tuple
+        of values of its ROLLUP_BUCKET_COLUMNS, e.g. (CRC32 of a product name,
+        day). Only the source rows of those buckets are read.
+        """
+        if not buckets:
+            return []
+        columns = ROLLUP_BUCKET_COLUMNS[rollup]
+        if len(columns) == 1:
+            condition = f"{columns[0]} IN ({', '.join(['%s'] * len(buckets))})"
+        else:
+            row = f"({', '.join(['%s'] * len(columns))})"
+            condition = f"({', '.join(columns)}) IN ({', '.join([row] * len(buckets))})"
+        values = tuple(value for bucket in buckets for value in bucket)
+        select = ROLLUP_BUILDERS[rollup](condition)
+        rows = self.query(
+            f"SELECT * FROM ({select}) r ORDER BY r.SEQ", values * select.count(condition)
+        )
+        return format_documents(rollup, rows)
+
+    def fetch_line_buckets(self, line_ids: List[int]) -> List[Dict[str, Any]]:
+        """
+        Rollup buckets of the given transaction line items: the CRC32 keys of
+        their product and category names, their day and month (NULL when the
+        date is unparseable) and their customer. Lines whose transaction row
+        does not exist (yet) are missing.
+        """
+        if not line_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(line_ids))
+        return self.query(
+            f"""
+            SELECT td.ID, t.CUST_ID,
+                   CRC32(td.PRODUCTS) AS PRODUCT_KEY,
+                   CRC32({LINE_CATEGORY}) AS CATEGORY_KEY,
+                   IF(t.DATE LIKE '____-__-__%', LEFT(t.DATE, 10), NULL) AS DAY,
+                   IF(t.DATE LIKE '____-__-__%', LEFT(t.DATE, 7), NULL) AS MONTH
+            FROM transaction_details td
+            JOIN transaction t ON t.TRANS_D_ID = td.TRANS_D_ID
+            LEFT JOIN (
+                SELECT p.NAME, MIN(c.CNAME) AS CATEGORY
+                FROM product p
+                LEFT JOIN category c ON p.CATEGORY_ID = c.CATEGORY_ID
+                GROUP BY p.NAME
+            ) pc ON pc.NAME = td.PRODUCTS
+            WHERE td.ID IN ({placeholders})
+            """,
+            tuple(line_ids),
+        )
+
+    def fetch_product_labels(self, product_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """Name, category and supplier of the given products, or of all products"""
+        sql = "SELECT PRODUCT_ID, NAME, CATEGORY_ID, SUPPLIER_ID FROM product"
+        if product_ids is None:
+            return self.query(sql)
+        if not product_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        return self.query(f"{sql} WHERE PRODUCT_ID IN ({placeholders})", tuple(product_ids))
+
+    def fetch_changes(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Read change log entries written by the triggers in Database/changelog.sql"""
+        return self.query(
+            "SELECT ID, ENTITY, ENTITY_ID, OP, TIMESTAMPDIFF(SECOND, CHANGED_AT, NOW()) AS AGE_SECONDS "
+            "FROM scms_changelog WHERE ID > %s ORDER BY ID LIMIT %s",
+            (after_id, limit),
+        )
+
+    def delete_changes(self, up_to_id: int):
+        """Remove change log entries that have been applied"""
+        self.query("DELETE FROM scms_changelog WHERE ID <= %s", (up_to_id,))
+
+    def iter_document_pages(
+        self, types: Iterable[str] = INDEXED_TYPES, page_size: int = DB_PAGE_SIZE
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield every document of `types` for embedding, one page at a time,
+        type by type. Memory use is bounded by `page_size` whatever the table
+        sizes; each rollup type is aggregated once, into a scratch table.
+        """
+        for doc_type in types:
+            table = self.materialize_rollup(doc_type) if doc_type in ROLLUP_SOURCES else None
+            try:
+                after_seq = -1
+                more = True
+                while more:
+                    page, more = self.fetch_page(doc_type, after_seq, page_size, table)
+                    if not page:
+                        break
+                    yield page
+                    after_seq = page[-1]["seq"]
+            finally:
+                if table:
+                    self.drop_table(table)
+
+    async def aiter_document_pages(
+        self, types: Iterable[str] = INDEXED_TYPES, page_size: int = DB_PAGE_SIZE
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Async variant of iter_document_pages; queries run on the DB threads"""
+        for doc_type in types:
+            table = None
+            if doc_type in ROLLUP_SOURCES:
+                table = await self.run(self.materialize_rollup, doc_type)
+            try:
+                after_seq = -1
+                more = True
+                while more:
+                    page, more = await self.run(
+                        self.fetch_page, doc_type, after_seq, page_size, table
+                    )
+                    if not page:
+                        break
+                    yield page
+                    after_seq = page[-1]["seq"]
+            finally:
+                if table:
+                    await self.run(self.drop_table, table)
+
+    def count_documents(self, types: Iterable[str] = INDEXED_TYPES) -> int:
+        """Approximate number of documents an extraction of `types` yields"""
+        total = 0
+        for doc_type in types:
+            if doc_type in ENTITY_COUNT_TABLES:
+                sql = f"SELECT COUNT(*) AS n FROM `{ENTITY_COUNT_TABLES[doc_type]}`"
+            else:
+                sql = ROLLUP_COUNT_QUERIES[doc_type]
+            total += self.query(sql)[0]["n"]
+        return total
+
+    def get_all_data(self) -> List[Dict[str, Any]]:
+        """
+        Extracts all relevant data from the database for embedding
+        Returns a list of dictionaries containing the data
+        """
+        return [doc for page in self.iter_document_pages() for doc in page]
 
-        return data
+    def get_stats(self) -> Dict[str, Any]:
+        return self.pool.get_stats()
 
     def close(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+        self.pool.close_all()
+        self.executor.shutdown(wait=False)
@@ -1,114 +1,651 @@
+import asyncio
+import hashlib
+import threading
+import time
 import ollama
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterable, AsyncIterator, Callable, Iterable, Optional, Set, Union
 from config import EMBEDDING_MODEL, OLLAMA_HOST
 import chromadb
 from chromadb.config import Settings
-from config import CHROMA_PERSIST_DIR
+from config import (
+    CHROMA_PERSIST_DIR,
+    CHROMA_HOST,
+    CHROMA_PORT,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CONCURRENCY,
+    VECTOR_STORE_PAGE_SIZE,
+    KEYWORD_INDEX_ENABLED,
+    HYBRID_CANDIDATES,
+    HYBRID_RRF_K,
+)
+from keyword_index import KeywordIndex
+from chunking import chunk_id, chunk_parent, split_text
+from metrics import DOCUMENTS_EMBEDDED, EMBEDDING_DOCS_PER_SECOND
+
+
+async def _aiter(iterable: Iterable[Any]) -> AsyncIterator[Any]:
+    for item in iterable:
+        yield item
+
+
+def document_id(doc: Dict[str, Any]) -> str:
+    """Stable vector store id for a source row, e.g. product_12"""
+    return doc.get("doc_id") or f"{doc['type']}_{doc['id']}"
+
+
+def content_hash(text: str) -> str:
+    """Hash of a document's content, stored to detect changed rows"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def document_metadata(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata stored with each document"""
+    metadata = {
+        "type": doc["type"],
+        "id": doc["id"],
+        "content_hash": doc.get("content_hash") or content_hash(doc["content"]),
+    }
+    if "seq" in doc:
+        # Extraction key, used to find deleted rows one key range at a time
+        metadata["seq"] = doc["seq"]
+    if "chunk" in doc:
+        metadata["chunk"] = doc["chunk"]
+        metadata["chunks"] = doc["chunks"]
+    return metadata
+
+
+def chunk_document(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Split a document longer than CHUNK_SIZE into chunks stored as separate
+    entries. Every chunk carries the hash of the whole document, and the
+    first keeps the document id, so change detection works as before.
+    """
+    texts = split_text(doc["content"])
+    if len(texts) == 1:
+        return [doc]
+    base_id = document_id(doc)
+    full_hash = content_hash(doc["content"])
+    return [
+        {
+            **doc,
+            "doc_id": chunk_id(base_id, i),
+            "content": text,
+            "content_hash": full_hash,
+            "chunk": i,
+            "chunks": len(texts),
+        }
+        for i, text in enumerate(texts)
+    ]
+
+
+def stale_chunk_ids(doc_id: str, metadata: Dict[str, Any], doc: Dict[str, Any]) -> List[str]:
+    """Ids of stored chunks past the end of a changed document that got shorter"""
+    stored_chunks = metadata.get("chunks", 1)
+    return [chunk_id(doc_id, i) for i in range(len(split_text(doc["content"])), stored_chunks)]
+
+
+def fuse_rankings(rankings: List[List[Dict[str, Any]]], n_results: int) -> List[Dict[str, Any]]:
+    """Reciprocal rank fusion of several ranked result lists"""
+    fused: Dict[str, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            entry = fused.setdefault(doc["id"], {**doc, "rrf_score": 0.0})
+            entry.update({k: v for k, v in doc.items() if k in ("distance", "score")})
+            entry["rrf_score"] += 1.0 / (HYBRID_RRF_K + rank + 1)
+
+    best = sorted(fused.values(), key=lambda doc: doc["rrf_score"], reverse=True)
+    return best[:n_results]
+
+
+class EmbeddingPipeline:
+    """
+    Streaming embed-and-store pipeline.
+
+    Submitted documents are grouped into multi-input batches, with up to
+    `concurrency` Ollama embed requests in flight, while a single writer
+    upserts finished batches into ChromaDB so writes overlap with embedding
+    of the next batch. Memory is bounded by batch_size * concurrency.
+    """
+
+    def __init__(
+        self,
+        manager: "EmbeddingManager",
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ):
+        self.manager = manager
+        self.batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        self.concurrency = concurrency or EMBEDDING_CONCURRENCY
+        self.pending: List[Dict[str, Any]] = []
+        # Finished batches waiting to be written; bounded so embedding
+        # cannot run arbitrarily far ahead of ChromaDB.
+        self.write_queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.embed_tasks: Set[asyncio.Task] = set()
+        self.errors: List[BaseException] = []
+        self.documents = 0
+        self.chunks = 0
+        self.batches = 0
+        self.start = time.perf_counter()
+        self.writer_task = asyncio.create_task(self._writer())
+
+    def _raise_if_failed(self):
+        if self.errors:
+            raise self.errors[0]
+
+    def _embed_done(self, task: asyncio.Task):
+        self.embed_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            self.errors.append(task.exception())
+
+    async def _embed_batch(self, batch: List[Dict[str, Any]]):
+        try:
+            texts = [doc["content"] for doc in batch]
+            try:
+                embeddings = await self.manager.generate_embeddings(texts)
+            except Exception:
+                print(f"Error generating embeddings for batch starting with: {texts[0][:100]}...")
+                raise
+        finally:
+            self.slots.release()
+
+        ids = [document_id(doc) for doc in batch]
+        metadatas = [document_metadata(doc) for doc in batch]
+        await self.write_queue.put((ids, texts, metadatas, embeddings))
+
+    async def _writer(self):
+        while True:
+            item = await self.write_queue.get()
+            if item is None:
+                return
+            if self.errors:
+                # Keep draining so producers never block on a full queue
+                continue
+            try:
+                await asyncio.to_thread(self.manager._write_batch, *item)
+            except Exception as e:
+                self.errors.append(e)
+
+    async def _flush(self):
+        batch, self.pending = self.pending, []
+        await self.slots.acquire()
+        if self.errors:
+            self.slots.release()
+            self._raise_if_failed()
+        task = asyncio.create_task(self._embed_batch(batch))
+        self.embed_tasks.add(task)
+        task.add_done_callback(self._embed_done)
+        self.batches += 1
+
+    async def submit(self, doc: Dict[str, Any]):
+        """Queue one document's chunks; blocks while the pipeline is saturated"""
+        self.documents += 1
+        for chunk in chunk_document(doc):
+            self.pending.append(chunk)
+            self.chunks += 1
+            if len(self.pending) >= self.batch_size:
+                await self._flush()
+
+    async def close(self) -> Dict[str, Any]:
+        """Embed and write everything submitted, then return throughput statistics"""
+        if self.pending:
+            await self._flush()
+        await asyncio.gather(*list(self.embed_tasks), return_exceptions=True)
+        await self.write_queue.put(None)
+        await self.writer_task
+        self._raise_if_failed()
+
+        elapsed = time.perf_counter() - self.start
+        stats = {
+            "documents": self.documents,
+            "chunks": self.chunks,
+            "batches": self.batches,
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "seconds": round(elapsed, 3),
+            "docs_per_sec": round(self.documents / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+        if self.documents:
+            DOCUMENTS_EMBEDDED.inc(self.documents)
+            EMBEDDING_DOCS_PER_SECOND.set(stats["docs_per_sec"])
+        print(
+            f"Embedded {stats['documents']} documents in {stats['seconds']}s "
+            f"({stats['docs_per_sec']} docs/sec, batch_size={self.batch_size}, "
+            f"concurrency={self.concurrency})"
+        )
+        return stats
+
+    def abort(self):
+        """Cancel in-flight embedding and writing"""
+        for task in list(self.embed_tasks):
+            task.cancel()
+        self.writer_task.cancel()
 
 
 class EmbeddingManager:
     def __init__(self):
-        self.client = chromadb.Client(
-            Settings(persist_directory=CHROMA_PERSIST_DIR, is_persistent=True)
-        )
+        if CHROMA_HOST:
+            # Shared Chroma server, so several instances serve one index
+            self.client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+        else:
+            self.client = chromadb.Client(
+                Settings(persist_directory=CHROMA_PERSIST_DIR, is_persistent=True)
+            )
         # Create or get the collection
         self.collection = self.client.get_or_create_collection(
             name="scms_data", metadata={"hnsw:space": "cosine"}
         )
+        # Question embeddings of cached answers, used by the semantic cache
+        self.cache_collection = self.client.get_or_create_collection(
+            name="scms_chat_cache", metadata={"hnsw:space": "cosine"}
+        )
+        self.ollama = ollama.AsyncClient(host=OLLAMA_HOST)
+        # Keyword side of hybrid retrieval, kept in step with every write
+        self.keyword_index = KeywordIndex() if KEYWORD_INDEX_ENABLED else None
+        # Ids written or deleted since the last drain, when other instances
+        # need to hear about them (see index_feed.IndexChangeFeed)
+        self.changed_ids: Optional[Set[str]] = None
+        self.changed_ids_lock = threading.Lock()
+
+    def track_changes(self):
+        """Start recording the ids of written and deleted documents"""
+        self.changed_ids = set()
+
+    def record_changes(self, ids: List[str]):
+        if self.changed_ids is not None:
+            with self.changed_ids_lock:
+                self.changed_ids.update(ids)
+
+    def drain_changes(self) -> List[str]:
+        """Ids written or deleted since the previous drain"""
+        with self.changed_ids_lock:
+            ids = sorted(self.changed_ids or ())
+            if self.changed_ids is not None:
+                self.changed_ids = set()
+        return ids
+
+    def load_keyword_index(self):
+        """Build the keyword index from the stored documents (runs in a worker thread)"""
+        if self.keyword_index is None:
+            return
+        start = time.perf_counter()
+        offset = 0
+        while True:
+            page = self.collection.get(
+                include=["documents", "metadatas"],
+                limit=VECTOR_STORE_PAGE_SIZE,
+                offset=offset,
+            )
+            if not page["ids"]:
+                break
+            self.keyword_index.upsert(page["ids"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+        self.keyword_index.ready = True
+        print(f"Keyword index built over {offset} documents in {time.perf_counter() - start:.2f}s")
+
+    def rebuild_keyword_index(self):
+        """
+        Build a fresh keyword index and swap it in, for instances that missed
+        changes made by another one (runs in a worker thread)
+        """
+        if self.keyword_index is None:
+            return
+        previous = self.keyword_index
+        self.keyword_index = KeywordIndex()
+        try:
+            self.load_keyword_index()
+        except BaseException:
+            self.keyword_index = previous
+            raise
+
+    def reload_keyword_documents(self, ids: List[str]):
+        """
+        Re-read documents written or deleted by another instance into the
+        keyword index (runs in a worker thread)
+        """
+        if self.keyword_index is None:
+            return
+        for i in range(0, len(ids), VECTOR_STORE_PAGE_SIZE):
+            page_ids = ids[i : i + VECTOR_STORE_PAGE_SIZE]
+            page = self.collection.get(ids=page_ids, include=["documents", "metadatas"])
+            self.keyword_index.upsert(page["ids"], page["documents"], page["metadatas"])
+            found = set(page["ids"])
+            self.keyword_index.delete([doc_id for doc_id in page_ids if doc_id not in found])
 
     async def generate_embedding(self, text: str) -> List[float]:
         """Generate embeddings for a given text using Ollama"""
         try:
-            response = ollama.embeddings(model=EMBEDDING_MODEL, prompt=text)
+            return (await self.generate_embeddings([text]))[0]
+        except Exception as e:
+            print(f"Error generating embedding: {e}")
+            raise
+
+    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for a batch of texts in a single Ollama request"""
+        try:
+            response = await self.ollama.embed(model=EMBEDDING_MODEL, input=texts)
 
-            # Handle the new EmbeddingsResponse type
-            if hasattr(response, "embedding"):
-                return response.embedding
+            if hasattr(response, "embeddings"):
+                embeddings = response.embeddings
+            elif isinstance(response, dict) and "embeddings" in response:
+                embeddings = response["embeddings"]
+            else:
+                raise ValueError(f"Could not extract embeddings from response: {response}")
 
-            # Fallback for dict response
-            if isinstance(response, dict):
-                if "embedding" in response:
-                    return response["embedding"]
-                elif "embeddings" in response:
-                    return response["embeddings"][0]
+            if len(embeddings) != len(texts):
+                raise ValueError(
+                    f"Expected {len(texts)} embeddings, got {len(embeddings)}"
+                )
+            return [list(embedding) for embedding in embeddings]
 
-            raise ValueError(f"Could not extract embedding from response: {response}")
+        except Exception as e:
+            print(f"Error generating batch embeddings: {e}")
+            raise
 
+    def _write_batch(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: List[List[float]],
+    ):
+        """Write one embedded batch to ChromaDB (runs in a worker thread)"""
+        try:
+            self.collection.upsert(
+                ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas
+            )
+            if self.keyword_index is not None:
+                self.keyword_index.upsert(ids, texts, metadatas)
+            self.record_changes(ids)
         except Exception as e:
-            print(f"Error generating embedding: {e}")
+            print(f"Error adding to ChromaDB: {e}")
+            print(f"Sample embedding length: {len(embeddings[0]) if embeddings else 'no embeddings'}")
             raise
 
-    async def add_documents(self, documents: List[Dict[str, Any]]):
-        """Add documents to the vector store"""
+    async def add_documents(
+        self,
+        documents: List[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Add or replace documents in the vector store through an
+        EmbeddingPipeline. Returns throughput statistics for the run.
+        """
+        pipeline = EmbeddingPipeline(self, batch_size, concurrency)
+        try:
+            for doc in documents:
+                await pipeline.submit(doc)
+            return await pipeline.close()
+        except BaseException as e:
+            pipeline.abort()
+            print(f"Error adding documents to vector store: {e}")
+            raise
+
+    def _stored_metadatas(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Stored metadata of the given document ids that exist"""
+        result = self.collection.get(ids=ids, include=["metadatas"])
+        return {
+            doc_id: metadata or {}
+            for doc_id, metadata in zip(result["ids"], result["metadatas"])
+        }
+
+    def _stored_ids_in_range(
+        self, doc_type: str, after_seq: int, up_to_seq: Optional[int] = None
+    ) -> List[str]:
+        """Ids of stored documents of one type whose seq is in (after_seq, up_to_seq]"""
+        conditions = [{"type": {"$eq": doc_type}}, {"seq": {"$gt": after_seq}}]
+        if up_to_seq is not None:
+            conditions.append({"seq": {"$lte": up_to_seq}})
+
+        ids = []
+        while True:
+            page = self.collection.get(
+                where={"$and": conditions},
+                include=[],
+                limit=VECTOR_STORE_PAGE_SIZE,
+                offset=len(ids),
+            )
+            ids.extend(page["ids"])
+            if len(page["ids"]) < VECTOR_STORE_PAGE_SIZE:
+                return ids
+
+    def _unkeyed_ids(self) -> List[str]:
+        """Ids of stored documents without a seq (written by older id schemes)"""
+        ids = []
+        offset = 0
+        while True:
+            page = self.collection.get(
+                include=["metadatas"], limit=VECTOR_STORE_PAGE_SIZE, offset=offset
+            )
+            if not page["ids"]:
+                return ids
+            for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+                if "seq" not in (metadata or {}):
+                    ids.append(doc_id)
+            offset += len(page["ids"])
+
+    def _delete_ids(self, ids: List[str]):
+        """Delete documents from ChromaDB in pages (runs in a worker thread)"""
+        for i in range(0, len(ids), VECTOR_STORE_PAGE_SIZE):
+            self.collection.delete(ids=ids[i : i + VECTOR_STORE_PAGE_SIZE])
+        if self.keyword_index is not None:
+            self.keyword_index.delete(ids)
+        self.record_changes(ids)
+
+    async def sync_documents(
+        self,
+        pages: Union[AsyncIterable[List[Dict[str, Any]]], Iterable[List[Dict[str, Any]]]],
+        types: Iterable[str] = (),
+        full: bool = False,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Bring the vector store in line with the documents in `pages`.
+
+        Pages must come one entity type at a time in ascending `seq` order, as
+        DatabaseManager.aiter_document_pages yields them. Only rows that are
+        new or whose content hash changed are embedded (every row when `full`
+        is set). Stored rows of the same type whose seq falls inside a page's
+        key range but are missing from it were deleted in the database and
+        are removed, as is anything past the last key of each type in `types`.
+        Memory use is bounded by the page size rather than the table sizes.
+        `progress` is called with the number of rows processed after each page.
+        """
+        start = time.perf_counter()
+        counts = {"documents": 0, "added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        changed_types = set()
+        last_seq: Dict[str, int] = {}
+
+        async def delete_stale(doc_type: str, stale: List[str]):
+            if stale:
+                await asyncio.to_thread(self._delete_ids, stale)
+                counts["deleted"] += len(stale)
+                changed_types.add(doc_type)
+
+        if not hasattr(pages, "__aiter__"):
+            pages = _aiter(pages)
+
+        pipeline = EmbeddingPipeline(self)
         try:
-            # Process documents in batches
-            batch_size = 100
-            counter = 0  # Global counter for unique IDs
-            for i in range(0, len(documents), batch_size):
-                batch = documents[i : i + batch_size]
-
-                # Prepare data for ChromaDB
-                ids = [f"{doc['type']}_{doc['id']}_{hash(doc['content'])}_{counter + j}" for j, doc in enumerate(batch)]
-                texts = [doc["content"] for doc in batch]
-                metadatas = [{"type": doc["type"], "id": doc["id"]} for doc in batch]
-
-                # Generate embeddings for the batch
-                embeddings = []
-                for text in texts:
-                    try:
-                        embedding = await self.generate_embedding(text)
-                        embeddings.append(embedding)
-                    except Exception as e:
-                        print(f"Error generating embedding for text: {text[:100]}...")
-                        print(f"Error: {e}")
-                        raise
-
-                if not embeddings:
-                    raise ValueError("No embeddings were generated")
-
-                # Add to ChromaDB
-                try:
-                    self.collection.add(
-                        ids=ids,
-                        embeddings=embeddings,
-                        documents=texts,
-                        metadatas=metadatas
+            if full:
+                # Full syncs also sweep out documents from older id schemes
+                await delete_stale("legacy", await asyncio.to_thread(self._unkeyed_ids))
+
+            async for page in pages:
+                if not page:
+                    continue
+                doc_type = page[0]["type"]
+                after_seq = last_seq.get(doc_type, -1)
+                up_to_seq = page[-1]["seq"]
+                page_ids = [document_id(doc) for doc in page]
+
+                stored = await asyncio.to_thread(self._stored_metadatas, page_ids)
+                missing_seq = []
+                shrunk_chunks = []
+                for doc_id, doc in zip(page_ids, page):
+                    counts["documents"] += 1
+                    metadata = stored.get(doc_id)
+                    if metadata is None:
+                        counts["added"] += 1
+                    elif metadata.get("content_hash") != content_hash(doc["content"]):
+                        counts["updated"] += 1
+                        shrunk_chunks.extend(stale_chunk_ids(doc_id, metadata, doc))
+                    else:
+                        counts["unchanged"] += 1
+                        if full:
+                            await pipeline.submit(doc)
+                        elif "seq" not in metadata:
+                            missing_seq.append((doc_id, doc))
+                        continue
+                    await pipeline.submit(doc)
+                    changed_types.add(doc_type)
+
+                if missing_seq:
+                    # Documents written before seq was stored; tag them without re-embedding
+                    await asyncio.to_thread(
+                        self.collection.update,
+                        ids=[doc_id for doc_id, _ in missing_seq],
+                        metadatas=[document_metadata(doc) for _, doc in missing_seq],
                     )
-                except Exception as e:
-                    print(f"Error adding to ChromaDB: {e}")
-                    print(f"Sample embedding length: {len(embeddings[0]) if embeddings else 'no embeddings'}")
-                    raise
 
-                counter += len(batch)  # Increment counter by batch size
+                in_range = await asyncio.to_thread(
+                    self._stored_ids_in_range, doc_type, after_seq, up_to_seq
+                )
+                page_id_set = set(page_ids)
+                await delete_stale(
+                    doc_type,
+                    shrunk_chunks
+                    + [doc_id for doc_id in in_range if chunk_parent(doc_id) not in page_id_set],
+                )
+                last_seq[doc_type] = up_to_seq
+                if progress:
+                    progress(counts["documents"])
 
-        except Exception as e:
-            print(f"Error adding documents to vector store: {e}")
+            # Rows past the last extracted key of each type were deleted
+            for doc_type in types:
+                await delete_stale(
+                    doc_type,
+                    await asyncio.to_thread(
+                        self._stored_ids_in_range, doc_type, last_seq.get(doc_type, -1)
+                    ),
+                )
+
+            embed_stats = await pipeline.close()
+        except asyncio.CancelledError:
+            pipeline.abort()
+            print("Sync of documents to vector store cancelled")
             raise
+        except BaseException as e:
+            pipeline.abort()
+            print(f"Error syncing documents to vector store: {e}")
+            raise
+
+        changed_types.discard("legacy")
+        stats = {
+            "mode": "full" if full else "incremental",
+            **counts,
+            "embedded": embed_stats["documents"],
+            "changed_types": sorted(changed_types),
+            "seconds": round(time.perf_counter() - start, 3),
+            "embedding": embed_stats,
+        }
+        print(
+            f"Synced {stats['documents']} documents ({stats['mode']}): "
+            f"{stats['added']} added, {stats['updated']} updated, "
+            f"{stats['deleted']} deleted, {stats['unchanged']} unchanged"
+        )
+        return stats
+
+    async def apply_entity_changes(
+        self, doc_type: str, seqs: List[int], docs: List[Dict[str, Any]]
+    ) -> Dict[str, List[str]]:
+        """
+        Apply the current state of the rows `seqs` of one entity or rollup
+        type: embed `docs` that are new or changed and delete stored documents
+        of those keys that are not among `docs`. Returns the affected
+        document ids by kind of change.
+        """
+        doc_ids = [document_id(doc) for doc in docs]
+        stored = await asyncio.to_thread(self._stored_metadatas, doc_ids) if docs else {}
+
+        added, updated, to_embed, shrunk_chunks = [], [], [], []
+        for doc_id, doc in zip(doc_ids, docs):
+            metadata = stored.get(doc_id)
+            if metadata is None:
+                added.append(doc_id)
+            elif metadata.get("content_hash") != content_hash(doc["content"]):
+                updated.append(doc_id)
+                shrunk_chunks.extend(stale_chunk_ids(doc_id, metadata, doc))
+            else:
+                continue
+            to_embed.append(doc)
+        if to_embed:
+            await self.add_documents(to_embed)
+        if shrunk_chunks:
+            await asyncio.to_thread(self._delete_ids, shrunk_chunks)
+
+        # Stored documents of these keys that were not extracted again were
+        # deleted, or replaced under another id (see database.format_documents)
+        deleted = []
+        if seqs:
+            result = await asyncio.to_thread(
+                self.collection.get,
+                where={"$and": [{"type": {"$eq": doc_type}}, {"seq": {"$in": list(seqs)}}]},
+                include=[],
+            )
+            doc_id_set = set(doc_ids)
+            gone = [doc_id for doc_id in result["ids"] if chunk_parent(doc_id) not in doc_id_set]
+            if gone:
+                await asyncio.to_thread(self._delete_ids, gone)
+            # Report documents, not their chunks
+            deleted = sorted({chunk_parent(doc_id) for doc_id in gone})
+
+        return {"added": added, "updated": updated, "deleted": deleted}
 
     async def query_similar(
-        self, query: str, n_results: int = 5
+        self,
+        query: str,
+        n_results: int = 5,
+        query_embedding: Optional[List[float]] = None,
+        types: Optional[List[str]] = None,
     ) -> List[Dict[str, Any]]:
-        """Query the vector store for similar documents"""
-        try:
-            # Generate embedding for the query
+        """Query the vector store for similar documents, optionally of the given types"""
+        # Generate embedding for the query unless the caller already has it
+        if query_embedding is None:
             query_embedding = await self.generate_embedding(query)
+        return (await self.query_similar_many([query_embedding], n_results, types))[0]
 
-            # Query ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
+    async def query_similar_many(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 5,
+        types: Optional[List[str]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """Similar documents of several query embeddings in one ChromaDB query"""
+        try:
+            # Query ChromaDB off the event loop
+            results = await asyncio.to_thread(
+                self.collection.query,
+                query_embeddings=query_embeddings,
                 n_results=n_results,
+                where={"type": {"$in": list(types)}} if types else None,
                 include=["documents", "metadatas", "distances"],
             )
 
             # Format results
             formatted_results = []
-            for i in range(len(results["documents"][0])):
+            for row in range(len(query_embeddings)):
                 formatted_results.append(
-                    {
-                        "content": results["documents"][0][i],
-                        "metadata": results["metadatas"][0][i],
-                        "distance": results["distances"][0][i],
-                    }
+                    [
+                        {
+                            "id": results["ids"][row][i],
+                            "content": results["documents"][row][i],
+                            "metadata": results["metadatas"][row][i],
+                            "distance": results["distances"][row][i],
+                        }
+                        for i in range(len(results["documents"][row]))
+                    ]
                 )
 
             return formatted_results
@@ -116,4 +653,63 @@ class EmbeddingManager:
         except Exception as e:
             print(f"Error querying vector store: {e}")
             raise
- 
\ No newline at end of file
+
+    def lookup_exact(
+        self, query: str, n_results: int = 5, types: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Documents named outright in the query by a product code, phone number
+        or entity reference such as "transaction 5". Needs no embedding.
+        """
+        if self.keyword_index is None or not self.keyword_index.ready:
+            return []
+        return self.keyword_index.lookup(query, n_results, types)
+
+    async def query_hybrid(
+        self,
+        query: str,
+        n_results: int = 5,
+        query_embedding: Optional[List[float]] = None,
+        types: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Fuse vector and BM25 keyword results with reciprocal rank fusion.
+        Without a query embedding only the keyword side is used; without a
+        ready keyword index only the vector side.
+        """
+        return (await self.query_hybrid_many([query], n_results, [query_embedding], types))[0]
+
+    async def query_hybrid_many(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        query_embeddings: Optional[List[Optional[List[float]]]] = None,
+        types: Optional[List[str]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        query_hybrid for several queries, with the vector side of all of
+        them sent to ChromaDB as one multi-embedding query
+        """
+        query_embeddings = query_embeddings or [None] * len(queries)
+        keyword_ready = self.keyword_index is not None and self.keyword_index.ready
+        candidates = max(n_results, HYBRID_CANDIDATES) if keyword_ready else n_results
+
+        embedded = [i for i, embedding in enumerate(query_embeddings) if embedding is not None]
+        vector_results: Dict[int, List[Dict[str, Any]]] = {}
+        if embedded:
+            rows = await self.query_similar_many(
+                [query_embeddings[i] for i in embedded], candidates, types
+            )
+            vector_results = dict(zip(embedded, rows))
+
+        results = []
+        for i, query in enumerate(queries):
+            if not keyword_ready:
+                results.append(vector_results.get(i, []))
+                continue
+            # Off the event loop: with only common terms BM25 scores most of the corpus
+            rankings = [await asyncio.to_thread(self.keyword_index.search, query, candidates, types)]
+            if i in vector_results:
+                rankings.append(vector_results[i])
+            results.append(fuse_rankings(rankings, n_results))
+        return results
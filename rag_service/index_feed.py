@@ -0,0 +1,172 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+from config import CACHE_NAMESPACE, INDEX_SYNC_INTERVAL, INDEX_SYNC_RETAIN
+
+# Records changed ids (ARGV[2:]) under a new generation and trims
+# generations older than ARGV[1] from the changes set. One script, so a
+# follower never reads a generation whose ids are not in the set yet.
+# KEYS: generation, changes, floor. Returns the new generation.
+PUBLISH_SCRIPT = """
+local generation = redis.call('INCR', KEYS[1])
+for i = 2, #ARGV do
+    redis.call('ZADD', KEYS[2], generation, ARGV[i])
+end
+local floor = generation - tonumber(ARGV[1])
+if floor > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', floor)
+    redis.call('SET', KEYS[3], floor)
+end
+return generation
+"""
+
+
+class IndexChangeFeed:
+    """
+    Keeps the in-process keyword indexes of instances sharing one Chroma
+    server in step with the writer.
+
+    The writer publishes the ids of the documents it wrote or deleted in
+    Redis under an increasing index generation: a sorted set maps each id to
+    the generation that last changed it. Query instances poll the generation
+    and re-read only the ids changed since the generation they have seen.
+    An instance that fell further behind than the retained generations
+    rebuilds its keyword index from the vector store.
+    """
+
+    def __init__(
+        self,
+        embedding_manager,
+        cache_manager,
+        publish: bool,
+        interval: float = INDEX_SYNC_INTERVAL,
+        retain: int = INDEX_SYNC_RETAIN,
+    ):
+        self.embedding_manager = embedding_manager
+        self.cache_manager = cache_manager
+        # Writer publishes its changes; query instances follow them
+        self.publishing = publish
+        self.interval = interval
+        self.retain = retain
+        self.generation: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.generation_key = f"{CACHE_NAMESPACE}:index:generation"
+        self.changes_key = f"{CACHE_NAMESPACE}:index:changes"
+        # Generations at or below this have been trimmed from the changes set
+        self.floor_key = f"{CACHE_NAMESPACE}:index:floor"
+        self.stats: Dict[str, Any] = {
+            "running": False,
+            "documents_published": 0,
+            "documents_reloaded": 0,
+            "rebuilds": 0,
+            "errors": 0,
+            "last_sync_seconds": None,
+        }
+        if publish:
+            embedding_manager.track_changes()
+
+    @property
+    def redis(self):
+        return self.cache_manager.redis
+
+    async def current_generation(self) -> int:
+        await self.cache_manager.connect()
+        return int(await self.redis.get(self.generation_key) or 0)
+
+    async def mark(self):
+        """Remember the generation the local keyword index is about to be built from"""
+        self.generation = await self.current_generation()
+
+    def start(self):
+        if self.task is None:
+            role = "Publishing" if self.publishing else "Following"
+            print(f"{role} index changes every {self.interval}s")
+            self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.publishing:
+            # Changes written since the last tick
+            try:
+                await self.publish_once()
+            except Exception as e:
+                print(f"Error publishing index changes: {e}")
+
+    async def _loop(self):
+        self.stats["running"] = True
+        try:
+            while True:
+                try:
+                    if self.publishing:
+                        await self.publish_once()
+                    else:
+                        await self.follow_once()
+                except Exception as e:
+                    print(f"Error syncing index changes: {e}")
+                    self.stats["errors"] += 1
+                await asyncio.sleep(self.interval)
+        finally:
+            self.stats["running"] = False
+
+    async def publish_once(self) -> int:
+        """Publish the ids changed since the last call under a new generation"""
+        ids = self.embedding_manager.drain_changes()
+        if not ids:
+            return 0
+        await self.cache_manager.connect()
+        try:
+            generation = int(
+                await self.redis.eval(
+                    PUBLISH_SCRIPT,
+                    3,
+                    self.generation_key,
+                    self.changes_key,
+                    self.floor_key,
+                    self.retain,
+                    *ids,
+                )
+            )
+        except BaseException:
+            # Keep the ids for the next attempt
+            self.embedding_manager.record_changes(ids)
+            raise
+        self.generation = generation
+        self.stats["documents_published"] += len(ids)
+        return len(ids)
+
+    async def follow_once(self) -> int:
+        """Apply changes published since the last seen generation; returns the ids reloaded"""
+        generation = await self.current_generation()
+        if self.generation is None:
+            self.generation = generation
+            return 0
+        if generation <= self.generation:
+            return 0
+
+        start = time.perf_counter()
+        floor = int(await self.redis.get(self.floor_key) or 0)
+        if self.generation < floor:
+            print(f"Index generation {self.generation} is older than the retained changes; rebuilding keyword index")
+            await asyncio.to_thread(self.embedding_manager.rebuild_keyword_index)
+            self.stats["rebuilds"] += 1
+            reloaded = 0
+        else:
+            ids = await self.redis.zrangebyscore(
+                self.changes_key, f"({self.generation}", generation
+            )
+            await asyncio.to_thread(self.embedding_manager.reload_keyword_documents, list(ids))
+            reloaded = len(ids)
+            self.stats["documents_reloaded"] += reloaded
+        self.generation = generation
+        self.stats["last_sync_seconds"] = round(time.perf_counter() - start, 3)
+        return reloaded
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "role": "writer" if self.publishing else "query",
+            "generation": self.generation,
+            **self.stats,
+        }
@@ -0,0 +1,157 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from metrics import REFRESH_JOBS, REFRESH_PHASE_SECONDS
+
+
+class RefreshJob:
+    """State and progress of one background refresh run"""
+
+    def __init__(self, mode: str, trigger: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.trigger = trigger
+        self.status = "running"
+        self.phase = "starting"
+        self.rows_total: Optional[int] = None
+        self.rows_processed = 0
+        self.created_at = time.time()
+        self.started_at = time.monotonic()
+        self.phase_started_at = self.started_at
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.stats: Optional[Dict[str, Any]] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def set_phase(self, phase: str):
+        now = time.monotonic()
+        REFRESH_PHASE_SECONDS.observe(now - self.phase_started_at, phase=self.phase)
+        self.phase = phase
+        self.phase_started_at = now
+        print(f"Refresh job {self.id}: {phase}")
+
+    def set_progress(self, rows_processed: int):
+        self.rows_processed = rows_processed
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    def eta_seconds(self) -> Optional[float]:
+        """Remaining time extrapolated from the rows processed so far"""
+        if self.done or not self.rows_total or not self.rows_processed:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        remaining = max(self.rows_total - self.rows_processed, 0)
+        return round(elapsed / self.rows_processed * remaining, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.monotonic()
+        return {
+            "job_id": self.id,
+            "mode": self.mode,
+            "trigger": self.trigger,
+            "status": self.status,
+            "phase": self.phase,
+            "rows_processed": self.rows_processed,
+            "rows_total": self.rows_total,
+            "eta_seconds": self.eta_seconds(),
+            "elapsed_seconds": round(end - self.started_at, 1),
+            "created_at": self.created_at,
+            "error": self.error,
+            "stats": self.stats,
+        }
+
+
+class RefreshJobManager:
+    """
+    Runs refreshes as background tasks, one at a time, keeps the most recent
+    jobs for status queries and optionally starts a refresh on a schedule.
+    """
+
+    def __init__(
+        self,
+        run_refresh: Callable[[RefreshJob], Awaitable[Dict[str, Any]]],
+        history: int = 20,
+    ):
+        self.run_refresh = run_refresh
+        self.history = history
+        self.jobs: "OrderedDict[str, RefreshJob]" = OrderedDict()
+        self.current: Optional[RefreshJob] = None
+        self.schedule_task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self.current and not self.current.done)
+
+    def start(self, mode: str, trigger: str = "api") -> Optional[RefreshJob]:
+        """Start a refresh job, or return None if one is already running"""
+        if self.running:
+            return None
+
+        job = RefreshJob(mode, trigger)
+        self.current = job
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.history:
+            self.jobs.popitem(last=False)
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    async def _run(self, job: RefreshJob):
+        try:
+            job.stats = await self.run_refresh(job)
+            job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            print(f"Refresh job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.monotonic()
+            REFRESH_PHASE_SECONDS.observe(job.finished_at - job.phase_started_at, phase=job.phase)
+            REFRESH_JOBS.inc(mode=job.mode, status=job.status)
+            job.phase = "done"
+            print(f"Refresh job {job.id} {job.status}")
+
+    def get(self, job_id: str) -> Optional[RefreshJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in reversed(self.jobs.values())]
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation of a running job"""
+        job = self.jobs.get(job_id)
+        if not job or job.done or not job.task:
+            return False
+        job.set_phase("cancelling")
+        job.task.cancel()
+        return True
+
+    def start_schedule(self, interval_minutes: float, mode: str):
+        """Start a refresh every `interval_minutes`, skipping runs while one is active"""
+        if interval_minutes <= 0 or self.schedule_task:
+            return
+
+        async def schedule():
+            while True:
+                await asyncio.sleep(interval_minutes * 60)
+                if self.start(mode, trigger="schedule") is None:
+                    print("Scheduled refresh skipped: a refresh is already running")
+
+        print(f"Scheduling {mode} refresh every {interval_minutes} minutes")
+        self.schedule_task = asyncio.create_task(schedule())
+
+    async def shutdown(self):
+        """Stop the schedule and cancel a running job"""
+        tasks = []
+        if self.schedule_task:
+            self.schedule_task.cancel()
+            tasks.append(self.schedule_task)
+        if self.running and self.current.task:
+            self.current.task.cancel()
+            tasks.append(self.current.task)
+        await asyncio.gather(*tasks, return_exceptions=True)
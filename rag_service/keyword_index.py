@@ -0,0 +1,176 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from config import KEYWORD_MAX_DF_RATIO
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Digit runs this long are identifiers (product codes, phone numbers)
+IDENTIFIER_PATTERN = re.compile(r"\b\d{6,}\b")
+
+# "transaction 5", "customer id 9", "product #12"
+ENTITY_REFERENCE_PATTERN = re.compile(
+    r"\b(product|customer|supplier|transaction)s?\s*(?:id|no\.?|number)?\s*[:#]?\s*(\d+)\b",
+    re.I,
+)
+
+STOPWORDS = {
+    "a", "about", "all", "an", "and", "any", "are", "by", "do", "does", "for",
+    "from", "give", "has", "have", "how", "i", "in", "is", "it", "list", "me",
+    "of", "on", "or", "show", "tell", "that", "the", "there", "to", "was",
+    "we", "what", "when", "where", "which", "who", "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class KeywordIndex:
+    """
+    In-memory BM25 inverted index over the documents of the vector store,
+    with exact lookup by entity reference and identifier token. Writes come
+    from the vector store writer thread and searches from the event loop,
+    so both take a lock.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.ready = False
+        self.documents: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.entities: Dict[Tuple[str, str], Set[str]] = {}
+        self.stats = {"exact_lookups": 0, "exact_hits": 0, "searches": 0}
+
+    def _remove(self, doc_id: str):
+        entry = self.documents.pop(doc_id, None)
+        if entry is None:
+            return
+        content, metadata = entry
+        for term in set(tokenize(content)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id, 0)
+        entity = (metadata.get("type"), str(metadata.get("id")))
+        members = self.entities.get(entity)
+        if members is not None:
+            members.discard(doc_id)
+            if not members:
+                del self.entities[entity]
+
+    def upsert(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        with self.lock:
+            for doc_id, content, metadata in zip(ids, texts, metadatas):
+                self._remove(doc_id)
+                terms = Counter(tokenize(content))
+                for term, tf in terms.items():
+                    self.postings.setdefault(term, {})[doc_id] = tf
+                length = sum(terms.values())
+                self.documents[doc_id] = (content, metadata)
+                self.lengths[doc_id] = length
+                self.total_length += length
+                entity = (metadata.get("type"), str(metadata.get("id")))
+                self.entities.setdefault(entity, set()).add(doc_id)
+
+    def delete(self, ids: Iterable[str]):
+        with self.lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def clear(self):
+        with self.lock:
+            self.documents.clear()
+            self.lengths.clear()
+            self.postings.clear()
+            self.entities.clear()
+            self.total_length = 0
+
+    def _result(self, doc_id: str, score: float, match: str) -> Dict[str, Any]:
+        content, metadata = self.documents[doc_id]
+        return {
+            "id": doc_id,
+            "content": content,
+            "metadata": metadata,
+            "score": score,
+            "match": match,
+        }
+
+    def lookup(
+        self, query: str, n_results: int = 5, types: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Documents named by an entity reference or identifier in the query"""
+        self.stats["exact_lookups"] += 1
+        with self.lock:
+            doc_ids: List[str] = []
+            for doc_type, entity_id in ENTITY_REFERENCE_PATTERN.findall(query):
+                doc_ids.extend(sorted(self.entities.get((doc_type.lower(), entity_id), ())))
+            for identifier in IDENTIFIER_PATTERN.findall(query):
+                doc_ids.extend(sorted(self.postings.get(identifier, ())))
+
+            results = []
+            seen = set()
+            for doc_id in doc_ids:
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                if types and self.documents[doc_id][1].get("type") not in types:
+                    continue
+                results.append(self._result(doc_id, 1.0, "exact"))
+                if len(results) == n_results:
+                    break
+        if results:
+            self.stats["exact_hits"] += 1
+        return results
+
+    def search(
+        self, query: str, n_results: int = 5, types: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Top documents by BM25 score"""
+        self.stats["searches"] += 1
+        terms = set(tokenize(query))
+        with self.lock:
+            total = len(self.documents)
+            if not total or not terms:
+                return []
+            average_length = self.total_length / total
+            postings = [(term, self.postings[term]) for term in terms if term in self.postings]
+            # Terms in most documents add little but cost a pass over their postings
+            selective = [
+                (term, posting) for term, posting in postings
+                if len(posting) <= total * KEYWORD_MAX_DF_RATIO
+            ]
+            postings = selective or postings
+
+            scores: Dict[str, float] = {}
+            for term, posting in postings:
+                df = len(posting)
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            if types:
+                scores = {
+                    doc_id: score for doc_id, score in scores.items()
+                    if self.documents[doc_id][1].get("type") in types
+                }
+            best = heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+            return [self._result(doc_id, round(score, 4), "keyword") for doc_id, score in best]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "documents": len(self.documents),
+            "terms": len(self.postings),
+            **self.stats,
+        }
@@ -1,36 +1,118 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from datetime import date
 import asyncio
+import json
+import os
+import time
 import ollama
 from contextlib import asynccontextmanager
-from database import DatabaseManager
+from database import DatabaseManager, DOCUMENT_TYPES, INDEXED_TYPES
 from embeddings import EmbeddingManager
-from cache_manager import CacheManager
-from config import LLM_MODEL, EMBEDDING_MODEL, API_HOST, API_PORT
+from cache_manager import CacheManager, normalize_question
+from request_coalescer import RequestCoalescer
+from jobs import RefreshJob, RefreshJobManager
+from changelog import ChangeLogTailer
+from query_router import QueryRouter
+from startup import StartupManager
+from index_feed import IndexChangeFeed
+from chunking import chunk_parent
+from context_assembler import assemble_context
+from analytics import SORT_KEYS, SalesAnalytics
+from admission import PRIORITIES, AdmissionController, Overloaded
+from snapshot import QUANTIZATIONS, export_snapshot, import_snapshot
+from cache_warmer import CacheWarmer
+from metrics import (
+    CHAT_REQUEST_SECONDS,
+    CHAT_RESPONSES,
+    CONTEXT_ENTRIES_REMOVED,
+    CONTEXT_TOKENS,
+    LLM_INFLIGHT,
+    registry,
+    request_timings,
+    server_timing,
+    stage,
+)
+from config import (
+    LLM_MODEL,
+    EMBEDDING_MODEL,
+    API_HOST,
+    API_PORT,
+    API_WORKERS,
+    CHAT_BATCH_MAX_QUESTIONS,
+    CHAT_BATCH_LLM_CONCURRENCY,
+    OLLAMA_HOST,
+    REFRESH_INTERVAL_MINUTES,
+    REFRESH_SCHEDULE_MODE,
+    CHANGELOG_ENABLED,
+    SQL_ROUTER_ENABLED,
+    TIMING_HEADER_ENABLED,
+    MODEL_WARMUP_ENABLED,
+    KEYWORD_INDEX_ENABLED,
+    ANALYTICS_ENABLED,
+    SNAPSHOT_PATH,
+    SNAPSHOT_QUANTIZATION,
+    SNAPSHOT_IMPORT_ON_START,
+    CACHE_WARM_ENABLED,
+    CACHE_WARM_INTERVAL_MINUTES,
+    CHROMA_HOST,
+    SERVICE_ROLE,
+)
+
+if SERVICE_ROLE not in ("writer", "query"):
+    raise ValueError(f"SERVICE_ROLE must be 'writer' or 'query', not {SERVICE_ROLE!r}")
+# Only the writer refreshes the index and tails the change log
+IS_WRITER = SERVICE_ROLE == "writer"
+
+# Async Ollama client so generations never block the event loop
+llm_client = ollama.AsyncClient(host=OLLAMA_HOST)
 
-# Global flag to track initialization
-is_initialized = False
+# Identical questions in flight share one retrieval + generation
+chat_coalescer = RequestCoalescer()
+
+# Bounds concurrent generations; queued ones run interactive first
+admission = AdmissionController()
+
+
+# Dependencies are brought up in the background so the server binds at once
+startup = StartupManager()
+startup.register("mysql")
+startup.register("vector_store")
+startup.register("redis")
+if MODEL_WARMUP_ENABLED:
+    startup.register("embedding_model")
+    startup.register("llm_model")
+if KEYWORD_INDEX_ENABLED:
+    # Searches fall back to the vector side alone until this is built
+    startup.register("keyword_index", required=False)
+if ANALYTICS_ENABLED:
+    # Chat answers go without analytics context until this is loaded
+    startup.register("analytics", required=False)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
-    global is_initialized
     # Startup
-    try:
-        print("Starting RAG service...")
-        print(f"Will attempt to load models: {EMBEDDING_MODEL} and {LLM_MODEL}")
-        # Don't block startup on model pulling - do it in background
-        is_initialized = True
-        print("Service initialized! Models will be pulled on first use.")
-    except Exception as e:
-        print(f"Startup warning: {e}")
-        is_initialized = True
+    print("Starting RAG service...")
+    startup.run(start_services())
     yield
     # Shutdown
     print("Shutting down RAG service...")
+    await startup.stop()
+    if changelog_tailer:
+        await changelog_tailer.stop()
+    if sales_analytics:
+        await sales_analytics.stop()
+    if cache_warmer:
+        await cache_warmer.stop()
+    await refresh_jobs.shutdown()
+    if index_feed:
+        await index_feed.stop()
+    await cache_manager.disconnect()
 
 
 app = FastAPI(title="SCMS RAG Service", lifespan=lifespan)
@@ -42,9 +124,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
 
+@app.middleware("http")
+async def timing_header(request: Request, call_next):
+    """
+    Add a Server-Timing header with the per-stage breakdown of the request
+    when TIMING_HEADER_ENABLED is set or the client sends X-Debug-Timing.
+    Streaming responses only include the stages before the first byte.
+    """
+    if not (TIMING_HEADER_ENABLED or request.headers.get("x-debug-timing")):
+        return await call_next(request)
+    timings = []
+    token = request_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    response.headers["Server-Timing"] = server_timing(timings, time.perf_counter() - start)
+    return response
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -54,14 +157,29 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "initialized": is_initialized}
+    return {
+        "status": "healthy",
+        "initialized": startup.ready,
+        "chat_inflight": chat_coalescer.inflight,
+        "chat_coalesced": chat_coalescer.coalesced,
+    }
+
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: 200 once MySQL, the vector store and Redis respond and the
+    models are loaded, 503 until then. Reports each dependency's state.
+    """
+    status = startup.get_status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 
 @app.get("/models/status")
 async def check_models():
     """Check if required models are available"""
     try:
-        models_response = ollama.list()
+        models_response = await llm_client.list()
         # Handle different possible response formats
         if isinstance(models_response, dict) and 'models' in models_response:
             models_list = models_response['models']
@@ -101,7 +219,7 @@ async def pull_models():
         for model in [EMBEDDING_MODEL, LLM_MODEL]:
             try:
                 print(f"Pulling model: {model}")
-                ollama.pull(model)
+                await llm_client.pull(model)
                 results.append({"model": model, "status": "success"})
             except Exception as e:
                 results.append({"model": model, "status": "error", "error": str(e)})
@@ -111,134 +229,1205 @@ async def pull_models():
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# Initialize managers - make this more tolerant
-try:
-    db_manager = DatabaseManager()
-    embedding_manager = EmbeddingManager()
-    cache_manager = CacheManager()
-    print("Managers initialized successfully")
-except Exception as e:
-    print(f"Warning: Some managers failed to initialize: {e}")
-    db_manager = None
-    embedding_manager = None
-    cache_manager = None
+# Constructing these does no I/O: MySQL and Redis connections open on first
+# use and are checked by the startup tasks
+db_manager = DatabaseManager()
+cache_manager = CacheManager()
+# Set by open_vector_store, since loading a large persistent store takes a while
+embedding_manager: Optional[EmbeddingManager] = None
+
+
+async def analytics_changed(products: Optional[List[str]]):
+    """
+    Invalidate the cached answers whose prompt included figures that changed:
+    those of the changed products and the reorder summary, or every
+    analytics-augmented answer when all figures moved.
+    """
+    if products is None:
+        await cache_manager.bump_generations(["analytics"])
+    else:
+        await cache_manager.invalidate_entities(SalesAnalytics.document_ids(products))
+
+
+# Loaded by load_analytics once MySQL is up. Answers whose prompt included
+# its figures are invalidated whenever they change.
+sales_analytics = (
+    SalesAnalytics(db_manager, on_update=analytics_changed) if ANALYTICS_ENABLED else None
+)
+# Last snapshot export and startup import
+snapshot_stats: Dict[str, Any] = {}
+snapshot_lock = asyncio.Lock()
+
+
+async def check_database():
+    await db_manager.run(db_manager.ping)
+
+
+async def check_redis():
+    await cache_manager.connect()
+    await cache_manager.redis.ping()
+
+
+async def open_vector_store():
+    global embedding_manager
+    manager = await asyncio.to_thread(EmbeddingManager)
+    count = await asyncio.to_thread(manager.collection.count)
+    if count == 0 and SNAPSHOT_IMPORT_ON_START and (IS_WRITER or not CHROMA_HOST):
+        await import_startup_snapshot(manager)
+    cache_manager.set_semantic_store(manager.cache_collection)
+    embedding_manager = manager
+
+
+async def import_startup_snapshot(manager: EmbeddingManager):
+    """
+    Fill an empty collection from the snapshot, so chats are answered before
+    the database is re-read; start_services then queues a catch-up refresh
+    """
+    if not os.path.exists(SNAPSHOT_PATH):
+        return
+    try:
+        snapshot_stats["import"] = await asyncio.to_thread(
+            import_snapshot, manager.collection, SNAPSHOT_PATH
+        )
+    except Exception as e:
+        # The catch-up refresh embeds whatever the import did not write
+        print(f"Snapshot import failed: {e}")
+        snapshot_stats["import"] = {"path": SNAPSHOT_PATH, "error": str(e)}
+
+
+async def warm_model(model: str, call: Callable[[], Awaitable[Any]]):
+    """Load a model into Ollama's memory with a dummy call, pulling it if missing"""
+    try:
+        await call()
+    except ollama.ResponseError as e:
+        if e.status_code != 404:
+            raise
+        print(f"Pulling missing model: {model}")
+        await llm_client.pull(model)
+        await call()
+
+
+async def warm_embedding_model():
+    await warm_model(
+        EMBEDDING_MODEL, lambda: llm_client.embed(model=EMBEDDING_MODEL, input=["warm-up"])
+    )
+
+
+async def warm_llm():
+    await warm_model(
+        LLM_MODEL,
+        lambda: llm_client.chat(
+            model=LLM_MODEL,
+            messages=[{"role": "user", "content": "Hi"}],
+            options={"num_predict": 1},
+        ),
+    )
+
+
+async def build_keyword_index():
+    following = index_feed is not None and not index_feed.publishing
+    if following:
+        # Changes published while the index loads are replayed afterwards
+        await index_feed.mark()
+    await asyncio.to_thread(embedding_manager.load_keyword_index)
+    if following:
+        index_feed.start()
+
+
+async def load_analytics():
+    await sales_analytics.load()
+    sales_analytics.start()
+
+
+async def start_services():
+    """
+    Initialize every dependency concurrently, build the keyword index once
+    the vector store is open, and on the writer start the change log tailer
+    and refresh schedule once MySQL is reachable too.
+    """
+    global changelog_tailer, index_feed
+    startup.start("redis", check_redis)
+    if MODEL_WARMUP_ENABLED:
+        startup.start("embedding_model", warm_embedding_model)
+        startup.start("llm_model", warm_llm)
+    database_ready = startup.start("mysql", check_database)
+    await startup.initialize("vector_store", open_vector_store)
+    if CHROMA_HOST and embedding_manager.keyword_index:
+        # Other instances serve the same index; keep their keyword indexes in step
+        index_feed = IndexChangeFeed(embedding_manager, cache_manager, publish=IS_WRITER)
+        if IS_WRITER:
+            index_feed.start()
+    if embedding_manager.keyword_index:
+        startup.start("keyword_index", build_keyword_index)
+    await database_ready
+    if sales_analytics:
+        startup.start("analytics", load_analytics)
+    if not IS_WRITER:
+        return
+
+    # Applies trigger-captured row changes between refreshes; a running
+    # refresh already covers them, so the tailer waits for it to finish
+    changelog_tailer = ChangeLogTailer(
+        db_manager,
+        embedding_manager,
+        cache_manager,
+        is_paused=lambda: refresh_jobs.running,
+        on_changes=sales_analytics.apply_changes if sales_analytics else None,
+    )
+    if CHANGELOG_ENABLED:
+        changelog_tailer.start()
+    if "import" in snapshot_stats:
+        # Only rows changed since the snapshot was taken are embedded
+        job = refresh_jobs.start("incremental", trigger="snapshot")
+        snapshot_stats["import"]["catch_up_job"] = job.id if job else None
+    refresh_jobs.start_schedule(REFRESH_INTERVAL_MINUTES, REFRESH_SCHEDULE_MODE)
+    if cache_warmer:
+        cache_warmer.start_schedule(CACHE_WARM_INTERVAL_MINUTES)
+
+
+def require_writer():
+    """Refreshes only run on the writer instance"""
+    if not IS_WRITER:
+        raise HTTPException(
+            status_code=409,
+            detail="This instance only serves queries; run refreshes on the writer instance",
+        )
+
+
+def require(*names: str):
+    """Answer 503 until the named dependencies have been initialized"""
+    pending = startup.pending(names)
+    if pending:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service is starting; waiting for {', '.join(pending)}",
+            headers={"Retry-After": "5"},
+        )
 
 
 class Query(BaseModel):
     question: str
     n_results: Optional[int] = 5
+    # Restrict retrieval to these document types (product, customer, ...)
+    types: Optional[List[str]] = None
+
+    def type_scope(self) -> str:
+        return ",".join(sorted(set(self.types))) if self.types else "all"
+
+    def cache_key(self) -> str:
+        # Wordings differing only in case, spacing or trailing punctuation
+        # share an answer (and a question count, see record_questions)
+        question = normalize_question(self.question)
+        if self.types:
+            return cache_manager.generate_key(
+                "chat", question, self.n_results, self.type_scope()
+            )
+        return cache_manager.generate_key("chat", question, self.n_results)
 
 
 class ChatResponse(BaseModel):
     answer: str
     context: List[str]
+    # Path that produced the answer: sql, cache, semantic_cache, rag, fallback,
+    # or shed_cache / shed_context when admission control shed the generation
+    route: str = "rag"
+    intent: Optional[str] = None
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(query: Query):
+class BatchQuery(BaseModel):
+    queries: List[Query]
+
+
+class BatchChatResponse(BaseModel):
+    # One result per query, in request order
+    results: List[ChatResponse]
+
+
+# Structured inventory and sales questions are answered from SQL directly
+query_router = QueryRouter(db_manager) if SQL_ROUTER_ENABLED else None
+
+
+async def route_to_sql(query: Query) -> Optional[ChatResponse]:
+    """Answer from the SQL fast path, or None to use RAG"""
+    if not query_router or startup.pending(["mysql"]):
+        return None
+    with stage("sql_route"):
+        routed = await query_router.route(query.question)
+    if not routed:
+        return None
+    return ChatResponse(
+        answer=routed["answer"],
+        context=routed["context"],
+        route="sql",
+        intent=routed["intent"],
+    )
+
+
+def check_types(query: Query):
+    """Reject type filters that match no stored document type"""
+    unknown = sorted(set(query.types or ()) - set(DOCUMENT_TYPES))
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown types {unknown}; expected any of {DOCUMENT_TYPES}",
+        )
+
+
+async def read_generations() -> Optional[Dict[str, int]]:
+    """Snapshot cache generations before retrieval, to stamp the answer with"""
+    try:
+        return dict(await cache_manager.get_generations())
+    except Exception as cache_error:
+        print(f"Cache error (continuing without cache): {cache_error}")
+        return None
+
+
+async def embed_question(question: str) -> Optional[List[float]]:
+    """Embed the question once so cache lookup and retrieval can share it"""
+    with stage("embedding_cache"):
+        embedding = await cache_manager.get_embedding(question)
+    if embedding is not None:
+        return embedding
     try:
-        # Check if managers are initialized
-        if not all([db_manager, embedding_manager, cache_manager]):
-            raise HTTPException(
-                status_code=503, detail="Service managers not fully initialized"
+        with stage("embed"):
+            embedding = await embedding_manager.generate_embedding(question)
+    except Exception as embedding_error:
+        print(f"Embedding error: {embedding_error}")
+        return None
+    await cache_manager.set_embedding(question, embedding)
+    return embedding
+
+
+async def retrieve_context(
+    query: Query, query_embedding: Optional[List[float]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Get the documents most relevant to the question by hybrid vector and
+    keyword search. If embedding failed, the keyword side still answers.
+    """
+    try:
+        with stage("retrieve"):
+            return await embedding_manager.query_hybrid(
+                query.question,
+                query.n_results,
+                query_embedding=query_embedding,
+                types=query.types,
             )
+    except Exception as embedding_error:
+        print(f"Embedding error: {embedding_error}")
+        return []
 
-        # Try to get from cache first (with error handling)
-        try:
-            cache_key = cache_manager.generate_key(
-                "chat", query.question, query.n_results
+
+async def prepare_context(
+    query: Query,
+) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], Optional[List[float]]]:
+    """
+    Find what an answer needs: a semantically cached answer, or the context
+    documents and the question embedding. Questions naming a product code,
+    phone number or entity id get their documents from the keyword index
+    without embedding the question.
+    """
+    with stage("exact_lookup"):
+        docs = await asyncio.to_thread(
+            embedding_manager.lookup_exact, query.question, query.n_results, query.types
+        )
+    if docs:
+        return None, docs, None
+
+    query_embedding = await embed_question(query.question)
+    if query_embedding is not None:
+        with stage("semantic_cache"):
+            cached_response = await cache_manager.get_semantic(
+                query.question, query_embedding, query.n_results, query.type_scope()
             )
-            cached_response = await cache_manager.get(cache_key)
-            if cached_response:
-                return ChatResponse(**cached_response)
-        except Exception as cache_error:
-            print(f"Cache error (continuing without cache): {cache_error}")
+        if cached_response:
+            return cached_response, [], query_embedding
 
-        # Get similar documents
-        try:
-            similar_docs = await embedding_manager.query_similar(
-                query.question, query.n_results
+    return None, await retrieve_context(query, query_embedding), query_embedding
+
+
+# Question counting runs off the request path; the tasks are held until done
+question_recorders: Set[asyncio.Task] = set()
+
+
+def record_questions(queries: List[Query]):
+    """Count questions that reach the answer cache, for cache warming, in the background"""
+    if not cache_warmer:
+        return
+    task = asyncio.create_task(
+        cache_manager.record_questions([(query.model_dump(), query.type_scope()) for query in queries])
+    )
+    question_recorders.add(task)
+    task.add_done_callback(question_recorders.discard)
+
+
+async def cache_chat_response(
+    query: Query,
+    cache_key: str,
+    chat_response: ChatResponse,
+    query_embedding: Optional[List[float]],
+    docs: List[Dict[str, Any]],
+    generations: Optional[Dict[str, int]],
+):
+    """Store an answer in the exact cache and index it for semantic lookup"""
+    try:
+        with stage("cache_store"):
+            await cache_manager.set_answer(
+                cache_key,
+                chat_response.model_dump(),
+                [doc["metadata"]["type"] for doc in docs],
+                generations,
             )
-        except Exception as embedding_error:
-            print(f"Embedding error: {embedding_error}")
-            # If embeddings fail, provide a basic response without context
-            similar_docs = []
+            await cache_manager.add_dependencies(
+                cache_key,
+                # Analytics entries included, so stock changes invalidate by product
+                sorted({chunk_parent(doc["id"]) for doc in docs}),
+            )
+            if query_embedding is not None:
+                await cache_manager.set_semantic(
+                    cache_key,
+                    query.question,
+                    query_embedding,
+                    query.n_results,
+                    query.type_scope(),
+                )
+    except Exception as cache_error:
+        print(f"Failed to cache response: {cache_error}")
 
-        # Prepare context from similar documents
-        context = [doc["content"] for doc in similar_docs] if similar_docs else []
-        context_str = "\n".join(context) if context else "No relevant context found."
 
-        # Prepare prompt for LLM
-        prompt = f"""You are a helpful assistant for a Stock Control Management System. 
-        Use the following context to answer the question. If you cannot find the answer 
-        in the context, say so. Do not make up information.
+def add_analytics(question: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The retrieved documents plus the sales analytics of the products they are
+    about. Analytics entries have type "analytics", so answers built on them
+    are cached under that generation scope and depend on the entries' ids.
+    """
+    if sales_analytics and not startup.pending(["analytics"]):
+        with stage("analytics_context"):
+            return sales_analytics.context_documents(question, docs)
+    return docs
 
-        Context:
-        {context_str}
 
-        Question: {query.question}
+def build_context(docs: List[Dict[str, Any]]) -> List[str]:
+    """Deduplicated prompt context within the token budget"""
+    with stage("assemble_context"):
+        context, stats = assemble_context(docs)
+    CONTEXT_TOKENS.observe(stats["tokens"])
+    for action in ("duplicates", "truncated", "dropped"):
+        if stats[action]:
+            CONTEXT_ENTRIES_REMOVED.inc(stats[action], action=action)
+    return context
 
-        Answer:"""
 
-        # Get response from Ollama
-        try:
-            response = ollama.chat(
+def build_prompt(question: str, context: List[str]) -> str:
+    """Prepare prompt for LLM"""
+    context_str = "\n".join(context) if context else "No relevant context found."
+    return f"""You are a helpful assistant for a Stock Control Management System. 
+    Use the following context to answer the question. If you cannot find the answer 
+    in the context, say so. Do not make up information.
+
+    Context:
+    {context_str}
+
+    Question: {question}
+
+    Answer:"""
+
+
+async def shed_response(
+    query: Query, context: List[str], query_embedding: Optional[List[float]]
+) -> ChatResponse:
+    """
+    Answer for a generation shed by admission control: the nearest still
+    valid cached answer to a similar question, or else the context alone
+    """
+    if query_embedding is not None:
+        with stage("shed_cache"):
+            nearest = await cache_manager.get_nearest_answer(query_embedding, query.type_scope())
+        if nearest:
+            cached_response, _, _ = nearest
+            return ChatResponse(**{**cached_response, "route": "shed_cache"})
+    if context:
+        answer = (
+            "The assistant is busy, so no answer was generated. "
+            "The most relevant records found are:\n" + "\n".join(context)
+        )
+    else:
+        answer = "The assistant is busy and found no records for this question. Please try again shortly."
+    return ChatResponse(answer=answer, context=context, route="shed_context")
+
+
+def llm_fallback_answer(question: str) -> str:
+    """Fallback response when LLM is not available"""
+    return f"I'm sorry, but I'm currently unable to process your question due to a service issue. Please try again later or contact support. Your question was: {question}"
+
+
+async def generate_chat_response(
+    query: Query, cache_key: str, priority: str = "interactive"
+) -> ChatResponse:
+    """Serve a semantically similar cached answer, or retrieve context, generate and cache"""
+    generations = await read_generations()
+    cached_response, docs, query_embedding = await prepare_context(query)
+    if cached_response:
+        return ChatResponse(**{**cached_response, "route": "semantic_cache"})
+    return await generate_answer(
+        query, cache_key, docs, query_embedding, generations, priority
+    )
+
+
+async def generate_answer(
+    query: Query,
+    cache_key: str,
+    docs: List[Dict[str, Any]],
+    query_embedding: Optional[List[float]],
+    generations: Optional[Dict[str, int]],
+    priority: str = "interactive",
+) -> ChatResponse:
+    """Generate an answer from the retrieved documents and cache it"""
+    docs = add_analytics(query.question, docs)
+    context = build_context(docs)
+    prompt = build_prompt(query.question, context)
+
+    try:
+        with stage("llm_queue"):
+            await admission.acquire(priority)
+    except Overloaded:
+        # Not cached either
+        return await shed_response(query, context, query_embedding)
+
+    # Get response from Ollama
+    try:
+        with stage("llm"), LLM_INFLIGHT.track():
+            response = await llm_client.chat(
                 model=LLM_MODEL, messages=[{"role": "user", "content": prompt}]
             )
-            answer = response["message"]["content"]
-        except Exception as llm_error:
-            print(f"LLM error: {llm_error}")
-            # Fallback response when LLM is not available
-            answer = f"I'm sorry, but I'm currently unable to process your question due to a service issue. Please try again later or contact support. Your question was: {query.question}"
+        answer = response["message"]["content"]
+    except Exception as llm_error:
+        print(f"LLM error: {llm_error}")
+        answer = llm_fallback_answer(query.question)
+        # Don't cache the fallback answer
+        return ChatResponse(answer=answer, context=context, route="fallback")
+    finally:
+        admission.release()
+
+    chat_response = ChatResponse(answer=answer, context=context)
+    await cache_chat_response(
+        query, cache_key, chat_response, query_embedding, docs, generations
+    )
+    return chat_response
+
 
-        chat_response = ChatResponse(answer=answer, context=context)
+def observe_chat(endpoint: str, route: str, start: float):
+    CHAT_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, route=route)
+    CHAT_RESPONSES.inc(route=route)
 
-        # Try to cache the response
+
+def check_priority(priority: str):
+    if priority not in PRIORITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"X-Request-Priority must be one of {list(PRIORITIES)}",
+        )
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(
+    query: Query, priority: str = Header("interactive", alias="X-Request-Priority")
+):
+    """
+    Answer a question. Reporting and other non-interactive callers should
+    send X-Request-Priority: batch (or background) so their generations
+    queue behind interactive ones.
+    """
+    check_priority(priority)
+    start = time.perf_counter()
+    route = "error"
+    try:
+        response = await answer_chat(query, priority)
+        route = response.route
+        return response
+    finally:
+        observe_chat("chat", route, start)
+
+
+async def answer_chat(query: Query, priority: str = "interactive") -> ChatResponse:
+    """SQL fast path, then exact cache, then a coalesced RAG generation"""
+    try:
+        check_types(query)
+
+        # Lookups and aggregates skip embedding, retrieval and the LLM, so
+        # they are answered while the vector store is still loading
+        sql_response = await route_to_sql(query)
+        if sql_response:
+            return sql_response
+        require("vector_store")
+
+        cache_key = query.cache_key()
+        record_questions([query])
+
+        # Try to get from cache first (with error handling)
         try:
-            await cache_manager.set(cache_key, chat_response.model_dump())
+            with stage("cache_lookup"):
+                cached_response = await cache_manager.get_answer(cache_key)
+            if cached_response:
+                cache_manager.stats["exact_hits"] += 1
+                return ChatResponse(**{**cached_response, "route": "cache"})
         except Exception as cache_error:
-            print(f"Failed to cache response: {cache_error}")
+            print(f"Cache error (continuing without cache): {cache_error}")
 
-        return chat_response
+        # Concurrent identical questions wait on a single generation
+        return await chat_coalescer.run(
+            cache_key, lambda: generate_chat_response(query, cache_key, priority)
+        )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/refresh-embeddings")
-async def refresh_embeddings():
+# Shared by all batch requests, so a large batch takes few places in the
+# admission queue (and is not shed for filling it)
+batch_llm_slots = asyncio.Semaphore(CHAT_BATCH_LLM_CONCURRENCY)
+
+
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch_endpoint(batch: BatchQuery):
+    """
+    Answer many questions in one request. Cache lookups, question
+    embedding, semantic cache lookups and vector retrieval are each done
+    once for the whole batch; at most CHAT_BATCH_LLM_CONCURRENCY answers are
+    generated at a time. Results come back in request order.
+    """
+    if len(batch.queries) > CHAT_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {CHAT_BATCH_MAX_QUESTIONS} queries per batch",
+        )
+    for query in batch.queries:
+        check_types(query)
+
+    start = time.perf_counter()
     try:
-        # Check if managers are initialized
-        if not all([db_manager, embedding_manager, cache_manager]):
-            raise HTTPException(
-                status_code=503, detail="Service managers not fully initialized"
+        results = await answer_batch(batch.queries)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in chat batch endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    for result in results:
+        observe_chat("chat_batch", result.route, start)
+    return BatchChatResponse(results=results)
+
+
+async def answer_batch(queries: List[Query]) -> List[ChatResponse]:
+    """SQL fast path, then exact cache, then batched RAG; duplicate queries are answered once"""
+    results: List[Optional[ChatResponse]] = list(
+        await asyncio.gather(*(route_to_sql(query) for query in queries))
+    )
+
+    positions: Dict[str, List[int]] = {}
+    for i, query in enumerate(queries):
+        if results[i] is None:
+            positions.setdefault(query.cache_key(), []).append(i)
+
+    responses: Dict[str, ChatResponse] = {}
+    if positions:
+        require("vector_store")
+        record_questions([queries[i] for indexes in positions.values() for i in indexes])
+        keys = list(positions)
+        with stage("batch_cache_lookup"):
+            cached = await cache_manager.get_answers(keys)
+        misses = {}
+        for key, cached_response in zip(keys, cached):
+            if cached_response:
+                cache_manager.stats["exact_hits"] += 1
+                responses[key] = ChatResponse(**{**cached_response, "route": "cache"})
+            else:
+                misses[key] = queries[positions[key][0]]
+        if misses:
+            responses.update(await generate_batch(misses))
+
+    for key, indexes in positions.items():
+        for i in indexes:
+            results[i] = responses[key]
+    return results
+
+
+async def embed_questions(questions: List[str]) -> Dict[str, Optional[List[float]]]:
+    """Embeddings of distinct questions: cached ones in one round trip, the rest in one embed call"""
+    with stage("batch_embedding_cache"):
+        cached = await cache_manager.get_embeddings(questions)
+    embeddings = dict(zip(questions, cached))
+    missing = [question for question, embedding in embeddings.items() if embedding is None]
+    if missing:
+        try:
+            with stage("batch_embed"):
+                generated = await embedding_manager.generate_embeddings(missing)
+        except Exception as embedding_error:
+            print(f"Embedding error: {embedding_error}")
+            return embeddings
+        embeddings.update(zip(missing, generated))
+        await cache_manager.set_embeddings(dict(zip(missing, generated)))
+    return embeddings
+
+
+async def generate_batch(queries: Dict[str, Query]) -> Dict[str, ChatResponse]:
+    """
+    generate_chat_response for many cache misses, keyed by cache key, with
+    embedding, semantic cache lookup and retrieval batched across them
+    """
+    generations = await read_generations()
+    responses: Dict[str, ChatResponse] = {}
+    docs: Dict[str, List[Dict[str, Any]]] = {}
+
+    # Questions naming an entity need no embedding
+    with stage("batch_exact_lookup"):
+        for key, query in queries.items():
+            found = await asyncio.to_thread(
+                embedding_manager.lookup_exact, query.question, query.n_results, query.types
             )
+            if found:
+                docs[key] = found
+    to_retrieve = [key for key in queries if key not in docs]
 
-        # Get all data from database
-        data = db_manager.get_all_data()
+    embeddings = await embed_questions(
+        list(dict.fromkeys(queries[key].question for key in to_retrieve))
+    )
+    query_embeddings = {key: embeddings.get(queries[key].question) for key in to_retrieve}
 
-        if not data:
-            raise ValueError("No data retrieved from database")
+    embedded = [key for key in to_retrieve if query_embeddings[key] is not None]
+    if embedded:
+        with stage("batch_semantic_cache"):
+            semantic = await cache_manager.get_semantic_many(
+                [
+                    (
+                        queries[key].question,
+                        query_embeddings[key],
+                        queries[key].n_results,
+                        queries[key].type_scope(),
+                    )
+                    for key in embedded
+                ]
+            )
+        for key, cached_response in zip(embedded, semantic):
+            if cached_response:
+                responses[key] = ChatResponse(**{**cached_response, "route": "semantic_cache"})
+        to_retrieve = [key for key in to_retrieve if key not in responses]
 
-        print(f"Retrieved {len(data)} documents from database")
+    # One multi-embedding vector query per distinct (n_results, types)
+    groups: Dict[Tuple[int, str], List[str]] = {}
+    for key in to_retrieve:
+        groups.setdefault((queries[key].n_results, queries[key].type_scope()), []).append(key)
+    with stage("batch_retrieve"):
+        for (n_results, _), keys in groups.items():
+            try:
+                found = await embedding_manager.query_hybrid_many(
+                    [queries[key].question for key in keys],
+                    n_results,
+                    [query_embeddings[key] for key in keys],
+                    queries[keys[0]].types,
+                )
+            except Exception as embedding_error:
+                print(f"Embedding error: {embedding_error}")
+                found = [[] for _ in keys]
+            docs.update(zip(keys, found))
 
-        # Add documents to vector store
-        await embedding_manager.add_documents(data)
+    async def generate(key: str) -> Tuple[str, ChatResponse]:
+        query = queries[key]
+        async with batch_llm_slots:
+            # Joins an identical /chat generation already in flight
+            response = await chat_coalescer.run(
+                key,
+                lambda: generate_answer(
+                    query, key, docs[key], query_embeddings.get(key), generations, "batch"
+                ),
+            )
+        return key, response
 
-        # Clear chat cache since embeddings have changed
-        await cache_manager.clear_all()
+    responses.update(
+        await asyncio.gather(*(generate(key) for key in docs if key not in responses))
+    )
+    return responses
 
-        return {
-            "message": f"Successfully refreshed embeddings for {len(data)} documents"
-        }
 
-    except Exception as e:
-        print(f"Error in refresh_embeddings endpoint: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/db/stats")
+async def db_stats():
+    """Database connection pool metrics"""
+    return db_manager.get_stats()
+
+
+@app.get("/index/stats")
+async def index_stats():
+    """Vector store size and keyword index state"""
+    require("vector_store")
+    keyword_index = embedding_manager.keyword_index
+    return {
+        "vector_documents": await asyncio.to_thread(embedding_manager.collection.count),
+        "keyword_index": keyword_index.get_stats() if keyword_index else {"enabled": False},
+        "sync": index_feed.get_stats() if index_feed else {"enabled": False, "role": SERVICE_ROLE},
+        "snapshot": snapshot_stats,
+    }
+
+
+@app.post("/index/snapshot")
+async def create_snapshot(quantization: str = SNAPSHOT_QUANTIZATION):
+    """
+    Export the vector index to SNAPSHOT_PATH, for new instances to import
+    at startup. `quantization` is float32, float16 or int8.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise HTTPException(
+            status_code=400, detail=f"quantization must be one of {list(QUANTIZATIONS)}"
+        )
+    require("vector_store")
+    if snapshot_lock.locked():
+        raise HTTPException(status_code=409, detail="A snapshot export is already running")
+    async with snapshot_lock:
+        snapshot_stats["export"] = await asyncio.to_thread(
+            export_snapshot, embedding_manager.collection, SNAPSHOT_PATH, quantization
+        )
+    return snapshot_stats["export"]
+
+
+@app.get("/index/snapshot")
+async def download_snapshot():
+    """The last exported snapshot file"""
+    if not os.path.exists(SNAPSHOT_PATH):
+        raise HTTPException(status_code=404, detail="No snapshot has been exported")
+    return FileResponse(
+        SNAPSHOT_PATH, media_type="application/octet-stream", filename=os.path.basename(SNAPSHOT_PATH)
+    )
+
+
+def require_analytics() -> SalesAnalytics:
+    if not sales_analytics:
+        raise HTTPException(status_code=404, detail="Sales analytics are disabled")
+    require("analytics")
+    return sales_analytics
+
+
+@app.get("/analytics/products")
+async def analytics_products(
+    sort: str = "days_left", limit: int = 20, as_of: Optional[date] = None
+):
+    """
+    Sales velocity, days of stock left and reorder quantity per product,
+    over the ANALYTICS_WINDOW_DAYS up to `as_of` (default today). Sorted by
+    fewest days left, or by highest velocity, revenue or reorder quantity.
+    """
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {list(SORT_KEYS)}")
+    analytics = require_analytics()
+    with stage("analytics"):
+        return analytics.product_report(sort, limit, as_of)
+
+
+@app.get("/analytics/reorder")
+async def analytics_reorder(limit: int = 20, as_of: Optional[date] = None):
+    """Products to reorder grouped by supplier, largest estimated order first"""
+    analytics = require_analytics()
+    with stage("analytics"):
+        return analytics.reorder_report(limit, as_of)
+
+
+@app.get("/analytics/stats")
+async def analytics_stats():
+    """Rows held by the analytics engine and load, update and compute timings"""
+    if not sales_analytics:
+        return {"enabled": False}
+    return {"enabled": True, **sales_analytics.get_stats()}
+
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """Generations running and waiting per priority, and how many were shed"""
+    return admission.get_stats()
+
+
+@app.get("/router/stats")
+async def router_stats():
+    """Questions answered from SQL, per intent, and fall-throughs to RAG"""
+    if not query_router:
+        return {"enabled": False}
+    return {"enabled": True, **query_router.get_stats()}
+
+
+@app.post("/cache/warm", status_code=202)
+async def warm_cache():
+    """Start answering the most frequent questions again in the background"""
+    if not cache_warmer:
+        raise HTTPException(status_code=404, detail="Cache warming is disabled")
+    require("vector_store", "redis")
+    if not cache_warmer.trigger("api"):
+        raise HTTPException(status_code=409, detail="A cache warming run is already in progress")
+    return {"status": "started", "status_url": "/cache/warm"}
+
+
+@app.get("/cache/warm")
+async def cache_warm_stats():
+    """The current and last warming runs: questions refreshed, already cached, and duration"""
+    if not cache_warmer:
+        return {"enabled": False}
+    return {"enabled": True, **cache_warmer.get_stats()}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Answer cache hit, miss and near-miss counters"""
+    return cache_manager.get_stats()
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(
+    query: Query, priority: str = Header("interactive", alias="X-Request-Priority")
+):
+    """
+    Streaming variant of /chat using server-sent events. Emits a `context`
+    event with the retrieved documents, then `token` events as the LLM
+    generates, then `done` (or `error` if generation fails). A fully
+    streamed answer is cached under the same key as /chat. The `done`
+    event reports the route that produced the answer.
+    """
+    check_priority(priority)
+
+    start = time.perf_counter()
+    check_types(query)
+    sql_response = await route_to_sql(query)
+    if sql_response:
+
+        async def sql_stream():
+            yield sse_event("context", {"context": sql_response.context})
+            yield sse_event("token", {"content": sql_response.answer})
+            yield sse_event(
+                "done", {"cached": False, "route": "sql", "intent": sql_response.intent}
+            )
+            observe_chat("chat_stream", "sql", start)
+
+        return StreamingResponse(
+            sql_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    require("vector_store")
+
+    cache_key = query.cache_key()
+    record_questions([query])
+    try:
+        with stage("cache_lookup"):
+            cached_response = await cache_manager.get_answer(cache_key)
+    except Exception as cache_error:
+        print(f"Cache error (continuing without cache): {cache_error}")
+        cached_response = None
+
+    async def event_stream():
+        route = "error"
+        answer = stream_answer()
+        try:
+            async for event in answer:
+                if isinstance(event, str):
+                    yield event
+                else:
+                    route = event["route"]
+        finally:
+            # Close the answer now rather than when it is garbage collected,
+            # so a disconnected client's LLM slot is released right away
+            await answer.aclose()
+            observe_chat("chat_stream", route, start)
+
+    async def stream_answer():
+        """SSE events of the answer, plus a final {"route": ...} marker"""
+        if cached_response:
+            cache_manager.stats["exact_hits"] += 1
+            yield sse_event("context", {"context": cached_response["context"]})
+            yield sse_event("token", {"content": cached_response["answer"]})
+            yield sse_event("done", {"cached": True, "route": "cache"})
+            yield {"route": "cache"}
+            return
+
+        generations = await read_generations()
+        semantic_response, docs, query_embedding = await prepare_context(query)
+        if semantic_response:
+            yield sse_event("context", {"context": semantic_response["context"]})
+            yield sse_event("token", {"content": semantic_response["answer"]})
+            yield sse_event("done", {"cached": True, "route": "semantic_cache"})
+            yield {"route": "semantic_cache"}
+            return
+
+        docs = add_analytics(query.question, docs)
+        context = build_context(docs)
+
+        try:
+            with stage("llm_queue"):
+                await admission.acquire(priority)
+        except Overloaded:
+            shed = await shed_response(query, context, query_embedding)
+            yield sse_event("context", {"context": shed.context})
+            yield sse_event("token", {"content": shed.answer})
+            yield sse_event("done", {"cached": shed.route == "shed_cache", "route": shed.route})
+            yield {"route": shed.route}
+            return
+
+        parts = []
+        try:
+            # Inside the try: the client may go away at any yield
+            yield sse_event("context", {"context": context})
+            with stage("llm"), LLM_INFLIGHT.track():
+                stream = await llm_client.chat(
+                    model=LLM_MODEL,
+                    messages=[{"role": "user", "content": build_prompt(query.question, context)}],
+                    stream=True,
+                )
+                async for chunk in stream:
+                    token = chunk["message"]["content"]
+                    if token:
+                        parts.append(token)
+                        yield sse_event("token", {"content": token})
+        except Exception as llm_error:
+            print(f"LLM error: {llm_error}")
+            # Don't cache a partial or failed answer
+            yield sse_event("error", {"message": llm_fallback_answer(query.question)})
+            yield {"route": "fallback"}
+            return
+        finally:
+            admission.release()
+
+        chat_response = ChatResponse(answer="".join(parts), context=context)
+        await cache_chat_response(
+            query, cache_key, chat_response, query_embedding, docs, generations
+        )
+        yield sse_event("done", {"cached": False, "route": "rag"})
+        yield {"route": "rag"}
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def run_refresh(job: RefreshJob) -> Dict[str, Any]:
+    """Extract, embed and store, then invalidate affected cache entries"""
+    job.set_phase("counting rows")
+    job.rows_total = await db_manager.run(db_manager.count_documents)
+
+    # Stream pages from the database straight into the sync. Every document
+    # type is swept, so types no longer indexed (e.g. raw transaction rows
+    # once INDEX_TRANSACTION_ROWS is off) are removed.
+    job.set_phase("syncing embeddings")
+    try:
+        stats = await embedding_manager.sync_documents(
+            db_manager.aiter_document_pages(INDEXED_TYPES),
+            DOCUMENT_TYPES,
+            full=(job.mode == "full"),
+            progress=job.set_progress,
+        )
+    except BaseException:
+        # A cancelled or failed sync may have written part of the changes
+        await cache_manager.bump_generations(DOCUMENT_TYPES)
+        raise
+
+    # Invalidate only answers whose context included a changed entity type
+    job.set_phase("invalidating cache")
+    if stats["changed_types"]:
+        await cache_manager.bump_generations(stats["changed_types"])
+        if cache_warmer:
+            # The invalidated answers most asked for are regenerated first
+            cache_warmer.trigger(f"refresh {job.id}")
+
+    return stats
+
+
+refresh_jobs = RefreshJobManager(run_refresh)
+
+
+async def warm_question(fields: Dict[str, Any]) -> str:
+    """
+    Answer a frequent question at background priority unless a valid answer
+    is cached or a user's request is already generating one. The generation
+    is not shared through chat_coalescer: users asking meanwhile generate
+    at their own priority rather than wait behind a background one.
+    """
+    query = Query(**fields)
+    cache_key = query.cache_key()
+    if chat_coalescer.running(cache_key):
+        return "in_flight"
+    if await cache_manager.get_answer(cache_key):
+        return "cache"
+    response = await generate_chat_response(query, cache_key, "background")
+    return response.route
+
+
+cache_warmer = CacheWarmer(cache_manager, warm_question) if CACHE_WARM_ENABLED else None
+
+# Created by start_services once MySQL and the vector store are up
+changelog_tailer: Optional[ChangeLogTailer] = None
+# Created by start_services when the index lives on a shared Chroma server
+index_feed: Optional[IndexChangeFeed] = None
+
+
+@app.post("/refresh-embeddings", status_code=202)
+async def refresh_embeddings(mode: str = "incremental"):
+    """
+    Start a background sync of the vector store with the database and
+    return its job id. `incremental` embeds only new or changed rows;
+    `full` re-embeds every row. Both delete rows that no longer exist.
+    """
+    if mode not in ("incremental", "full"):
+        raise HTTPException(
+            status_code=400, detail="mode must be 'incremental' or 'full'"
+        )
+
+    require_writer()
+    require("mysql", "vector_store")
+
+    job = refresh_jobs.start(mode)
+    if job is None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Refresh job {refresh_jobs.current.id} is already running",
+        )
+    return {"job_id": job.id, "status_url": f"/refresh-embeddings/jobs/{job.id}"}
+
+
+@app.get("/refresh-embeddings/jobs")
+async def list_refresh_jobs():
+    """Recent refresh jobs, newest first"""
+    return {"jobs": refresh_jobs.list_jobs()}
+
+
+@app.get("/refresh-embeddings/jobs/{job_id}")
+async def get_refresh_job(job_id: str):
+    """Phase, rows processed and ETA of a refresh job"""
+    job = refresh_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Refresh job not found")
+    return job.to_dict()
+
+
+@app.post("/refresh-embeddings/jobs/{job_id}/cancel")
+async def cancel_refresh_job(job_id: str):
+    """Cancel a running refresh job"""
+    require_writer()
+    job = refresh_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Refresh job not found")
+    if not refresh_jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Refresh job is {job.status}")
+    return job.to_dict()
+
+
+@app.get("/changelog/stats")
+async def changelog_stats():
+    """Change log tailer progress and lag"""
+    if not IS_WRITER:
+        return {"enabled": False, "role": SERVICE_ROLE}
+    if not changelog_tailer:
+        # Built once MySQL and the vector store are up
+        raise HTTPException(
+            status_code=503,
+            detail="Service is starting; change log tailer not started yet",
+            headers={"Retry-After": "5"},
+        )
+    return {"enabled": CHANGELOG_ENABLED, **changelog_tailer.get_stats()}
+
+
+def cache_lookup_counts() -> Dict[str, int]:
+    stats = cache_manager.stats
+    return {
+        "exact_hit": stats["exact_hits"],
+        "semantic_hit": stats["semantic_hits"],
+        "near_miss": stats["near_misses"],
+        "miss": stats["misses"],
+    }
+
+
+def keyword_index_documents() -> Optional[int]:
+    if not embedding_manager or not embedding_manager.keyword_index:
+        return None
+    return len(embedding_manager.keyword_index.documents)
+
+
+registry.callback(
+    "rag_cache_lookups_total",
+    "Answer cache lookups by result",
+    cache_lookup_counts,
+    ("result",),
+    type="counter",
+)
+registry.callback(
+    "rag_cache_hit_ratio",
+    "Share of answer cache lookups served from the exact or semantic cache",
+    lambda: cache_manager.get_stats()["hit_ratio"],
+)
+registry.callback(
+    "rag_vector_documents",
+    "Documents in the vector store",
+    lambda: embedding_manager.collection.count() if embedding_manager else None,
+)
+registry.callback(
+    "rag_keyword_index_documents", "Documents in the keyword index", keyword_index_documents
+)
+registry.callback(
+    "rag_db_pool_connections",
+    "MySQL pool connections by state",
+    lambda: {key: db_manager.get_stats()[key] for key in ("in_use", "idle", "waiters")},
+    ("state",),
+)
+registry.callback(
+    "rag_index_generation",
+    "Index generation published by the writer, or last applied by a query instance",
+    lambda: index_feed.generation if index_feed else None,
+)
+registry.callback(
+    "rag_dependency_ready",
+    "Whether each startup dependency is initialized",
+    lambda: {name: int(dep.ready) for name, dep in startup.dependencies.items()},
+    ("dependency",),
+)
+registry.callback(
+    "rag_chat_coalesced_inflight", "Distinct chat generations in flight", lambda: chat_coalescer.inflight
+)
+registry.callback(
+    "rag_llm_queue_depth",
+    "Generations waiting for an LLM slot by priority",
+    admission.depth,
+    ("priority",),
+)
+registry.callback(
+    "rag_llm_active", "Generations holding an LLM slot", lambda: admission.active
+)
+registry.callback(
+    "rag_refresh_job_running",
+    "Whether a refresh job is running",
+    lambda: int(refresh_jobs.running),
+)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text-format metrics"""
+    # Collection size and pool stats are read at scrape time, off the event loop
+    return PlainTextResponse(
+        await asyncio.to_thread(registry.render),
+        media_type="text/plain; version=0.0.4",
+    )
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host=API_HOST, port=API_PORT)
+    if API_WORKERS > 1:
+        if IS_WRITER or not CHROMA_HOST:
+            raise SystemExit(
+                "API_WORKERS > 1 needs SERVICE_ROLE=query and a shared Chroma server (CHROMA_HOST)"
+            )
+        # Each worker process initializes its own managers and keyword index
+        uvicorn.run("main:app", host=API_HOST, port=API_PORT, workers=API_WORKERS)
+    else:
+        uvicorn.run(app, host=API_HOST, port=API_PORT)
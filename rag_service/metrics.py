@@ -0,0 +1,270 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Seconds; spans Redis round trips up to long LLM generations
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+# Stage timings of the current request, when a timing breakdown was asked for
+request_timings: "contextvars.ContextVar[Optional[List[Tuple[str, float]]]]" = (
+    contextvars.ContextVar("request_timings", default=None)
+)
+
+
+def format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self.lock:
+            items = sorted(self.values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        """Count the enclosed block as in progress"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class CallbackGauge(Metric):
+    """Gauge (or counter) whose value is read from `callback` at scrape time"""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        callback: Callable[[], Any],
+        labelnames: Tuple[str, ...] = (),
+        type: str = "gauge",
+    ):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+        self.type = type
+
+    def render(self) -> List[str]:
+        try:
+            value = self.callback()
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {e}")
+            return []
+        if value is None:
+            return []
+        lines = self.header()
+        if isinstance(value, dict):
+            # Single label: {label value: metric value}
+            for label, item in sorted(value.items()):
+                if item is not None:
+                    lines.append(f"{self.name}{format_labels(self.labelnames, (label,))} {format_value(item)}")
+        else:
+            lines.append(f"{self.name} {format_value(value)}")
+        return lines
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket..., +Inf count], sum
+        self.series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self.lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self.series.items())
+        lines = self.header()
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = format_labels(self.labelnames, key, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, callback: Callable[[], Any], labelnames=(), type="gauge"):
+        return self.register(CallbackGauge(name, help, callback, labelnames, type))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+CHAT_STAGE_SECONDS = registry.histogram(
+    "rag_chat_stage_seconds", "Time spent in each stage of answering a chat question", ("stage",)
+)
+CHAT_REQUEST_SECONDS = registry.histogram(
+    "rag_chat_request_seconds", "End-to-end chat request latency", ("endpoint", "route")
+)
+CHAT_RESPONSES = registry.counter(
+    "rag_chat_responses_total", "Chat answers by the path that produced them", ("route",)
+)
+LLM_INFLIGHT = registry.gauge("rag_llm_inflight_requests", "Ollama chat generations in progress")
+LLM_INFLIGHT.set(0)
+LLM_QUEUE_WAIT_SECONDS = registry.histogram(
+    "rag_llm_queue_wait_seconds", "Time generations waited for an LLM slot", ("priority",)
+)
+LLM_REQUESTS_SHED = registry.counter(
+    "rag_llm_requests_shed_total",
+    "Generations shed by admission control, by priority and reason",
+    ("priority", "reason"),
+)
+REFRESH_PHASE_SECONDS = registry.histogram(
+    "rag_refresh_phase_seconds", "Time spent in each phase of a refresh job", ("phase",)
+)
+REFRESH_JOBS = registry.counter("rag_refresh_jobs_total", "Finished refresh jobs", ("mode", "status"))
+CACHE_WARM_ANSWERS = registry.counter(
+    "rag_cache_warm_answers_total", "Frequent questions handled by cache warming runs", ("result",)
+)
+CACHE_WARM_RUN_SECONDS = registry.histogram(
+    "rag_cache_warm_run_seconds", "Duration of cache warming runs"
+)
+DOCUMENTS_EMBEDDED = registry.counter("rag_documents_embedded_total", "Documents embedded and stored")
+EMBEDDING_DOCS_PER_SECOND = registry.gauge(
+    "rag_embedding_docs_per_second", "Embedding throughput of the most recent embedding run"
+)
+
+CONTEXT_TOKENS = registry.histogram(
+    "rag_context_tokens",
+    "Estimated tokens of assembled prompt context",
+    buckets=(64, 128, 256, 512, 768, 1024, 1536, 2048, 4096, 8192),
+)
+CONTEXT_ENTRIES_REMOVED = registry.counter(
+    "rag_context_entries_removed_total",
+    "Retrieved entries deduplicated, truncated or dropped to fit the context budget",
+    ("action",),
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time one chat stage into the stage histogram and the request's timing breakdown"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        CHAT_STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing header value with durations in milliseconds"""
+    entries = [f"{name};dur={elapsed * 1000:.2f}" for name, elapsed in timings]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
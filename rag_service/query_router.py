@@ -0,0 +1,359 @@
+import re
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import LOW_STOCK_THRESHOLD, SQL_ROUTER_MAX_ROWS
+
+
+# Products are stocked in batches, one row per PRODUCT_CODE and stock-in
+# date, and sales decrement ON_HAND; stock questions sum over the batches.
+PRODUCT_STOCK_SQL = """
+    SELECT p.PRODUCT_CODE, p.NAME, SUM(p.ON_HAND) AS ON_HAND,
+           MIN(p.PRICE) AS MIN_PRICE, MAX(p.PRICE) AS MAX_PRICE
+    FROM product p
+    WHERE {condition}
+    GROUP BY p.PRODUCT_CODE, p.NAME
+    ORDER BY p.NAME
+    LIMIT %s
+"""
+
+LOW_STOCK_SQL = """
+    SELECT p.PRODUCT_CODE, p.NAME, SUM(p.ON_HAND) AS ON_HAND
+    FROM product p
+    GROUP BY p.PRODUCT_CODE, p.NAME
+    HAVING SUM(p.ON_HAND) < %s
+    ORDER BY ON_HAND, p.NAME
+    LIMIT %s
+"""
+
+# GRANDTOTAL is stored as formatted text ("1,967.00")
+SALES_TOTAL_SQL = """
+    SELECT COUNT(*) AS TRANSACTIONS,
+           COALESCE(SUM(CAST(REPLACE(t.GRANDTOTAL, ',', '') AS DECIMAL(14, 2))), 0) AS TOTAL
+    FROM transaction t
+    {where}
+"""
+
+TOP_PRODUCTS_SQL = """
+    SELECT td.PRODUCTS, SUM(CAST(td.QTY AS UNSIGNED)) AS UNITS,
+           SUM(CAST(td.QTY AS UNSIGNED) * CAST(td.PRICE AS DECIMAL(12, 2))) AS REVENUE
+    FROM transaction_details td
+    JOIN transaction t ON t.TRANS_D_ID = td.TRANS_D_ID
+    {where}
+    GROUP BY td.PRODUCTS
+    ORDER BY UNITS DESC, REVENUE DESC
+    LIMIT %s
+"""
+
+TOP_PRODUCTS_PATTERN = re.compile(
+    r"\b(?:best|top|most)[\s-]*(?:\d+\s+)?(?:selling|sold|popular)\b", re.I
+)
+SALES_PATTERN = re.compile(
+    r"\b(?:sales|revenue|earn(?:ed|ings)?|income)\b|\bhow\s+many\s+(?:transactions|orders)\b",
+    re.I,
+)
+# Sales of one product, supplier or customer are not a store-wide total
+SALES_SUBJECT_PATTERN = re.compile(
+    r"\b(?:sales|revenue|earn(?:ed|ings)?|income|sold|transactions|orders)\s+"
+    r"(?:of|for|from|by|per|on)\s+(?P<name>.+)$",
+    re.I,
+)
+SALES_BREAKDOWN_WORDS = re.compile(
+    r"\b(?:suppliers?|customers?|categor(?:y|ies)|brands?|each|per)\b", re.I
+)
+PERIOD_WORDS = re.compile(
+    r"\b(?:today|yesterday|(?:this|last|past)\s+(?:week|month|year)|(?:the\s+)?(?:last|past)\s+7\s+days|"
+    r"(?:in|on|during|for)\s+\d{4}(?:-\d{2}(?:-\d{2})?)?|\d{4}-\d{2}(?:-\d{2})?|in\s+total|so\s+far)\b",
+    re.I,
+)
+STORE_WIDE_NAMES = {"", "all", "all products", "all items", "everything", "store", "shop", "us"}
+LOW_STOCK_PATTERN = re.compile(
+    r"\b(?:low(?:\s+on)?\s+stock|running\s+low|out\s+of\s+stock|need(?:s)?\s+restock(?:ing)?)\b",
+    re.I,
+)
+THRESHOLD_PATTERN = re.compile(
+    r"\b(?:below|under|less\s+than|fewer\s+than|lower\s+than)\s+(\d+)\s*"
+    r"(?:units?|items?|pieces?|pcs|in\s+stock|on\s+hand|left)?",
+    re.I,
+)
+STOCK_WORDS = re.compile(r"\b(?:stocks?|units?|items?|products?|inventory|on\s+hand|left)\b", re.I)
+PRODUCT_STOCK_PATTERNS = [
+    re.compile(
+        r"\b(?:stock|on\s+hand|inventory|quantity|qty)\s+(?:level\s+)?(?:of|for)\s+(?P<name>.+)$",
+        re.I,
+    ),
+    re.compile(
+        r"\bhow\s+many\s+(?P<name>.+?)\s+(?:are\s+)?(?:do\s+we\s+have|are\s+(?:there|left)|"
+        r"left|in\s+stock|on\s+hand)\b",
+        re.I,
+    ),
+]
+PRICE_PATTERNS = [
+    re.compile(r"\b(?:price|cost)\s+(?:of|for)\s+(?P<name>.+)$", re.I),
+    re.compile(r"\bhow\s+much\s+(?:is|are|does|do)\s+(?P<name>.+?)(?:\s+cost)?$", re.I),
+]
+LEADING_WORDS = re.compile(r"^(?:the|a|an|product|item|our|we)\s+", re.I)
+
+
+def clean_name(name: str) -> str:
+    """Strip punctuation and filler words around a product name or code"""
+    name = name.strip().rstrip("?.! ").strip("'\"")
+    name = re.sub(r"\s+(?:right\s+now|currently|now|today)$", "", name, flags=re.I)
+    while LEADING_WORDS.match(name):
+        name = LEADING_WORDS.sub("", name, count=1)
+    return name.strip()
+
+
+def parse_period(
+    question: str, today: Optional[date] = None
+) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Date range a question asks about, as (label, start, end) with inclusive
+    YYYY-MM-DD bounds. transaction.DATE is text written by the POS as
+    "YYYY-MM-DD hh:mm am", so the bounds are compared with its first ten
+    characters (see date_filter).
+    """
+    today = today or date.today()
+    lowered = question.lower()
+
+    match = re.search(r"\b(\d{4}-\d{2}-\d{2})\b", lowered)
+    if match:
+        return f"on {match.group(1)}", match.group(1), match.group(1)
+    match = re.search(r"\b(\d{4})-(\d{2})\b", lowered)
+    if match:
+        month = f"{match.group(1)}-{match.group(2)}"
+        return f"in {month}", f"{month}-01", f"{month}-31"
+    if "today" in lowered:
+        return "today", today.isoformat(), today.isoformat()
+    if "yesterday" in lowered:
+        day = (today - timedelta(days=1)).isoformat()
+        return "yesterday", day, day
+    if "this week" in lowered:
+        return "this week", (today - timedelta(days=today.weekday())).isoformat(), today.isoformat()
+    if re.search(r"\b(?:last|past)\s+7\s+days\b|\blast\s+week\b", lowered):
+        return "in the last 7 days", (today - timedelta(days=6)).isoformat(), today.isoformat()
+    if "this month" in lowered:
+        return "this month", today.replace(day=1).isoformat(), today.isoformat()
+    if "last month" in lowered:
+        end = today.replace(day=1) - timedelta(days=1)
+        return "last month", end.replace(day=1).isoformat(), end.isoformat()
+    if "this year" in lowered:
+        return "this year", today.replace(month=1, day=1).isoformat(), today.isoformat()
+    match = re.search(r"\bin\s+(\d{4})\b", lowered)
+    if match:
+        return f"in {match.group(1)}", f"{match.group(1)}-01-01", f"{match.group(1)}-12-31"
+    return "in total", None, None
+
+
+def date_filter(start: Optional[str], end: Optional[str]) -> Tuple[str, tuple]:
+    """WHERE clause for inclusive day bounds; the time of day is ignored"""
+    if start is None:
+        return "", ()
+    return "WHERE LEFT(t.DATE, 10) BETWEEN %s AND %s", (start, end)
+
+
+def money(value: Any) -> str:
+    return f"${float(value or 0):,.2f}"
+
+
+class QueryRouter:
+    """
+    Answers structured inventory and sales questions (stock of a product,
+    low stock, sales totals, best sellers) straight from parameterized SQL.
+    Questions it does not recognize, or whose product it cannot find, return
+    None so the caller falls back to retrieval and the LLM.
+    """
+
+    def __init__(self, db_manager, max_rows: int = SQL_ROUTER_MAX_ROWS):
+        self.db_manager = db_manager
+        self.max_rows = max_rows
+        # Tried in order; each matcher returns params for its handler or None
+        self.intents: List[Tuple[str, Callable, Callable]] = [
+            ("top_products", self.match_top_products, self.top_products),
+            ("sales_total", self.match_sales_total, self.sales_total),
+            ("low_stock", self.match_low_stock, self.low_stock),
+            ("product_stock", self.match_product_stock, self.product_stock),
+            ("product_price", self.match_product_price, self.product_price),
+        ]
+        self.stats: Dict[str, int] = {"routed": 0, "fallthrough": 0, "errors": 0}
+
+    def match(self, question: str) -> Optional[Tuple[str, Callable, Dict[str, Any]]]:
+        """First intent that recognizes the question, with its parameters"""
+        question = question.strip()
+        for intent, matcher, handler in self.intents:
+            params = matcher(question)
+            if params is not None:
+                return intent, handler, params
+        return None
+
+    async def route(self, question: str) -> Optional[Dict[str, Any]]:
+        """Answer the question from SQL, or return None to fall back to RAG"""
+        matched = self.match(question)
+        if not matched:
+            self.stats["fallthrough"] += 1
+            return None
+
+        intent, handler, params = matched
+        start = time.perf_counter()
+        try:
+            result = await self.db_manager.run(handler, params)
+        except Exception as e:
+            print(f"SQL route {intent} failed, falling back to RAG: {e}")
+            self.stats["errors"] += 1
+            return None
+        if result is None:
+            self.stats["fallthrough"] += 1
+            return None
+
+        self.stats["routed"] += 1
+        self.stats[intent] = self.stats.get(intent, 0) + 1
+        answer, context = result
+        return {
+            "intent": intent,
+            "answer": answer,
+            "context": context,
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+
+    # Matchers
+
+    def match_top_products(self, question: str) -> Optional[Dict[str, Any]]:
+        if not TOP_PRODUCTS_PATTERN.search(question):
+            return None
+        count = re.search(r"\b(?:top|best)\s+(\d+)\b", question, re.I)
+        return {
+            "period": parse_period(question),
+            "limit": min(int(count.group(1)), self.max_rows) if count else 5,
+        }
+
+    def match_sales_total(self, question: str) -> Optional[Dict[str, Any]]:
+        if not SALES_PATTERN.search(question):
+            return None
+        # Breakdowns and sales of a named product go to retrieval instead
+        if SALES_BREAKDOWN_WORDS.search(question):
+            return None
+        subject = SALES_SUBJECT_PATTERN.search(question.rstrip("?.! "))
+        if subject:
+            name = clean_name(PERIOD_WORDS.sub(" ", subject.group("name")))
+            if name.lower() not in STORE_WIDE_NAMES:
+                return None
+        return {"period": parse_period(question)}
+
+    def match_low_stock(self, question: str) -> Optional[Dict[str, Any]]:
+        if re.search(r"\bout\s+of\s+stock\b", question, re.I):
+            return {"threshold": 1}
+        threshold = THRESHOLD_PATTERN.search(question)
+        if threshold and STOCK_WORDS.search(question):
+            return {"threshold": int(threshold.group(1))}
+        if LOW_STOCK_PATTERN.search(question):
+            return {"threshold": LOW_STOCK_THRESHOLD}
+        return None
+
+    def match_product_stock(self, question: str) -> Optional[Dict[str, Any]]:
+        return self._match_name(question, PRODUCT_STOCK_PATTERNS)
+
+    def match_product_price(self, question: str) -> Optional[Dict[str, Any]]:
+        return self._match_name(question, PRICE_PATTERNS)
+
+    def _match_name(self, question: str, patterns: List[re.Pattern]) -> Optional[Dict[str, Any]]:
+        for pattern in patterns:
+            match = pattern.search(question.rstrip("?.! "))
+            if match:
+                name = clean_name(match.group("name"))
+                if name:
+                    return {"name": name}
+        return None
+
+    # Handlers (run on the database executor)
+
+    def find_products(self, name: str) -> List[Dict[str, Any]]:
+        """Products whose code or name is `name`, else whose name contains it"""
+        rows = self.db_manager.query(
+            PRODUCT_STOCK_SQL.format(condition="p.PRODUCT_CODE = %s OR p.NAME = %s"),
+            (name, name, self.max_rows),
+        )
+        if rows:
+            return rows
+        pattern = "%" + re.sub(r"([%_\\])", r"\\\1", name) + "%"
+        return self.db_manager.query(
+            PRODUCT_STOCK_SQL.format(condition="p.NAME LIKE %s"),
+            (pattern, self.max_rows),
+        )
+
+    def product_stock(self, params: Dict[str, Any]) -> Optional[Tuple[str, List[str]]]:
+        rows = self.find_products(params["name"])
+        if not rows:
+            return None
+        context = [
+            f"Product {row['NAME']} (code {row['PRODUCT_CODE']}): {int(row['ON_HAND'] or 0)} on hand"
+            for row in rows
+        ]
+        if len(rows) == 1:
+            row = rows[0]
+            answer = f"{row['NAME']} (code {row['PRODUCT_CODE']}) has {int(row['ON_HAND'] or 0)} units on hand."
+        else:
+            answer = f"{len(rows)} products match '{params['name']}':\n" + "\n".join(context)
+        return answer, context
+
+    def product_price(self, params: Dict[str, Any]) -> Optional[Tuple[str, List[str]]]:
+        rows = self.find_products(params["name"])
+        if not rows:
+            return None
+
+        def price(row):
+            if row["MIN_PRICE"] == row["MAX_PRICE"]:
+                return money(row["MIN_PRICE"])
+            return f"{money(row['MIN_PRICE'])} to {money(row['MAX_PRICE'])}"
+
+        context = [
+            f"Product {row['NAME']} (code {row['PRODUCT_CODE']}): price {price(row)}"
+            for row in rows
+        ]
+        if len(rows) == 1:
+            row = rows[0]
+            answer = f"{row['NAME']} (code {row['PRODUCT_CODE']}) costs {price(row)}."
+        else:
+            answer = f"{len(rows)} products match '{params['name']}':\n" + "\n".join(context)
+        return answer, context
+
+    def low_stock(self, params: Dict[str, Any]) -> Tuple[str, List[str]]:
+        threshold = params["threshold"]
+        rows = self.db_manager.query(LOW_STOCK_SQL, (threshold, self.max_rows))
+        context = [
+            f"Product {row['NAME']} (code {row['PRODUCT_CODE']}): {int(row['ON_HAND'] or 0)} on hand"
+            for row in rows
+        ]
+        condition = "out of stock" if threshold == 1 else f"below {threshold} units"
+        if not rows:
+            return f"No products are {condition}.", context
+        answer = f"Products {condition}:\n" + "\n".join(context)
+        if len(rows) == self.max_rows:
+            answer += f"\n(showing the first {self.max_rows})"
+        return answer, context
+
+    def sales_total(self, params: Dict[str, Any]) -> Tuple[str, List[str]]:
+        label, start, end = params["period"]
+        where, args = date_filter(start, end)
+        row = self.db_manager.query(SALES_TOTAL_SQL.format(where=where), args)[0]
+        count = int(row["TRANSACTIONS"])
+        answer = f"Total sales {label}: {money(row['TOTAL'])} from {count} transaction{'s' if count != 1 else ''}."
+        return answer, [answer]
+
+    def top_products(self, params: Dict[str, Any]) -> Tuple[str, List[str]]:
+        label, start, end = params["period"]
+        where, args = date_filter(start, end)
+        rows = self.db_manager.query(
+            TOP_PRODUCTS_SQL.format(where=where), args + (params["limit"],)
+        )
+        context = [
+            f"{row['PRODUCTS']}: {int(row['UNITS'] or 0)} units sold, revenue {money(row['REVENUE'])}"
+            for row in rows
+        ]
+        if not rows:
+            return f"No products were sold {label}.", context
+        return f"Best-selling products {label}:\n" + "\n".join(
+            f"{i}. {line}" for i, line in enumerate(context, 1)
+        ), context
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats)
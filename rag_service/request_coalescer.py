@@ -0,0 +1,42 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class RequestCoalescer:
+    """Single-flight execution: concurrent callers with the same key share one run"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await the result of `factory()` for `key`, starting it only if no
+        identical request is already in flight. The shared run is shielded,
+        so one caller disconnecting does not cancel it for the others.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def running(self, key: str) -> bool:
+        """Whether a run for `key` is in flight"""
+        return key in self._inflight
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
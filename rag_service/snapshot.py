@@ -0,0 +1,214 @@
+"""
+Snapshots of the scms_data vector collection, so a new instance can import
+the index instead of re-embedding the whole database through Ollama.
+
+    python snapshot.py export [--path PATH] [--quantization float16]
+    python snapshot.py import [--path PATH] [--replace]
+    python snapshot.py info [--path PATH]
+
+A snapshot is one .npz file holding the ids, embeddings, documents and
+metadata of every stored entry. The metadata includes the content hash each
+entry was embedded from, so the incremental refresh run after an import
+only re-embeds rows changed since the snapshot was taken. Embeddings can be
+stored as float32, float16 (half the size) or int8 with a scale per vector
+(a quarter), at a small loss of precision in similarity scores.
+
+While the service is running with a local persist directory, export through
+POST /index/snapshot rather than this script.
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+import numpy as np
+from config import (
+    EMBEDDING_MODEL,
+    SNAPSHOT_PATH,
+    SNAPSHOT_QUANTIZATION,
+    VECTOR_STORE_PAGE_SIZE,
+)
+
+FORMAT_VERSION = 1
+QUANTIZATIONS = ("float32", "float16", "int8")
+
+
+def _json_array(value: Any) -> np.ndarray:
+    """JSON-encode a value into a byte array, so the file loads without pickle"""
+    return np.frombuffer(json.dumps(value).encode("utf-8"), dtype=np.uint8)
+
+
+def _from_json_array(array: np.ndarray) -> Any:
+    return json.loads(array.tobytes().decode("utf-8"))
+
+
+def quantize(embeddings: np.ndarray, quantization: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Embeddings in the snapshot dtype, and the per-vector scales for int8"""
+    if quantization == "int8":
+        scales = np.abs(embeddings).max(axis=1) / 127
+        scales[scales == 0] = 1
+        quantized = np.rint(embeddings / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    return embeddings.astype(quantization), np.empty(0, dtype=np.float32)
+
+
+def dequantize(embeddings: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    if embeddings.dtype == np.int8:
+        return embeddings.astype(np.float32) * scales[:, None]
+    return embeddings.astype(np.float32)
+
+
+def iter_collection(collection, page_size: int = VECTOR_STORE_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """Pages of stored entries with their embeddings"""
+    offset = 0
+    while True:
+        page = collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=page_size,
+            offset=offset,
+        )
+        if not len(page["ids"]):
+            return
+        yield page
+        offset += len(page["ids"])
+
+
+def export_snapshot(
+    collection, path: str = SNAPSHOT_PATH, quantization: str = SNAPSHOT_QUANTIZATION
+) -> Dict[str, Any]:
+    """
+    Write every entry of `collection` to a snapshot file at `path`. The
+    file is written beside it and renamed into place, so readers never see
+    a partial snapshot. Entries written while the export runs may be missed;
+    the catch-up refresh after an import picks them up.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"quantization must be one of {QUANTIZATIONS}, not {quantization!r}")
+    start = time.perf_counter()
+    ids: List[str] = []
+    documents: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    embeddings: List[np.ndarray] = []
+    scales: List[np.ndarray] = []
+    for page in iter_collection(collection):
+        page_embeddings, page_scales = quantize(
+            np.asarray(page["embeddings"], dtype=np.float32), quantization
+        )
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(metadata or {} for metadata in page["metadatas"])
+        embeddings.append(page_embeddings)
+        scales.append(page_scales)
+
+    dim = embeddings[0].shape[1] if embeddings else 0
+    header = {
+        "format": FORMAT_VERSION,
+        "collection": collection.name,
+        "embedding_model": EMBEDDING_MODEL,
+        "quantization": quantization,
+        "count": len(ids),
+        "dim": dim,
+        "created_at": time.time(),
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    partial = f"{path}.partial"
+    with open(partial, "wb") as f:
+        np.savez_compressed(
+            f,
+            header=_json_array(header),
+            ids=_json_array(ids),
+            documents=_json_array(documents),
+            metadatas=_json_array(metadatas),
+            embeddings=np.concatenate(embeddings) if embeddings else np.empty((0, 0), dtype=quantization),
+            scales=np.concatenate(scales) if scales else np.empty(0, dtype=np.float32),
+        )
+    os.replace(partial, path)
+
+    stats = {
+        **header,
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    print(
+        f"Exported {stats['count']} entries ({quantization}) to {path}: "
+        f"{stats['bytes'] / 1e6:.1f} MB in {stats['seconds']:.2f}s"
+    )
+    return stats
+
+
+def read_header(path: str = SNAPSHOT_PATH) -> Dict[str, Any]:
+    with np.load(path) as snapshot:
+        return _from_json_array(snapshot["header"])
+
+
+def import_snapshot(collection, path: str = SNAPSHOT_PATH, batch_size: int = VECTOR_STORE_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Upsert every entry of the snapshot at `path` into `collection` with its
+    stored embedding. Refuses snapshots made with another embedding model,
+    whose vectors would not be comparable with new question embeddings.
+    """
+    start = time.perf_counter()
+    with np.load(path) as snapshot:
+        header = _from_json_array(snapshot["header"])
+        if header.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {header.get('format')!r}")
+        if header["embedding_model"] != EMBEDDING_MODEL:
+            raise ValueError(
+                f"Snapshot was embedded with {header['embedding_model']}, "
+                f"this service uses {EMBEDDING_MODEL}"
+            )
+        ids = _from_json_array(snapshot["ids"])
+        documents = _from_json_array(snapshot["documents"])
+        metadatas = _from_json_array(snapshot["metadatas"])
+        embeddings = snapshot["embeddings"]
+        scales = snapshot["scales"]
+
+    for i in range(0, len(ids), batch_size):
+        end = i + batch_size
+        collection.upsert(
+            ids=ids[i:end],
+            embeddings=dequantize(embeddings[i:end], scales[i:end]),
+            documents=documents[i:end],
+            metadatas=metadatas[i:end],
+        )
+
+    stats = {
+        **header,
+        "path": path,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    print(f"Imported {len(ids)} entries from {path} in {stats['seconds']:.2f}s")
+    return stats
+
+
+def main():
+    from embeddings import EmbeddingManager
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("export", "import", "info"))
+    parser.add_argument("--path", default=SNAPSHOT_PATH)
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default=SNAPSHOT_QUANTIZATION)
+    parser.add_argument(
+        "--replace", action="store_true", help="import: delete the stored entries first"
+    )
+    args = parser.parse_args()
+
+    if args.command == "info":
+        print(json.dumps(read_header(args.path), indent=2))
+        return
+    manager = EmbeddingManager()
+    if args.command == "export":
+        export_snapshot(manager.collection, args.path, args.quantization)
+        return
+    if args.replace:
+        name = manager.collection.name
+        metadata = manager.collection.metadata
+        manager.client.delete_collection(name)
+        manager.collection = manager.client.create_collection(name=name, metadata=metadata)
+    import_snapshot(manager.collection, args.path)
+
+
+if __name__ == "__main__":
+    main()
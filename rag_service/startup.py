@@ -0,0 +1,127 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from config import STARTUP_RETRY_INITIAL_SECONDS, STARTUP_RETRY_MAX_SECONDS
+
+
+class Dependency:
+    """Initialization state of one external dependency"""
+
+    def __init__(self, name: str, required: bool):
+        self.name = name
+        # Required dependencies must be ready before the service reports ready
+        self.required = required
+        self.status = "pending"
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.ready_after: Optional[float] = None
+        self.init_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "attempts": self.attempts,
+            "error": self.error,
+            "ready_after_seconds": self.ready_after,
+            "init_seconds": self.init_seconds,
+        }
+
+
+class StartupManager:
+    """
+    Brings dependencies up in the background once the server is accepting
+    connections. Each one is retried with exponential backoff until it
+    succeeds, and its state is kept for the readiness endpoint.
+    """
+
+    def __init__(
+        self,
+        retry_initial: float = STARTUP_RETRY_INITIAL_SECONDS,
+        retry_max: float = STARTUP_RETRY_MAX_SECONDS,
+    ):
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self.dependencies: Dict[str, Dependency] = {}
+        self.tasks: List[asyncio.Task] = []
+        self.started_at = time.monotonic()
+
+    def register(self, name: str, required: bool = True) -> Dependency:
+        dependency = Dependency(name, required)
+        self.dependencies[name] = dependency
+        return dependency
+
+    async def initialize(self, name: str, init: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `init` until it succeeds, backing off between failed attempts"""
+        dependency = self.dependencies[name]
+        delay = self.retry_initial
+        while True:
+            dependency.attempts += 1
+            dependency.status = "initializing"
+            start = time.perf_counter()
+            try:
+                result = await init()
+            except Exception as e:
+                dependency.status = "retrying"
+                dependency.error = str(e) or type(e).__name__
+                print(
+                    f"Startup: {name} not available (attempt {dependency.attempts}): "
+                    f"{dependency.error}; retrying in {delay:.0f}s"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max)
+                continue
+            dependency.status = "ready"
+            dependency.error = None
+            dependency.init_seconds = round(time.perf_counter() - start, 3)
+            dependency.ready_after = round(time.monotonic() - self.started_at, 3)
+            print(
+                f"Startup: {name} ready after {dependency.ready_after}s "
+                f"({dependency.attempts} attempt(s))"
+            )
+            return result
+
+    def start(self, name: str, init: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Initialize a dependency in its own background task"""
+        return self.run(self.initialize(name, init))
+
+    def run(self, coroutine: Awaitable[Any]) -> asyncio.Task:
+        """Run a startup step in the background; stop() cancels it"""
+        task = asyncio.create_task(coroutine)
+        self.tasks.append(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            print(f"Startup step failed: {task.exception()}")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def pending(self, names: Optional[Iterable[str]] = None) -> List[str]:
+        """Named dependencies (default: the required ones) that are not ready yet"""
+        if names is None:
+            names = [name for name, dep in self.dependencies.items() if dep.required]
+        return [name for name in names if not self.dependencies[name].ready]
+
+    @property
+    def ready(self) -> bool:
+        return not self.pending()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1),
+            "pending": self.pending(),
+            "dependencies": {
+                name: dependency.to_dict() for name, dependency in self.dependencies.items()
+            },
+        }
@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Overloaded
+
+
+async def wait_queued(controller, count=1):
+    """Let waiter tasks run until `count` of them are queued"""
+    while len(controller.waiters) < count:
+        await asyncio.sleep(0)
+
+
+def test_fast_path_and_release():
+    async def scenario():
+        controller = AdmissionController(concurrency=2, max_queue=2, max_wait=1)
+        await controller.acquire()
+        await controller.acquire("background")
+        assert controller.active == 2
+        controller.release()
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiters_are_admitted_by_priority():
+    async def scenario():
+        controller = AdmissionController(concurrency=1, max_queue=3, max_wait=1)
+        await controller.acquire()
+        order = []
+
+        async def generate(priority):
+            await controller.acquire(priority)
+            order.append(priority)
+            controller.release()
+
+        tasks = [asyncio.create_task(generate(p)) for p in ("background", "batch", "interactive")]
+        await wait_queued(controller, 3)
+        controller.release()
+        await asyncio.gather(*tasks)
+        assert order == ["interactive", "batch", "background"]
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_timeout_sheds_waiter():
+    async def scenario():
+        controller = AdmissionController(concurrency=1, max_queue=2, max_wait=0.01)
+        await controller.acquire()
+        with pytest.raises(Overloaded) as shed:
+            await controller.acquire()
+        assert shed.value.reason == "timeout"
+        assert controller.waiters == []
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_handed_over_at_timeout_is_taken(monkeypatch):
+    async def scenario():
+        controller = AdmissionController(concurrency=1, max_queue=2, max_wait=1)
+        await controller.acquire()
+
+        async def handed_then_timed_out(future, timeout):
+            # release() hands the slot over, then the timeout fires before
+            # the waiter resumes
+            controller.release()
+            raise asyncio.TimeoutError()
+
+        monkeypatch.setattr(asyncio, "wait_for", handed_then_timed_out)
+        await controller.acquire()
+        assert controller.active == 1
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_displaces_lower_priority():
+    async def scenario():
+        controller = AdmissionController(concurrency=1, max_queue=1, max_wait=1)
+        await controller.acquire()
+        background = asyncio.create_task(controller.acquire("background"))
+        await wait_queued(controller)
+        interactive = asyncio.create_task(controller.acquire("interactive"))
+        with pytest.raises(Overloaded) as shed:
+            await background
+        assert shed.value.reason == "displaced"
+
+        controller.release()
+        await interactive
+        assert controller.active == 1
+        controller.release()
+        assert controller.active == 0
+        assert controller.waiters == []
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_sheds_same_priority():
+    async def scenario():
+        controller = AdmissionController(concurrency=1, max_queue=1, max_wait=1)
+        await controller.acquire()
+        waiting = asyncio.create_task(controller.acquire("batch"))
+        await wait_queued(controller)
+        with pytest.raises(Overloaded) as shed:
+            await controller.acquire("batch")
+        assert shed.value.reason == "queue_full"
+        controller.release()
+        await waiting
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        controller = AdmissionController(concurrency=1, max_queue=2, max_wait=1)
+        await controller.acquire()
+        waiting = asyncio.create_task(controller.acquire())
+        await wait_queued(controller)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert controller.waiters == []
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancel_after_handoff_does_not_leak_slot():
+    async def scenario():
+        controller = AdmissionController(concurrency=1, max_queue=2, max_wait=1)
+        await controller.acquire()
+        waiting = asyncio.create_task(controller.acquire())
+        await wait_queued(controller)
+        # The slot is handed over, then the waiter is cancelled before it resumes
+        controller.release()
+        waiting.cancel()
+        try:
+            await waiting
+        except asyncio.CancelledError:
+            pass
+        else:
+            # Some Python versions let the admission win over the cancellation
+            controller.release()
+        assert controller.active == 0
+        assert controller.waiters == []
+
+        # The freed slot is usable again
+        await controller.acquire()
+        assert controller.active == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,123 @@
+import asyncio
+
+from analytics import PRODUCTS_SQL, SUPPLIERS_SQL, SalesAnalytics
+
+
+class SalesDatabase:
+    """Answers the analytics queries from in-memory rows"""
+
+    def __init__(self):
+        self.products = [
+            {"PRODUCT_ID": 1, "NAME": "Cola", "QTY_STOCK": 50, "ON_HAND": 40, "PRICE": 1.5, "SUPPLIER_ID": 9}
+        ]
+        self.suppliers = [{"SUPPLIER_ID": 9, "COMPANY_NAME": "Acme"}]
+        self.lines = [self.line(1, day=19800)]
+
+    @staticmethod
+    def line(line_id, day, qty=2, trans_id=100):
+        return {"ID": line_id, "PRODUCTS": "Cola", "TRANS_ID": trans_id, "DAY": day, "QTY": qty, "REVENUE": qty * 1.5}
+
+    async def run(self, fn, *args):
+        return fn(*args)
+
+    def query(self, sql, params=()):
+        if sql == PRODUCTS_SQL:
+            return [dict(row) for row in self.products]
+        if sql == SUPPLIERS_SQL:
+            return [dict(row) for row in self.suppliers]
+        if "td.ID >" in sql:
+            after_id, limit = params
+            return [dict(row) for row in self.lines if row["ID"] > after_id][:limit]
+        return [dict(row) for row in self.lines if row["ID"] in params]
+
+
+def loaded_analytics():
+    db = SalesDatabase()
+    updates = []
+
+    async def on_update(products):
+        updates.append(products)
+
+    analytics = SalesAnalytics(db, on_update=on_update)
+    asyncio.run(analytics.load())
+    return db, analytics, updates
+
+
+def test_first_load_does_not_notify():
+    db, analytics, updates = loaded_analytics()
+    assert analytics.loaded
+    assert updates == []
+
+
+def test_unchanged_update_keeps_version():
+    db, analytics, updates = loaded_analytics()
+    version = analytics.version
+    asyncio.run(analytics.update())
+    asyncio.run(analytics.apply_changes({"product": [1], "transaction": [1]}))
+    assert analytics.version == version
+    assert updates == []
+
+
+def test_unchanged_reload_keeps_version():
+    db, analytics, updates = loaded_analytics()
+    version = analytics.version
+    asyncio.run(analytics.load())
+    assert analytics.version == version
+    assert updates == []
+
+
+def test_reload_reports_corrected_products():
+    db, analytics, updates = loaded_analytics()
+    db.products.append({"PRODUCT_ID": 2, "NAME": "Tea", "QTY_STOCK": 5, "ON_HAND": 5, "PRICE": 2, "SUPPLIER_ID": 9})
+    db.lines[0]["QTY"] = 3
+    asyncio.run(analytics.load())
+    assert updates == [["Cola", "Tea"]]
+
+
+def test_new_sale_bumps_version():
+    db, analytics, updates = loaded_analytics()
+    version = analytics.version
+    db.lines.append(db.line(2, day=19801))
+    asyncio.run(analytics.update())
+    assert analytics.version == version + 1
+    assert updates == [["Cola"]]
+
+
+def test_stock_change_reports_only_its_product():
+    db, analytics, updates = loaded_analytics()
+    db.products.append({"PRODUCT_ID": 2, "NAME": "Tea", "QTY_STOCK": 5, "ON_HAND": 5, "PRICE": 2, "SUPPLIER_ID": 9})
+    asyncio.run(analytics.apply_changes({"product": [2]}))
+    version = analytics.version
+    db.products[0]["ON_HAND"] = 38
+    asyncio.run(analytics.apply_changes({"product": [1]}))
+    assert analytics.version == version + 1
+    assert updates == [["Tea"], ["Cola"]]
+
+
+def test_renamed_supplier_reports_its_products():
+    db, analytics, updates = loaded_analytics()
+    db.suppliers[0]["COMPANY_NAME"] = "Acme Ltd"
+    asyncio.run(analytics.apply_changes({"supplier": [9]}))
+    assert updates == [["Cola"]]
+
+
+def test_edited_and_deleted_lines_bump_version():
+    db, analytics, updates = loaded_analytics()
+    version = analytics.version
+    db.lines[0]["QTY"] = 5
+    asyncio.run(analytics.apply_changes({"transaction": [1]}))
+    assert analytics.version == version + 1
+    db.lines.clear()
+    asyncio.run(analytics.apply_changes({"transaction": [1]}))
+    assert analytics.version == version + 2
+    assert len(analytics.lines) == 0
+    assert updates == [["Cola"], ["Cola"]]
+
+
+def test_document_ids_match_context_documents():
+    db, analytics, updates = loaded_analytics()
+    docs = [{"id": "product_1", "content": "Cola", "metadata": {"type": "product", "id": 1}}]
+    added = analytics.context_documents("when will cola run out", docs)
+    assert sorted(doc["id"] for doc in added if doc["metadata"]["type"] == "analytics") == sorted(
+        SalesAnalytics.document_ids(["Cola"])
+    )
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController
+
+try:
+    import main
+except Exception as e:  # the service's own dependencies are not installed
+    pytest.skip(f"main does not import here: {e}", allow_module_level=True)
+
+
+DOC = {"id": "product_1", "content": "Product Cola, 5 on hand", "metadata": {"type": "product", "id": 1}}
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    """Stream a RAG answer without Redis, Chroma or MySQL"""
+    controller = AdmissionController(concurrency=1, max_queue=1, max_wait=1)
+    monkeypatch.setattr(main, "admission", controller)
+    monkeypatch.setattr(main, "require", lambda *names: None)
+    monkeypatch.setattr(main, "query_router", None)
+    monkeypatch.setattr(main, "record_questions", lambda queries: None)
+    monkeypatch.setattr(main, "add_analytics", lambda question, docs: docs)
+
+    async def no_answer(key):
+        return None
+
+    async def no_generations():
+        return {}
+
+    async def retrieved(query):
+        return None, [DOC], None
+
+    monkeypatch.setattr(main.cache_manager, "get_answer", no_answer)
+    monkeypatch.setattr(main, "read_generations", no_generations)
+    monkeypatch.setattr(main, "prepare_context", retrieved)
+    return controller
+
+
+def test_disconnect_after_context_releases_slot(controller):
+    async def scenario():
+        response = await main.chat_stream_endpoint(main.Query(question="is cola in stock"), "interactive")
+        body = response.body_iterator
+        first = await body.__anext__()
+        assert first.startswith("event: context")
+        assert controller.active == 1
+        # The client goes away before the LLM is called
+        await body.aclose()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
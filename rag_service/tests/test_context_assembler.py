@@ -0,0 +1,27 @@
+from context_assembler import assemble_context
+
+
+def line_item(doc_id, product, chunk=0):
+    return {
+        "id": doc_id,
+        "content": f"Transaction 5 line: {product}, 2 units",
+        "metadata": {"type": "transaction", "id": 5, "chunk": chunk},
+    }
+
+
+def test_line_items_of_one_transaction_are_kept():
+    context, stats = assemble_context(
+        [line_item("transaction_5_10", "Cola"), line_item("transaction_5_11", "Green tea biscuits")]
+    )
+    assert stats["entities"] == 2
+    assert context == ["Transaction 5 line: Cola, 2 units", "Transaction 5 line: Green tea biscuits, 2 units"]
+
+
+def test_chunks_of_one_document_are_merged():
+    first = line_item("transaction_5_10#0", "Cola")
+    second = {**line_item("transaction_5_10#1", "Cola"), "content": "paid in cash"}
+    second["metadata"] = {**second["metadata"], "chunk": 1}
+    # The same chunk from keyword search is not repeated
+    context, stats = assemble_context([first, second, first])
+    assert stats["entities"] == 1
+    assert context == ["Transaction 5 line: Cola, 2 units paid in cash"]
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from index_feed import IndexChangeFeed
+
+
+class Cache:
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def connect(self):
+        pass
+
+
+class Index:
+    def __init__(self):
+        self.changed = set()
+        self.reloaded = []
+
+    def track_changes(self):
+        pass
+
+    def drain_changes(self):
+        ids, self.changed = sorted(self.changed), set()
+        return ids
+
+    def record_changes(self, ids):
+        self.changed.update(ids)
+
+    def reload_keyword_documents(self, ids):
+        self.reloaded.append(sorted(ids))
+
+
+def test_follower_sees_ids_with_their_generation():
+    async def scenario():
+        cache = Cache(fakeredis.FakeAsyncRedis(decode_responses=True))
+        writer_index, query_index = Index(), Index()
+        writer = IndexChangeFeed(writer_index, cache, publish=True, retain=2)
+        follower = IndexChangeFeed(query_index, cache, publish=False, retain=2)
+        await follower.mark()
+
+        writer_index.changed = {"product_1", "product_2"}
+        assert await writer.publish_once() == 2
+        assert await follower.current_generation() == 1
+        assert await follower.follow_once() == 2
+        assert query_index.reloaded == [["product_1", "product_2"]]
+
+        for doc_id in ("product_3", "product_4", "product_5"):
+            writer_index.changed = {doc_id}
+            await writer.publish_once()
+        # Generations at or below the floor are trimmed
+        assert await cache.redis.zrange(writer.changes_key, 0, -1) == ["product_4", "product_5"]
+        assert int(await cache.redis.get(writer.floor_key)) == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,93 @@
+from datetime import date
+
+import pytest
+
+from query_router import QueryRouter, date_filter, parse_period
+
+TODAY = date(2024, 5, 15)
+
+
+@pytest.fixture
+def router():
+    return QueryRouter(db_manager=None)
+
+
+def intent(router, question):
+    matched = router.match(question)
+    return matched[0] if matched else None
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("total sales today", ("today", "2024-05-15", "2024-05-15")),
+        ("sales yesterday?", ("yesterday", "2024-05-14", "2024-05-14")),
+        ("sales on 2024-05-01", ("on 2024-05-01", "2024-05-01", "2024-05-01")),
+        ("revenue in 2024-02", ("in 2024-02", "2024-02-01", "2024-02-31")),
+        ("sales this week", ("this week", "2024-05-13", "2024-05-15")),
+        ("sales in the last 7 days", ("in the last 7 days", "2024-05-09", "2024-05-15")),
+        ("sales this month", ("this month", "2024-05-01", "2024-05-15")),
+        ("sales last month", ("last month", "2024-04-01", "2024-04-30")),
+        ("sales this year", ("this year", "2024-01-01", "2024-05-15")),
+        ("sales in 2023", ("in 2023", "2023-01-01", "2023-12-31")),
+        ("total sales", ("in total", None, None)),
+    ],
+)
+def test_parse_period(question, expected):
+    assert parse_period(question, TODAY) == expected
+
+
+def test_parse_period_last_month_in_january():
+    assert parse_period("sales last month", date(2024, 1, 10)) == (
+        "last month",
+        "2023-12-01",
+        "2023-12-31",
+    )
+
+
+def test_date_filter_without_period():
+    assert date_filter(None, None) == ("", ())
+
+
+def test_date_filter_compares_day_part_of_pos_dates():
+    where, args = date_filter("2024-05-01", "2024-05-01")
+    assert where == "WHERE LEFT(t.DATE, 10) BETWEEN %s AND %s"
+    assert args == ("2024-05-01", "2024-05-01")
+    # The POS writes DATE as date("Y-m-d H:i a"); the whole string would
+    # sort after an end bound of the same day
+    stored = "2024-05-01 10:17 am"
+    assert not args[0] <= stored <= args[1]
+    assert args[0] <= stored[:10] <= args[1]
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("What were total sales today?", "sales_total"),
+        ("How much revenue did we make last month?", "sales_total"),
+        ("How many transactions yesterday?", "sales_total"),
+        ("Total sales of all products this year", "sales_total"),
+        ("sales for the store in 2024", "sales_total"),
+        ("What are the top 3 best selling products this month?", "top_products"),
+        ("Which items are low on stock?", "low_stock"),
+        ("Products with fewer than 10 units left", "low_stock"),
+        ("What is out of stock?", "low_stock"),
+        ("What is the stock of Wireless Mouse?", "product_stock"),
+        ("How many Wireless Mouse do we have?", "product_stock"),
+        ("What is the price of Wireless Mouse?", "product_price"),
+        # Not store-wide totals: answered by retrieval
+        ("sales of Wireless Mouse last month", None),
+        ("What is the revenue for A4tech keyboards this year?", None),
+        ("Revenue per supplier this month", None),
+        ("Which supplier earned the most revenue?", None),
+        ("sales by customer in 2024", None),
+        ("Tell me about the supplier A4tech", None),
+    ],
+)
+def test_intent_routing(router, question, expected):
+    assert intent(router, question) == expected
+
+
+def test_top_products_limit_is_capped(router):
+    _, _, params = router.match("top 500 best selling products")
+    assert params["limit"] == router.max_rows
@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+import changelog
+from changelog import ChangeLogTailer
+from database import DatabaseManager, bucket_seq, format_documents
+
+
+def daily_row(seq, product, period="2024-05-01"):
+    return {
+        "SEQ": seq,
+        "PRODUCT": product,
+        "CATEGORY": "Drinks",
+        "PERIOD": period,
+        "UNITS": 2,
+        "REVENUE": 3.5,
+        "TRANSACTIONS": 1,
+    }
+
+
+def test_bucket_seq_matches_sales_lines():
+    assert bucket_seq(123, "2024-05-01") == 12300000000 + 20240501
+    assert bucket_seq(123, "2024-05") == 12300000000 + 202405
+
+
+def test_unique_seqs_keep_plain_ids():
+    docs = format_documents("product_daily_sales", [daily_row(1, "Cola"), daily_row(2, "Tea")])
+    assert [doc.get("doc_id") for doc in docs] == [None, None]
+    assert [doc["seq"] for doc in docs] == [1, 2]
+
+
+def test_colliding_seqs_get_name_ids():
+    docs = format_documents("product_daily_sales", [daily_row(7, "Cola"), daily_row(7, "Tea")])
+    ids = [doc["doc_id"] for doc in docs]
+    assert len(set(ids)) == 2
+    assert all(doc_id.startswith("product_daily_sales_7_") for doc_id in ids)
+    # Ids depend on the names, not the row order
+    reordered = format_documents("product_daily_sales", [daily_row(7, "Tea"), daily_row(7, "Cola")])
+    assert [doc["doc_id"] for doc in reordered] == ids[::-1]
+
+
+class PagedDatabase(DatabaseManager):
+    """DatabaseManager over an in-memory rollup, without a connection pool"""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: row["SEQ"])
+        self.tables = set()
+        self.page_queries = 0
+
+    def query(self, sql, params=()):
+        if sql.startswith("CREATE TABLE"):
+            self.tables.add(sql.split("`")[1])
+            return []
+        if sql.startswith("DROP TABLE"):
+            self.tables.discard(sql.split("`")[1])
+            return []
+        if "r.SEQ = %s" in sql:
+            return [row for row in self.rows if row["SEQ"] == params[0]]
+        self.page_queries += 1
+        assert "`scms_rollup_product_daily_sales_" in sql
+        after_seq, limit = params
+        return [row for row in self.rows if row["SEQ"] > after_seq][:limit]
+
+
+def page_seqs(db, page_size):
+    pages = list(db.iter_document_pages(["product_daily_sales"], page_size=page_size))
+    return [[doc["seq"] for doc in page] for page in pages]
+
+
+def test_pages_read_one_materialized_table():
+    db = PagedDatabase([daily_row(seq, f"P{seq}") for seq in range(1, 7)])
+    assert page_seqs(db, 3) == [[1, 2, 3], [4, 5, 6]]
+    # The last full page is followed by one empty read; the table is dropped
+    assert db.page_queries == 3
+    assert db.tables == set()
+
+
+def test_pages_extend_to_the_end_of_a_seq_run():
+    rows = [daily_row(1, "A"), daily_row(2, "B"), daily_row(3, "C"), daily_row(3, "D"), daily_row(4, "E")]
+    assert page_seqs(PagedDatabase(rows), 3) == [[1, 2, 3, 3], [4]]
+
+
+def test_run_longer_than_a_page_is_kept_whole():
+    rows = [daily_row(5, name) for name in "ABCDE"] + [daily_row(6, "F")]
+    assert page_seqs(PagedDatabase(rows), 2) == [[5, 5, 5, 5, 5], [6]]
+
+
+class ChangeDatabase:
+    def __init__(self, lines=(), labels=()):
+        self.lines = list(lines)
+        self.labels = list(labels)
+
+    async def run(self, fn, *args):
+        return fn(*args)
+
+    def fetch_line_buckets(self, line_ids):
+        return [line for line in self.lines if line["ID"] in line_ids]
+
+    def fetch_product_labels(self, product_ids=None):
+        if product_ids is None:
+            return self.labels
+        return [label for label in self.labels if label["PRODUCT_ID"] in product_ids]
+
+
+@pytest.fixture(autouse=True)
+def index_rollups(monkeypatch):
+    monkeypatch.setattr(
+        changelog,
+        "INDEXED_TYPES",
+        ["product", "transaction", "product_daily_sales", "product_monthly_sales",
+         "category_monthly_sales", "customer_purchases", "supplier_stock"],
+    )
+
+
+def label(product_id, name, category_id=1, supplier_id=9):
+    return {"PRODUCT_ID": product_id, "NAME": name, "CATEGORY_ID": category_id, "SUPPLIER_ID": supplier_id}
+
+
+def tailer(db):
+    return ChangeLogTailer(db, embedding_manager=None, cache_manager=None)
+
+
+def test_new_sale_marks_only_its_buckets():
+    line = {"ID": 5, "CUST_ID": 3, "PRODUCT_KEY": 11, "CATEGORY_KEY": 22, "DAY": "2024-05-01", "MONTH": "2024-05"}
+    t = tailer(ChangeDatabase(lines=[line]))
+    asyncio.run(t.mark_stale_rollups({"transaction": {5, 6}}))
+    assert t.stale_rollups == set()
+    assert t.stale_buckets == {
+        "product_daily_sales": {(11, "2024-05-01")},
+        "product_monthly_sales": {(11, "2024-05")},
+        "category_monthly_sales": {(22, "2024-05")},
+        "customer_purchases": {(3,)},
+    }
+
+
+def test_rewritten_lines_resync_sales_rollups_in_full():
+    t = tailer(ChangeDatabase())
+    asyncio.run(t.mark_stale_rollups({"transaction": {5}}, rewritten_lines=True))
+    assert t.stale_rollups == {
+        "product_daily_sales", "product_monthly_sales", "category_monthly_sales", "customer_purchases"
+    }
+    assert t.stale_buckets == {}
+
+
+def test_stock_update_marks_only_supplier_bucket():
+    db = ChangeDatabase(labels=[label(1, "Cola")])
+    t = tailer(db)
+    t.product_labels = {1: ("Cola", 1, 9)}
+    asyncio.run(t.mark_stale_rollups({"product": {1}}))
+    assert t.stale_rollups == set()
+    assert t.stale_buckets == {"supplier_stock": {(9,)}}
+
+
+def test_renamed_product_resyncs_sales_rollups():
+    db = ChangeDatabase(labels=[label(1, "Cola Zero", supplier_id=4)])
+    t = tailer(db)
+    t.product_labels = {1: ("Cola", 1, 9)}
+    asyncio.run(t.mark_stale_rollups({"product": {1}}))
+    assert t.stale_rollups == {"product_daily_sales", "product_monthly_sales", "category_monthly_sales"}
+    assert t.stale_buckets == {"supplier_stock": {(9,), (4,)}}
+    assert t.product_labels == {1: ("Cola Zero", 1, 4)}